@@ -0,0 +1,441 @@
+"""
+This module is the admission layer in front of both apps (main.py and
+asgi.py). Every request enters through a per-process concurrency budget for
+cache work; the first time it needs PokeAPI (a cache miss that has to be
+built, a direct upstream call or a fan-out) it moves to a separate, smaller
+upstream budget. Cache hits therefore never queue behind requests stuck in
+PokeAPI's retry loop: when the upstream budget is full, new upstream-bound
+requests wait a bounded time in a bounded queue and past that they are shed
+at once with a 503 and Retry-After.
+
+An optional per-client token bucket, kept in Redis and updated by a Lua
+script, rate limits clients across all replicas (429 with Retry-After). If
+Redis is unreachable the limiter fails open.
+
+Background work (stale refreshes, warmup, the fan-out pool threads) runs
+outside any request and is not governed here. Streamed bodies (NDJSON) are
+produced after the request ends, so their routes take an upstream slot up
+front and hand it to the response, which releases it when it is closed.
+"""
+
+import asyncio
+import contextvars
+import math
+import os
+import threading
+import time
+from collections import deque
+from typing import AsyncIterator, Callable, Optional
+import redis
+import redis.asyncio
+from dotenv import load_dotenv
+from metrics import ADMISSION_IN_USE, ADMISSION_QUEUE_DEPTH, ADMISSION_SHED, ADMISSION_WAIT, REDIS_LATENCY, timed
+
+load_dotenv()
+
+ADMISSION_ENABLED = os.getenv('ADMISSION_ENABLED', 'true').lower() == 'true'
+# Modo sync (por proceso): con GUNICORN_THREADS=8, 4 requests contra PokeAPI
+# y 2 en cola dejan siempre threads libres para los hits de cache
+ADMISSION_CACHE_CONCURRENCY = int(os.getenv('ADMISSION_CACHE_CONCURRENCY', '64'))
+ADMISSION_CACHE_QUEUE = int(os.getenv('ADMISSION_CACHE_QUEUE', '64'))
+ADMISSION_CACHE_MAX_WAIT = float(os.getenv('ADMISSION_CACHE_MAX_WAIT', '0.5'))
+ADMISSION_UPSTREAM_CONCURRENCY = int(os.getenv('ADMISSION_UPSTREAM_CONCURRENCY', '4'))
+ADMISSION_UPSTREAM_QUEUE = int(os.getenv('ADMISSION_UPSTREAM_QUEUE', '2'))
+ADMISSION_UPSTREAM_MAX_WAIT = float(os.getenv('ADMISSION_UPSTREAM_MAX_WAIT', '1.0'))
+# Modo async: esperar a PokeAPI solo ocupa una corrutina, los límites son más altos
+ADMISSION_ASYNC_CACHE_CONCURRENCY = int(os.getenv('ADMISSION_ASYNC_CACHE_CONCURRENCY', '2048'))
+ADMISSION_ASYNC_CACHE_QUEUE = int(os.getenv('ADMISSION_ASYNC_CACHE_QUEUE', '2048'))
+ADMISSION_ASYNC_UPSTREAM_CONCURRENCY = int(os.getenv('ADMISSION_ASYNC_UPSTREAM_CONCURRENCY', '256'))
+ADMISSION_ASYNC_UPSTREAM_QUEUE = int(os.getenv('ADMISSION_ASYNC_UPSTREAM_QUEUE', '256'))
+# Segundos que se piden esperar en los 503
+ADMISSION_RETRY_AFTER = int(os.getenv('ADMISSION_RETRY_AFTER', '1'))
+# Probes y scraping nunca se rechazan
+ADMISSION_EXEMPT = {'/metrics', '/healthz', '/readyz'}
+
+# Token bucket por cliente: RATE_LIMIT_RPS tokens por segundo, hasta
+# RATE_LIMIT_BURST acumulados. 0 = sin límite
+RATE_LIMIT_RPS = float(os.getenv('RATE_LIMIT_RPS', '0'))
+RATE_LIMIT_BURST = int(os.getenv('RATE_LIMIT_BURST', '0')) or max(1, math.ceil(RATE_LIMIT_RPS * 2))
+# Header con la IP real del cliente detrás de un proxy (X-Forwarded-For);
+# vacío = la dirección de la conexión
+RATE_LIMIT_CLIENT_HEADER = os.getenv('RATE_LIMIT_CLIENT_HEADER', '')
+
+# Recarga el bucket según el tiempo de Redis (igual en todas las réplicas) y
+# consume un token. Devuelve {admitido, segundos hasta el próximo token}
+_TOKEN_BUCKET_SCRIPT = """
+local now = redis.call('time')
+now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local state = redis.call('hmget', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('hset', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('pexpire', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(wait)}
+"""
+
+
+class Rejected(Exception):
+    """
+    Request rechazado por el control de admisión. `status` es 429 (límite
+    del cliente) o 503 (servicio saturado).
+    """
+
+    def __init__(self, message: str, status: int, retry_after: int, budget: str, reason: str):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+        self.budget = budget
+        self.reason = reason
+
+
+def _shed(budget: str, reason: str) -> Rejected:
+    ADMISSION_SHED.labels(budget, reason).inc()
+    return Rejected("Servicio saturado, reintentar más tarde", 503, ADMISSION_RETRY_AFTER, budget, reason)
+
+
+class Bulkhead:
+    """
+    Presupuesto de concurrencia por proceso: hasta `limit` requests dentro y
+    hasta `max_queue` esperando turno como mucho `max_wait` segundos. Con la
+    cola llena se rechaza sin esperar.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._in_use = 0
+        self._waiting = 0
+        self._cond = threading.Condition()
+        self._in_use_gauge = ADMISSION_IN_USE.labels(name)
+        self._queue_gauge = ADMISSION_QUEUE_DEPTH.labels(name)
+        self._wait = ADMISSION_WAIT.labels(name)
+
+    def acquire(self):
+        """
+        Raises:
+            Rejected: Si la cola está llena o se agota max_wait.
+        """
+        started = time.monotonic()
+        with self._cond:
+            # Si ya hay cola, los que llegan se ponen detrás
+            if self._in_use >= self.limit or self._waiting:
+                if self._waiting >= self.max_queue:
+                    raise _shed(self.name, "queue_full")
+                self._waiting += 1
+                self._queue_gauge.inc()
+                try:
+                    if not self._cond.wait_for(lambda: self._in_use < self.limit, self.max_wait):
+                        raise _shed(self.name, "timeout")
+                finally:
+                    self._waiting -= 1
+                    self._queue_gauge.dec()
+            self._in_use += 1
+        self._in_use_gauge.inc()
+        self._wait.observe(time.monotonic() - started)
+
+    def release(self):
+        with self._cond:
+            self._in_use -= 1
+            self._cond.notify()
+        self._in_use_gauge.dec()
+
+
+class AsyncBulkhead:
+    """
+    Bulkhead para el modo async: los que esperan son futures en orden de
+    llegada y release() le pasa su lugar directamente al primero.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._in_use = 0
+        self._waiters: deque[asyncio.Future] = deque()
+        self._in_use_gauge = ADMISSION_IN_USE.labels(name)
+        self._queue_gauge = ADMISSION_QUEUE_DEPTH.labels(name)
+        self._wait = ADMISSION_WAIT.labels(name)
+
+    async def acquire(self):
+        """
+        Raises:
+            Rejected: Si la cola está llena o se agota max_wait.
+        """
+        started = time.monotonic()
+        if self._in_use < self.limit and not self._waiters:
+            self._in_use += 1
+            self._in_use_gauge.inc()
+            self._wait.observe(0.0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise _shed(self.name, "queue_full")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._queue_gauge.inc()
+        try:
+            await asyncio.wait_for(waiter, self.max_wait)
+        except asyncio.TimeoutError:
+            # wait_for cancela el future; si release() llegó antes, el lugar es nuestro
+            if waiter.cancelled():
+                raise _shed(self.name, "timeout")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self.release()
+            raise
+        finally:
+            self._queue_gauge.dec()
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+        self._wait.observe(time.monotonic() - started)
+
+    def release(self):
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # El lugar pasa al siguiente en la cola: _in_use no cambia
+                waiter.set_result(None)
+                return
+        self._in_use -= 1
+        self._in_use_gauge.dec()
+
+
+cache_budget = Bulkhead("cache", ADMISSION_CACHE_CONCURRENCY, ADMISSION_CACHE_QUEUE, ADMISSION_CACHE_MAX_WAIT)
+upstream_budget = Bulkhead("upstream", ADMISSION_UPSTREAM_CONCURRENCY, ADMISSION_UPSTREAM_QUEUE, ADMISSION_UPSTREAM_MAX_WAIT)
+async_cache_budget = AsyncBulkhead("cache", ADMISSION_ASYNC_CACHE_CONCURRENCY, ADMISSION_ASYNC_CACHE_QUEUE,
+                                   ADMISSION_CACHE_MAX_WAIT)
+async_upstream_budget = AsyncBulkhead("upstream", ADMISSION_ASYNC_UPSTREAM_CONCURRENCY, ADMISSION_ASYNC_UPSTREAM_QUEUE,
+                                      ADMISSION_UPSTREAM_MAX_WAIT)
+
+
+class _Ticket:
+    __slots__ = ("budget", "rejected", "lock")
+
+    def __init__(self, budget, lock: Optional[asyncio.Lock] = None):
+        self.budget = budget
+        self.rejected: Optional[Rejected] = None
+        self.lock = lock
+
+
+# Lugar que ocupa el request en curso. Los threads del pool de fan-out y los
+# de refresco no lo heredan; las tareas de asyncio.gather sí (comparten el ticket)
+_ticket: contextvars.ContextVar[Optional[_Ticket]] = contextvars.ContextVar("admission_ticket", default=None)
+_async_ticket: contextvars.ContextVar[Optional[_Ticket]] = contextvars.ContextVar("admission_async_ticket", default=None)
+
+
+# --------- Límite por cliente ---------
+
+def client_id(headers, remote_addr: Optional[str]) -> str:
+    """
+    Identidad del cliente para el rate limit: el primer valor de
+    RATE_LIMIT_CLIENT_HEADER si está configurado, si no la IP de la conexión.
+    """
+    if RATE_LIMIT_CLIENT_HEADER:
+        forwarded = headers.get(RATE_LIMIT_CLIENT_HEADER, '').split(',', 1)[0].strip()
+        if forwarded:
+            return forwarded
+    return remote_addr or 'unknown'
+
+def _bucket_key(client: str) -> str:
+    return f"ratelimit:{client}"
+
+def _check_reply(reply) -> None:
+    allowed, wait = reply
+    if int(allowed):
+        return
+    ADMISSION_SHED.labels("client", "rate_limit").inc()
+    raise Rejected("Demasiadas solicitudes", 429, max(1, math.ceil(float(wait))), "client", "rate_limit")
+
+def check_rate(redis_connection: redis.Redis, client: str):
+    """
+    Consume un token del bucket del cliente.
+
+    Raises:
+        Rejected: 429 si el bucket está vacío.
+    """
+    try:
+        with timed(REDIS_LATENCY, "rate_limit"):
+            reply = redis_connection.eval(_TOKEN_BUCKET_SCRIPT, 1, _bucket_key(client), RATE_LIMIT_RPS, RATE_LIMIT_BURST)
+    except redis.RedisError:
+        # Sin Redis no se limita: mejor atender que rechazar a todos
+        return
+    _check_reply(reply)
+
+async def check_rate_async(redis_connection: redis.asyncio.Redis, client: str):
+    try:
+        with timed(REDIS_LATENCY, "rate_limit"):
+            reply = await redis_connection.eval(_TOKEN_BUCKET_SCRIPT, 1, _bucket_key(client), RATE_LIMIT_RPS, RATE_LIMIT_BURST)
+    except redis.RedisError:
+        return
+    _check_reply(reply)
+
+
+# --------- Ciclo de vida del request ---------
+
+def admit(redis_connection: redis.Redis, client: str):
+    """
+    Admite el request en curso: rate limit del cliente y un lugar en el
+    presupuesto de cache. Liberar con leave() al terminar.
+
+    Raises:
+        Rejected: Si el cliente superó su límite o el presupuesto está saturado.
+    """
+    if RATE_LIMIT_RPS > 0:
+        check_rate(redis_connection, client)
+    if not ADMISSION_ENABLED:
+        return
+    cache_budget.acquire()
+    _ticket.set(_Ticket(cache_budget))
+
+async def admit_async(redis_connection: redis.asyncio.Redis, client: str):
+    if RATE_LIMIT_RPS > 0:
+        await check_rate_async(redis_connection, client)
+    if not ADMISSION_ENABLED:
+        return
+    await async_cache_budget.acquire()
+    _async_ticket.set(_Ticket(async_cache_budget, asyncio.Lock()))
+
+def escalate():
+    """
+    Pasa el request en curso del presupuesto de cache al de PokeAPI la
+    primera vez que necesita salir a la red. Fuera de un request no hace nada.
+
+    Raises:
+        Rejected: Si el presupuesto de PokeAPI está saturado; el request
+        queda marcado como rechazado (ver rejection()).
+    """
+    ticket = _ticket.get()
+    if ticket is None or ticket.budget is upstream_budget:
+        return
+    if ticket.rejected is not None:
+        raise ticket.rejected
+    if ticket.budget is not None:
+        ticket.budget.release()
+        ticket.budget = None
+    try:
+        upstream_budget.acquire()
+    except Rejected as e:
+        ticket.rejected = e
+        raise
+    ticket.budget = upstream_budget
+
+async def escalate_async():
+    ticket = _async_ticket.get()
+    if ticket is None or ticket.budget is async_upstream_budget:
+        return
+    # Las tareas de un gather comparten el ticket: solo una hace el cambio
+    async with ticket.lock:
+        if ticket.budget is async_upstream_budget:
+            return
+        if ticket.rejected is not None:
+            raise ticket.rejected
+        if ticket.budget is not None:
+            ticket.budget.release()
+            ticket.budget = None
+        try:
+            await async_upstream_budget.acquire()
+        except Rejected as e:
+            ticket.rejected = e
+            raise
+        ticket.budget = async_upstream_budget
+
+def rejection() -> Optional[Rejected]:
+    """
+    Rechazo ocurrido durante el request en curso, para responder 503 aunque
+    el handler haya convertido la excepción en otro error.
+    """
+    ticket = _ticket.get() or _async_ticket.get()
+    return ticket.rejected if ticket is not None else None
+
+def leave():
+    """
+    Libera el lugar del request en curso (sync o async).
+    """
+    for var in (_ticket, _async_ticket):
+        ticket = var.get()
+        if ticket is None:
+            continue
+        var.set(None)
+        if ticket.budget is not None:
+            ticket.budget.release()
+            ticket.budget = None
+
+class _Release:
+    """
+    Libera un lugar una sola vez, la llame quien la llame primero.
+    """
+
+    __slots__ = ("_budget",)
+
+    def __init__(self, budget):
+        self._budget = budget
+
+    def __call__(self):
+        budget, self._budget = self._budget, None
+        if budget is not None:
+            budget.release()
+
+
+def _detach(var: contextvars.ContextVar) -> _Release:
+    # Sin ticket el cuerpo ya no escala ni vuelve a pedir lugar: usa el entregado
+    ticket = var.get()
+    if ticket is None:
+        return _Release(None)
+    var.set(None)
+    return _Release(ticket.budget)
+
+def hold_for_stream() -> Callable[[], None]:
+    """
+    Para respuestas streamed: pasa el request al presupuesto de PokeAPI y
+    entrega ese lugar a quien lo devuelve, que debe llamarse al cerrar la
+    respuesta (leave() ya no lo libera).
+
+    Raises:
+        Rejected: Si el presupuesto de PokeAPI está saturado.
+    """
+    escalate()
+    return _detach(_ticket)
+
+async def hold_for_stream_async() -> Callable[[], None]:
+    await escalate_async()
+    return _detach(_async_ticket)
+
+
+class StreamBody:
+    """
+    Cuerpo async para Quart que llama a `release` al cerrarse, también si
+    el cliente se fue antes de la primera línea.
+    """
+
+    def __init__(self, body: AsyncIterator[bytes], release: Callable[[], None]):
+        self._body = body
+        self._release = release
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> bytes:
+        return await self._body.__anext__()
+
+    async def aclose(self):
+        try:
+            await self._body.aclose()
+        finally:
+            self._release()
+
+
+def response(rejected: Rejected) -> tuple[dict, int, dict]:
+    return {'error': str(rejected)}, rejected.status, {'Retry-After': str(rejected.retry_after), 'Cache-Control': 'no-store'}
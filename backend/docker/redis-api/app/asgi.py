@@ -0,0 +1,251 @@
+"""
+Async (ASGI) entry point with the same routes and payloads as main.py.
+Handlers await redis.asyncio and httpx instead of blocking a thread, so a
+worker keeps serving while thousands of slow PokeAPI calls are in flight.
+
+    SERVER_MODE=async gunicorn -c gunicorn.conf.py
+"""
+
+import os
+import time
+from quart import Quart, Response, request
+from quart_cors import cors
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST, CollectorRegistry, multiprocess
+from db import Database
+from pokemons import BATCH_MAX_IDS, BATCH_STREAM_CHUNK, BATCH_STREAM_MAX_IDS, parse_batch_ids
+from pokemons import FILTER_MAX_LIMIT, FILTER_PARAMS, parse_filters
+from search import SUGGEST_MAX_LIMIT, get_search_index
+import admission
+import cache
+import cache_async
+import pokemons_async
+import responses
+import upstream
+import upstream_async
+import warmup
+from metrics import REQUEST_COUNT, REQUEST_LATENCY, REQUESTS_IN_FLIGHT
+
+app = Quart(__name__)
+app = cors(app, allow_origin="*")
+
+# El índice de búsqueda se construye una sola vez al arrancar
+get_search_index()
+
+@app.after_serving
+async def shutdown():
+    await upstream_async.close()
+    await Database().get_async_connection().aclose()
+
+def _endpoint() -> str:
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
+@app.before_request
+async def start_timer():
+    request.start_time = time.time()
+    REQUESTS_IN_FLIGHT.inc()
+    upstream.start_request()
+    if _endpoint() in admission.ADMISSION_EXEMPT:
+        return None
+    try:
+        await admission.admit_async(Database().get_async_connection(), admission.client_id(request.headers, request.remote_addr))
+    except admission.Rejected as rejected:
+        return admission.response(rejected)
+
+@app.after_request
+async def record_metrics(response):
+    rejected = admission.rejection()
+    if rejected is not None:
+        response = await app.make_response(admission.response(rejected))
+    resp_time = time.time() - request.start_time
+    REQUEST_LATENCY.labels(request.method, _endpoint()).observe(resp_time)
+    REQUEST_COUNT.labels(request.method, _endpoint(), response.status_code).inc()
+    return response
+
+@app.teardown_request
+async def end_request(exc):
+    REQUESTS_IN_FLIGHT.dec()
+    admission.leave()
+
+@app.route("/metrics")
+async def metrics():
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+    return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
+
+@app.route('/healthz', methods=['GET'])
+async def healthz():
+    return {'status': 'ok'}, 200
+
+@app.route('/readyz', methods=['GET'])
+async def readyz():
+    try:
+        await Database().get_async_connection().ping()
+        return {'status': 'ok'}, 200
+    except Exception as e:
+        return {'status': 'unavailable', 'error': str(e)}, 503
+
+@app.route('/cache-test', methods=['GET'])
+async def cache_test():
+    try:
+        r = Database().get_async_connection()
+        await r.set('test_key', 'Hello, Redis!')
+        value = await r.get('test_key')
+        if value:
+            return {'message': 'Cache is working!', 'value': value}, 200
+        else:
+            return {'message': 'Cache is not working!'}, 500
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+@app.route('/pokemons', methods=['GET'])
+async def get_pokemons():
+    try:
+        r = Database().get_async_connection()
+        pokemons, source = await cache_async.get_or_build_raw(
+            r, cache.pokemons_key(), cache.LIST, lambda: pokemons_async.fetch_pokemons(limit=20, offset=0),
+        )
+        return responses.render(responses.record_body(source, pokemons), responses.RESPONSE_LIST_MAX_AGE, request.headers)
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+@app.route('/getListPokemon', methods=['GET'])
+async def get_list_pokemon():
+    try:
+        limit = request.args.get('limit', default=20, type=int)
+        offset = request.args.get('offset', default=0, type=int)
+        if limit < 1 or offset < 0:
+            return {'error': 'Parámetros inválidos'}, 400
+        r = Database().get_async_connection()
+        data, source = await pokemons_async.fetch_pokemon_basic_list_raw(r, limit=limit, offset=offset)
+        return responses.render(responses.list_body(source, data), responses.RESPONSE_LIST_MAX_AGE, request.headers)
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+@app.route('/getPokemon/<int:pid>', methods=['GET'])
+async def get_pokemon(pid: int):
+    try:
+        if pid < 1:
+            return {'error': 'ID inválido'}, 400
+        r = Database().get_async_connection()
+        data, source = await pokemons_async.get_full_pokemon_raw(r, pid)
+        return responses.render(responses.record_body(source, data), responses.RESPONSE_MAX_AGE, request.headers)
+    except ValueError as ve:
+        return {'error': str(ve)}, 400
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+async def _stream(lines, headers: dict):
+    # Como en main.py: el lugar de PokeAPI lo libera el cuerpo al cerrarse
+    try:
+        release = await admission.hold_for_stream_async()
+    except admission.Rejected as rejected:
+        return admission.response(rejected)
+    return Response(admission.StreamBody(lines, release), mimetype='application/x-ndjson', headers=headers)
+
+@app.route('/getPokemons', methods=['GET'])
+@app.route('/pokemons/batch', methods=['POST'])
+async def get_pokemons_batch():
+    try:
+        params = request.args
+        if request.method == 'POST':
+            params = await request.get_json(silent=True)
+            if not isinstance(params, dict):
+                return {'error': 'Se esperaba un objeto JSON'}, 400
+        detail = params.get('detail', 'light')
+        if detail not in ('light', 'full'):
+            return {'error': 'detail debe ser light o full'}, 400
+        stream = str(params.get('stream', 'false')).lower() == 'true' or 'application/x-ndjson' in request.headers.get('Accept', '')
+        ids = parse_batch_ids(params.get('ids', ''), BATCH_STREAM_MAX_IDS if stream else BATCH_MAX_IDS)
+    except ValueError as ve:
+        return {'error': str(ve)}, 400
+    r = Database().get_async_connection()
+    if stream:
+        async def _lines():
+            for start in range(0, len(ids), BATCH_STREAM_CHUNK):
+                chunk = ids[start:start + BATCH_STREAM_CHUNK]
+                try:
+                    results = await pokemons_async.fetch_pokemons_batch(r, chunk, detail)
+                except Exception as e:
+                    results = [(pid, None, str(e)) for pid in chunk]
+                for result in results:
+                    yield responses.batch_line(*result) + b"\n"
+        return await _stream(_lines(), {})
+    try:
+        results = await pokemons_async.fetch_pokemons_batch(r, ids, detail)
+        return responses.render(responses.batch_body(results), responses.RESPONSE_MAX_AGE, request.headers)
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+@app.route('/exportPokemons', methods=['GET'])
+async def export_pokemons():
+    detail = request.args.get('detail', 'light')
+    after = request.args.get('after', default=0, type=int)
+    limit = request.args.get('limit', default=None, type=int)
+    if detail not in ('light', 'full') or after < 0 or (limit is not None and limit < 1):
+        return {'error': 'Parámetros inválidos'}, 400
+    r = Database().get_async_connection()
+
+    async def _lines():
+        async for results in pokemons_async.export_pokemons(r, detail, after, limit):
+            yield b"".join(responses.batch_line(*result) + b"\n" for result in results)
+    return await _stream(_lines(), {'Cache-Control': 'no-store'})
+
+@app.route('/suggest', methods=['GET'])
+async def suggest():
+    q = request.args.get('q', '')
+    limit = request.args.get('limit', default=10, type=int)
+    detail = request.args.get('detail', 'none')
+    if not q.strip() or limit < 1 or limit > SUGGEST_MAX_LIMIT or detail not in ('none', 'light'):
+        return {'error': 'Parámetros inválidos'}, 400
+    suggestions = get_search_index().suggest(q, limit)
+    if detail == 'none':
+        body = responses.record_body(None, [{'id': pid, 'name': name} for pid, name in suggestions])
+        return responses.render(body, responses.RESPONSE_LIST_MAX_AGE, request.headers)
+    try:
+        r = Database().get_async_connection()
+        results = await pokemons_async.fetch_pokemons_batch(r, [pid for pid, _ in suggestions], 'light')
+        # Si falla un light se entrega igual el id y el nombre
+        items = [item if item is not None else {'id': pid, 'name': name}
+                 for (pid, name), (_, item, _) in zip(suggestions, results)]
+        return responses.render(responses.list_body(None, items), responses.RESPONSE_LIST_MAX_AGE, request.headers)
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+@app.route('/filterPokemon', methods=['GET'])
+async def filter_pokemon():
+    limit = request.args.get('limit', default=20, type=int)
+    offset = request.args.get('offset', default=0, type=int)
+    if limit < 1 or limit > FILTER_MAX_LIMIT or offset < 0:
+        return {'error': 'Parámetros inválidos'}, 400
+    try:
+        clauses = parse_filters({param: request.args.getlist(param) for param in FILTER_PARAMS})
+    except ValueError as ve:
+        return {'error': str(ve)}, 400
+    try:
+        r = Database().get_async_connection()
+        items, total, indexed = await pokemons_async.filter_pokemon_raw(r, clauses, limit=limit, offset=offset)
+        body = responses.page_body(items, {'total': total, 'indexed': indexed, 'limit': limit, 'offset': offset})
+        return responses.render(body, responses.RESPONSE_LIST_MAX_AGE, request.headers)
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+@app.route('/searchPokemon/<name>', methods=['GET'])
+async def search_pokemon(name: str):
+    try:
+        if not name:
+            return {'error': 'Nombre inválido'}, 400
+        r = Database().get_async_connection()
+        data = await pokemons_async.search_pokemon_by_name_raw(r, name)
+        if not data:
+            return {'error': 'Pokémon no encontrado'}, 404
+        return responses.render(responses.list_body(None, data), responses.RESPONSE_LIST_MAX_AGE, request.headers)
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+
+if __name__ == '__main__':
+    # Servidor de desarrollo async. En producción: SERVER_MODE=async gunicorn -c gunicorn.conf.py
+    warmup.start_background()
+    app.run(host='0.0.0.0', port=5000, debug=False)
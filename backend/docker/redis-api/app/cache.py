@@ -0,0 +1,532 @@
+"""
+This module centralizes reads and writes of cached Pokémon records in Redis.
+Multi-key reads go through a single MGET and write-backs through a single
+pipeline, so a request costs a constant number of round trips no matter how
+many records it touches.
+
+Entries are stored in a stale-while-revalidate envelope: each value carries
+a soft expiry, and Redis only drops it at the (later) hard expiry. Between
+the two the value is served as stale while a background refresh rebuilds
+it. Both TTLs get random jitter so keys loaded together do not expire
+together.
+
+Values are serialized by the configured codec (codec.py); keys carry the
+codec's prefix so switching formats rolls over to fresh keys.
+
+Every replica keeps an L1 LocalCache in front of Redis. Writes publish the
+rewritten keys on a Redis pub/sub channel and the other replicas drop them
+from their L1. For a few seconds after that, those keys are read from the
+primary rather than from a possibly lagging read replica, and a read that
+raced with the invalidation is not put back into L1.
+
+Writing a full record also maintains inverted indexes in Redis sets (type,
+ability or egg group -> ids) in the same pipeline, so filters are answered
+with set operations instead of reading full records.
+"""
+
+import json
+import os
+import random
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, NamedTuple, Optional
+
+import redis
+from redis.client import NEVER_DECODE
+from dotenv import load_dotenv
+import admission
+import codec
+import singleflight
+from db import RoutedRedis
+from local_cache import LocalCache
+from metrics import CACHE_LOOKUPS, CACHE_STALE, REDIS_LATENCY, timed
+
+load_dotenv()
+
+# Estado de una lectura de cache
+HIT = "hit"
+STALE = "stale"
+MISS = "miss"
+
+
+class TTLPolicy(NamedTuple):
+    soft: int  # segundos hasta que el valor se considera stale
+    hard: int  # segundos hasta que Redis lo elimina
+
+
+LIGHT = TTLPolicy(
+    int(os.getenv('CACHE_LIGHT_SOFT_TTL', '3600')),    # 1 hora
+    int(os.getenv('CACHE_LIGHT_HARD_TTL', '604800')),  # 7 días
+)
+FULL = TTLPolicy(
+    int(os.getenv('CACHE_FULL_SOFT_TTL', '3600')),     # 1 hora
+    int(os.getenv('CACHE_FULL_HARD_TTL', '604800')),   # 7 días
+)
+# Listado crudo de /pokemons (las páginas se arman desde los lights por id)
+LIST = TTLPolicy(
+    int(os.getenv('CACHE_LIST_SOFT_TTL', '300')),      # 5 minutos
+    int(os.getenv('CACHE_LIST_HARD_TTL', '86400')),    # 1 día
+)
+# Species y cadenas evolutivas casi nunca cambian y se comparten entre Pokémon
+SPECIES = TTLPolicy(
+    int(os.getenv('CACHE_SPECIES_SOFT_TTL', '86400')),    # 1 día
+    int(os.getenv('CACHE_SPECIES_HARD_TTL', '2592000')),  # 30 días
+)
+CHAIN = TTLPolicy(
+    int(os.getenv('CACHE_CHAIN_SOFT_TTL', '86400')),      # 1 día
+    int(os.getenv('CACHE_CHAIN_HARD_TTL', '2592000')),    # 30 días
+)
+# Fracción máxima de jitter aplicada a cada TTL (0.1 = ±10%)
+CACHE_TTL_JITTER = float(os.getenv('CACHE_TTL_JITTER', '0.1'))
+CACHE_REFRESH_WORKERS = int(os.getenv('CACHE_REFRESH_WORKERS', '2'))
+
+L1_ENABLED = os.getenv('L1_ENABLED', 'true').lower() == 'true'
+L1_MAX_ENTRIES = int(os.getenv('L1_MAX_ENTRIES', '10000'))
+L1_MAX_BYTES = int(os.getenv('L1_MAX_BYTES', str(32 * 1024 * 1024)))
+# TTL corto: acota lo que puede durar una entrada si se pierde una invalidación
+L1_TTL = float(os.getenv('L1_TTL', '60'))
+CACHE_INVALIDATION_CHANNEL = os.getenv('CACHE_INVALIDATION_CHANNEL', 'pokedex:cache:invalidate')
+# Tras invalidarse, una clave se lee del primario durante N segundos: una
+# réplica atrasada devolvería el valor viejo y lo volvería a meter en L1
+L1_PRIMARY_READ_SECONDS = float(os.getenv('L1_PRIMARY_READ_SECONDS', '5'))
+
+l1 = LocalCache(L1_MAX_ENTRIES, L1_MAX_BYTES, L1_TTL)
+# Identifica a esta réplica en los mensajes de invalidación
+_origin = uuid.uuid4().hex
+
+
+# Prefijo de versión del formato: cambiar de codec no reinterpreta claves viejas
+KEY_PREFIX = codec.codec.key_prefix
+
+def light_key(pid: int) -> str:
+    return f"{KEY_PREFIX}pokemon:{pid}:light"
+
+def full_key(pid: int) -> str:
+    return f"{KEY_PREFIX}pokemon:{pid}:full"
+
+def species_key(species_id: int) -> str:
+    return f"{KEY_PREFIX}pokemon:species:{species_id}"
+
+def chain_key(chain_id: int) -> str:
+    return f"{KEY_PREFIX}pokemon:chain:{chain_id}"
+
+def pokemons_key() -> str:
+    return f"{KEY_PREFIX}pokemons"
+
+def attribute_key(attribute: str, value: str) -> str:
+    return f"{KEY_PREFIX}pokemon:idx:{attribute}:{value}"
+
+def indexed_ids_key() -> str:
+    return f"{KEY_PREFIX}pokemon:idx:ids"
+
+def _record_attributes_key(pid: int) -> str:
+    # Atributos con los que quedó indexado cada id, para quitarlo si cambian
+    return f"{KEY_PREFIX}pokemon:idx:of:{pid}"
+
+def key_family(key: str) -> str:
+    """
+    Familia de una clave de cache (light, full, species, chain, list) para las métricas.
+    """
+    if key.endswith(":light"):
+        return "light"
+    if key.endswith(":full"):
+        return "full"
+    if ":species:" in key:
+        return "species"
+    if ":chain:" in key:
+        return "chain"
+    if key.endswith("pokemons"):
+        return "list"
+    return "other"
+
+
+def _jitter(ttl: int) -> int:
+    return max(1, int(ttl * (1 + random.uniform(-CACHE_TTL_JITTER, CACHE_TTL_JITTER))))
+
+def _wrap(value, policy: TTLPolicy) -> tuple[bytes, int]:
+    """
+    Serializa el valor con su expiración blanda y devuelve (payload, TTL duro con jitter).
+    """
+    soft = _jitter(policy.soft)
+    hard = max(_jitter(policy.hard), soft)
+    return codec.encode(value, time.time() + soft), hard
+
+def _unwrap(raw: bytes) -> tuple[object, str]:
+    value, soft_expires_at = codec.decode(raw)
+    return value, _status(soft_expires_at)
+
+def _status(soft_expires_at: Optional[float]) -> str:
+    if soft_expires_at is None:
+        # Entradas anteriores al sobre: se sirven tal cual hasta que expiren
+        return HIT
+    return STALE if time.time() >= soft_expires_at else HIT
+
+def raw_status(raw: bytes) -> str:
+    """
+    HIT/STALE de una entrada cruda sin decodificar su valor.
+    """
+    return _status(codec.soft_expiry(raw))
+
+def _mget_raw(redis_connection: redis.Redis, keys: list[str]) -> list[Optional[bytes]]:
+    # Los valores pueden ser binarios: se leen sin decodificar aunque el cliente use decode_responses
+    def _mget(client, keys):
+        return client.execute_command('MGET', *keys, **{NEVER_DECODE: []})
+    with timed(REDIS_LATENCY, "mget"):
+        if not isinstance(redis_connection, RoutedRedis):
+            return _mget(redis_connection, keys)
+        fresh = primary_reads(keys)
+        if not fresh:
+            return redis_connection.read(lambda client: _mget(client, keys))
+        others = [key for i, key in enumerate(keys) if i not in fresh]
+        replica = redis_connection.read(lambda client: _mget(client, others)) if others else []
+        primary = _mget(redis_connection.primary, [keys[i] for i in sorted(fresh)])
+        return merge_reads(len(keys), fresh, replica, primary)
+
+def record_lookups(keys: list[str], raws: list[Optional[bytes]], from_redis: Iterable[int]):
+    """
+    Cuenta las lecturas por familia y resultado (l1/redis/miss): un inc por
+    par, no por clave.
+    """
+    counts: dict[tuple[str, str], int] = {}
+    from_redis = set(from_redis)
+    for i, (key, raw) in enumerate(zip(keys, raws)):
+        pair = (key_family(key), "miss" if not raw else "redis" if i in from_redis else "l1")
+        counts[pair] = counts.get(pair, 0) + 1
+    for (family, result), n in counts.items():
+        CACHE_LOOKUPS.labels(family, result).inc(n)
+
+
+def get_many_with_status(redis_connection: redis.Redis, keys: list[str]) -> list[tuple[Optional[object], str]]:
+    """
+    Lee varias claves con un solo MGET.
+
+    Returns:
+        list: Un par (valor o None, HIT/STALE/MISS) por clave, en el mismo orden.
+    """
+    if not keys:
+        return []
+    raws = get_raw_many(redis_connection, keys)
+    return [_unwrap(raw) if raw else (None, MISS) for raw in raws]
+
+def get_raw_many(redis_connection: redis.Redis, keys: list[str]) -> list[Optional[bytes]]:
+    """
+    Valores serializados tal cual están en cache: primero L1, y un solo MGET
+    para las claves que no estén en L1.
+    """
+    if not L1_ENABLED:
+        try:
+            raws = _mget_raw(redis_connection, keys)
+        except Exception as e:
+            raise Exception(f"Error getting cached Pokémon data: {str(e)}")
+        record_lookups(keys, raws, range(len(keys)))
+        return raws
+    _ensure_invalidation_listener(redis_connection)
+    raws = [l1.get(key) for key in keys]
+    missing = [i for i, raw in enumerate(raws) if raw is None]
+    if missing:
+        started = time.monotonic()
+        try:
+            fetched = _mget_raw(redis_connection, [keys[i] for i in missing])
+        except Exception as e:
+            raise Exception(f"Error getting cached Pokémon data: {str(e)}")
+        for i, raw in zip(missing, fetched):
+            if raw:
+                raws[i] = raw
+                l1_set_read(keys[i], raw, started)
+    record_lookups(keys, raws, missing)
+    return raws
+
+def get_many(redis_connection: redis.Redis, keys: list[str]) -> list[Optional[object]]:
+    """
+    Igual que get_many_with_status pero solo con los valores (stale incluidos).
+    """
+    return [value for value, _ in get_many_with_status(redis_connection, keys)]
+
+def set_many(redis_connection: redis.Redis, items: list[tuple[str, object, TTLPolicy]]):
+    """
+    Escribe varias claves en un solo round trip (pipeline sin transacción).
+    Los registros full se indexan por atributo en el mismo pipeline (más una
+    lectura previa de sus atributos anteriores).
+
+    Args:
+        items (list): Tuplas (clave, valor, política de TTL) a cachear.
+    """
+    if not items:
+        return
+    fulls = indexable(items)
+    payloads = []
+    try:
+        previous = _previous_attributes(redis_connection, fulls) if fulls else {}
+        pipe = redis_connection.pipeline(transaction=False)
+        for key, value, policy in items:
+            payload, ex = _wrap(value, policy)
+            payloads.append((key, payload))
+            pipe.set(key, payload, ex=ex)
+        for full in fulls:
+            queue_index(pipe, full["id"], previous.get(full["id"], set()), attribute_tokens(full))
+        if L1_ENABLED:
+            # La invalidación viaja en el mismo round trip que las escrituras
+            pipe.publish(CACHE_INVALIDATION_CHANNEL, json.dumps({"origin": _origin, "keys": [key for key, _ in payloads]}))
+        with timed(REDIS_LATENCY, "pipeline"):
+            pipe.execute()
+    except Exception as e:
+        raise Exception(f"Error caching Pokémon data: {str(e)}")
+    if L1_ENABLED:
+        for key, payload in payloads:
+            l1.set(key, payload)
+
+def index_fulls(redis_connection: redis.Redis, fulls: list[dict]):
+    """
+    Indexa registros full ya cacheados sin reescribirlos (p. ej. desde el warmup).
+    """
+    if not fulls:
+        return
+    try:
+        previous = _previous_attributes(redis_connection, fulls)
+        pipe = redis_connection.pipeline(transaction=False)
+        for full in fulls:
+            queue_index(pipe, full["id"], previous.get(full["id"], set()), attribute_tokens(full))
+        with timed(REDIS_LATENCY, "pipeline"):
+            pipe.execute()
+    except Exception as e:
+        raise Exception(f"Error indexing Pokémon data: {str(e)}")
+
+def get_or_build(redis_connection: redis.Redis, key: str, policy: TTLPolicy, build: Callable[[], object]) -> tuple[object, str]:
+    """
+    Lee `key`; si falta la construye (coalescida) y la cachea. Si está stale
+    la devuelve igual y encola el refresco.
+
+    Returns:
+        tuple: (valor, HIT/STALE/MISS)
+    """
+    item, status = get_or_build_raw(redis_connection, key, policy, build)
+    return value_of(item), status
+
+def get_or_build_raw(redis_connection: redis.Redis, key: str, policy: TTLPolicy,
+                     build: Callable[[], object]) -> tuple[object, str]:
+    """
+    Como get_or_build, pero un valor cacheado se devuelve crudo (bytes), sin
+    decodificar; solo lo construido en un MISS llega como valor.
+
+    Returns:
+        tuple: (entrada cruda o valor construido, HIT/STALE/MISS)
+    """
+    def _rebuild():
+        value = build()
+        set_many(redis_connection, [(key, value, policy)])
+        return value
+
+    raw = get_raw_many(redis_connection, [key])[0]
+    if raw:
+        status = raw_status(raw)
+        if status == STALE:
+            schedule_refresh(key, lambda: singleflight.refresh_once(redis_connection, key, _rebuild))
+        return raw, status
+    # Un MISS (propio o esperando a otro constructor) cuenta contra el presupuesto de PokeAPI
+    admission.escalate()
+    value = singleflight.coalesce(redis_connection, key, lambda: get_many(redis_connection, [key])[0], _rebuild)
+    return value, MISS
+
+def value_of(item) -> object:
+    """
+    Valor de un elemento devuelto por las variantes *_raw: una entrada cruda
+    (bytes) se decodifica y un valor ya construido se devuelve tal cual.
+    """
+    return codec.decode(item)[0] if isinstance(item, bytes) else item
+
+
+# --------- Índices por atributo ---------
+
+# atributo del índice -> campo del PokemonFull
+INDEXED_ATTRIBUTES = {"type": "types", "ability": "abilities", "egg_group": "eggsGroups"}
+
+def attribute_tokens(full: dict) -> set[str]:
+    """
+    Atributos indexables de un full como tokens "atributo:valor".
+    """
+    tokens = set()
+    for attribute, field in INDEXED_ATTRIBUTES.items():
+        values = full.get(field) or []
+        if isinstance(values, str):
+            # types se guarda como "fire,flying"
+            values = values.split(",")
+        tokens.update(f"{attribute}:{value.strip().lower()}" for value in values if value and value.strip())
+    return tokens
+
+def indexable(items: list[tuple[str, object, TTLPolicy]]) -> list[dict]:
+    return [value for key, value, _ in items if key_family(key) == "full" and isinstance(value, dict) and "id" in value]
+
+def _previous_attributes(redis_connection: redis.Redis, fulls: list[dict]) -> dict[int, set[str]]:
+    pipe = redis_connection.pipeline(transaction=False)
+    for full in fulls:
+        pipe.smembers(_record_attributes_key(full["id"]))
+    with timed(REDIS_LATENCY, "index"):
+        members = pipe.execute()
+    return {full["id"]: {m.decode() if isinstance(m, bytes) else m for m in found} for full, found in zip(fulls, members)}
+
+def queue_index(pipe, pid: int, previous: set[str], tokens: set[str]):
+    """
+    Encola en `pipe` la actualización de los índices de `pid`: sale de los
+    valores que ya no tiene y entra en los nuevos.
+    """
+    for token in previous - tokens:
+        pipe.srem(attribute_key(*token.split(":", 1)), pid)
+    for token in tokens - previous:
+        pipe.sadd(attribute_key(*token.split(":", 1)), pid)
+    if previous != tokens:
+        pipe.delete(_record_attributes_key(pid))
+        if tokens:
+            pipe.sadd(_record_attributes_key(pid), *tokens)
+    pipe.sadd(indexed_ids_key(), pid)
+
+def filter_commands(pipe, clauses: list[tuple[str, list[str]]]):
+    """
+    Encola un SUNION por cláusula (valores alternativos de un atributo) y el
+    total de ids indexados; filter_result() arma la respuesta.
+    """
+    for attribute, values in clauses:
+        pipe.sunion([attribute_key(attribute, value) for value in values])
+    pipe.scard(indexed_ids_key())
+
+def filter_result(replies: list) -> tuple[list[int], int]:
+    """
+    Intersección de las cláusulas, ordenada por id, y cantidad de ids indexados.
+    """
+    *unions, indexed = replies
+    ids = set.intersection(*({int(pid) for pid in union} for union in unions)) if unions else set()
+    return sorted(ids), indexed
+
+def filter_ids(redis_connection: redis.Redis, clauses: list[tuple[str, list[str]]]) -> tuple[list[int], int]:
+    """
+    Ids que cumplen todas las cláusulas (atributo, [valores]): dentro de una
+    cláusula los valores se unen (OR) y entre cláusulas se intersecan (AND).
+    Un solo round trip; nunca lee registros full.
+
+    Returns:
+        tuple: (ids ordenados, cantidad de Pokémon indexados)
+    """
+    try:
+        pipe = redis_connection.pipeline(transaction=False)
+        filter_commands(pipe, clauses)
+        with timed(REDIS_LATENCY, "filter"):
+            return filter_result(pipe.execute())
+    except Exception as e:
+        raise Exception(f"Error reading Pokémon indexes: {str(e)}")
+
+
+# --------- Invalidación de L1 entre réplicas ---------
+
+_listener: Optional[threading.Thread] = None
+_listener_lock = threading.Lock()
+# clave -> time.monotonic() de su última invalidación por otra réplica
+_invalidated: dict[str, float] = {}
+_invalidated_lock = threading.Lock()
+
+def _mark_invalidated(keys: Iterable[str]):
+    now = time.monotonic()
+    with _invalidated_lock:
+        for key in keys:
+            _invalidated[key] = now
+        if len(_invalidated) > L1_MAX_ENTRIES:
+            cutoff = now - L1_PRIMARY_READ_SECONDS
+            for key in [key for key, at in _invalidated.items() if at < cutoff]:
+                del _invalidated[key]
+
+def primary_reads(keys: list[str]) -> set[int]:
+    """
+    Índices de `keys` invalidadas hace menos de L1_PRIMARY_READ_SECONDS, que
+    deben leerse del primario y no de las réplicas.
+    """
+    if not _invalidated:
+        return set()
+    cutoff = time.monotonic() - L1_PRIMARY_READ_SECONDS
+    with _invalidated_lock:
+        return {i for i, key in enumerate(keys) if _invalidated.get(key, cutoff) > cutoff}
+
+def merge_reads(count: int, fresh: set[int], replica: list, primary: list) -> list:
+    # Reúne en el orden original lo leído de las réplicas y del primario
+    replica_values, primary_values = iter(replica), iter(primary)
+    return [next(primary_values) if i in fresh else next(replica_values) for i in range(count)]
+
+def l1_set_read(key: str, raw: bytes, started: float):
+    """
+    Guarda en L1 un valor leído de Redis, salvo que la clave se haya
+    invalidado mientras tanto (la lectura pudo traer el valor viejo).
+    """
+    with _invalidated_lock:
+        invalidated_at = _invalidated.get(key)
+    if invalidated_at is None or invalidated_at < started:
+        l1.set(key, raw)
+
+def _ensure_invalidation_listener(redis_connection: redis.Redis):
+    global _listener
+    if _listener is not None:
+        return
+    with _listener_lock:
+        if _listener is None:
+            _listener = threading.Thread(
+                target=_listen_invalidations, args=(redis_connection,), name="l1-invalidation", daemon=True,
+            )
+            _listener.start()
+
+def _listen_invalidations(redis_connection: redis.Redis):
+    """
+    Hilo de fondo: borra de L1 las claves que otras réplicas reescriben y
+    las marca para leerlas del primario durante L1_PRIMARY_READ_SECONDS.
+    Si se pierde la suscripción se vacía L1, porque pudo perder mensajes.
+    """
+    backoff = 0.5
+    while True:
+        try:
+            pubsub = redis_connection.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(CACHE_INVALIDATION_CHANNEL)
+            backoff = 0.5
+            for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    payload = json.loads(message["data"])
+                except (TypeError, ValueError):
+                    continue
+                if payload.get("origin") == _origin:
+                    continue
+                keys = payload.get("keys", [])
+                _mark_invalidated(keys)
+                for key in keys:
+                    l1.delete(key)
+        except Exception:
+            pass
+        l1.clear()
+        time.sleep(backoff)
+        backoff = min(backoff * 2, 30)
+
+
+# --------- Refresco en segundo plano ---------
+
+_refresh_executor = ThreadPoolExecutor(max_workers=CACHE_REFRESH_WORKERS, thread_name_prefix="cache-refresh")
+_pending: set[str] = set()
+_pending_lock = threading.Lock()
+
+def schedule_refresh(key: str, refresh: Callable[[], object]):
+    """
+    Encola un refresco de `key` si no hay otro pendiente en este proceso.
+    Los errores se descartan: el valor stale sigue sirviéndose hasta el TTL duro.
+    """
+    CACHE_STALE.labels(key_family(key)).inc()
+    with _pending_lock:
+        if key in _pending:
+            return
+        _pending.add(key)
+
+    def _run():
+        try:
+            refresh()
+        except Exception:
+            pass
+        finally:
+            with _pending_lock:
+                _pending.discard(key)
+
+    _refresh_executor.submit(_run)
@@ -0,0 +1,185 @@
+"""
+This module is the asyncio counterpart of cache.py. It reads and writes the
+same keys, envelope and TTL policies through redis.asyncio and shares the
+process L1 cache, so the sync and async serving modes are interchangeable
+on the same Redis.
+"""
+
+import asyncio
+import contextvars
+import json
+import time
+from typing import Awaitable, Callable, Optional
+
+import redis.asyncio
+from redis.client import NEVER_DECODE
+import admission
+import cache
+import singleflight
+from cache import STALE, MISS, TTLPolicy, l1
+from db import AsyncRoutedRedis, Database
+from metrics import CACHE_STALE, REDIS_LATENCY, timed
+
+
+async def _mget_raw(redis_connection: redis.asyncio.Redis, keys: list[str]) -> list[Optional[bytes]]:
+    async def _mget(client, keys):
+        return await client.execute_command('MGET', *keys, **{NEVER_DECODE: []})
+    with timed(REDIS_LATENCY, "mget"):
+        if not isinstance(redis_connection, AsyncRoutedRedis):
+            return await _mget(redis_connection, keys)
+        # Las claves invalidadas hace poco se leen del primario (ver cache.primary_reads)
+        fresh = cache.primary_reads(keys)
+        if not fresh:
+            return await redis_connection.read(lambda client: _mget(client, keys))
+        others = [key for i, key in enumerate(keys) if i not in fresh]
+        replica = await redis_connection.read(lambda client: _mget(client, others)) if others else []
+        primary = await _mget(redis_connection.primary, [keys[i] for i in sorted(fresh)])
+        return cache.merge_reads(len(keys), fresh, replica, primary)
+
+
+async def get_raw_many(redis_connection: redis.asyncio.Redis, keys: list[str]) -> list[Optional[bytes]]:
+    """
+    Valores serializados tal cual están en cache: primero L1, y un solo MGET
+    para las claves que no estén en L1.
+    """
+    if not cache.L1_ENABLED:
+        try:
+            raws = await _mget_raw(redis_connection, keys)
+        except Exception as e:
+            raise Exception(f"Error getting cached Pokémon data: {str(e)}")
+        cache.record_lookups(keys, raws, range(len(keys)))
+        return raws
+    # El listener de invalidación es un thread con la conexión síncrona
+    cache._ensure_invalidation_listener(Database().get_connection())
+    raws = [l1.get(key) for key in keys]
+    missing = [i for i, raw in enumerate(raws) if raw is None]
+    if missing:
+        started = time.monotonic()
+        try:
+            fetched = await _mget_raw(redis_connection, [keys[i] for i in missing])
+        except Exception as e:
+            raise Exception(f"Error getting cached Pokémon data: {str(e)}")
+        for i, raw in zip(missing, fetched):
+            if raw:
+                raws[i] = raw
+                cache.l1_set_read(keys[i], raw, started)
+    cache.record_lookups(keys, raws, missing)
+    return raws
+
+async def get_many_with_status(redis_connection: redis.asyncio.Redis, keys: list[str]) -> list[tuple[Optional[object], str]]:
+    if not keys:
+        return []
+    raws = await get_raw_many(redis_connection, keys)
+    return [cache._unwrap(raw) if raw else (None, MISS) for raw in raws]
+
+async def get_many(redis_connection: redis.asyncio.Redis, keys: list[str]) -> list[Optional[object]]:
+    return [value for value, _ in await get_many_with_status(redis_connection, keys)]
+
+async def set_many(redis_connection: redis.asyncio.Redis, items: list[tuple[str, object, TTLPolicy]]):
+    """
+    Escribe varias claves en un solo round trip (pipeline sin transacción).
+    """
+    if not items:
+        return
+    fulls = cache.indexable(items)
+    payloads = []
+    try:
+        previous = await _previous_attributes(redis_connection, fulls) if fulls else {}
+        pipe = redis_connection.pipeline(transaction=False)
+        for key, value, policy in items:
+            payload, ex = cache._wrap(value, policy)
+            payloads.append((key, payload))
+            pipe.set(key, payload, ex=ex)
+        for full in fulls:
+            cache.queue_index(pipe, full["id"], previous.get(full["id"], set()), cache.attribute_tokens(full))
+        if cache.L1_ENABLED:
+            pipe.publish(cache.CACHE_INVALIDATION_CHANNEL,
+                         json.dumps({"origin": cache._origin, "keys": [key for key, _ in payloads]}))
+        with timed(REDIS_LATENCY, "pipeline"):
+            await pipe.execute()
+    except Exception as e:
+        raise Exception(f"Error caching Pokémon data: {str(e)}")
+    if cache.L1_ENABLED:
+        for key, payload in payloads:
+            l1.set(key, payload)
+
+async def _previous_attributes(redis_connection: redis.asyncio.Redis, fulls: list[dict]) -> dict[int, set[str]]:
+    pipe = redis_connection.pipeline(transaction=False)
+    for full in fulls:
+        pipe.smembers(cache._record_attributes_key(full["id"]))
+    with timed(REDIS_LATENCY, "index"):
+        members = await pipe.execute()
+    return {full["id"]: {m.decode() if isinstance(m, bytes) else m for m in found} for full, found in zip(fulls, members)}
+
+async def filter_ids(redis_connection: redis.asyncio.Redis, clauses: list[tuple[str, list[str]]]) -> tuple[list[int], int]:
+    """
+    cache.filter_ids con redis.asyncio.
+    """
+    try:
+        pipe = redis_connection.pipeline(transaction=False)
+        cache.filter_commands(pipe, clauses)
+        with timed(REDIS_LATENCY, "filter"):
+            return cache.filter_result(await pipe.execute())
+    except Exception as e:
+        raise Exception(f"Error reading Pokémon indexes: {str(e)}")
+
+async def get_or_build(redis_connection: redis.asyncio.Redis, key: str, policy: TTLPolicy,
+                       build: Callable[[], Awaitable[object]]) -> tuple[object, str]:
+    """
+    Lee `key`; si falta la construye (coalescida) y la cachea. Si está stale
+    la devuelve igual y programa el refresco.
+
+    Returns:
+        tuple: (valor, HIT/STALE/MISS)
+    """
+    item, status = await get_or_build_raw(redis_connection, key, policy, build)
+    return cache.value_of(item), status
+
+async def get_or_build_raw(redis_connection: redis.asyncio.Redis, key: str, policy: TTLPolicy,
+                           build: Callable[[], Awaitable[object]]) -> tuple[object, str]:
+    """
+    Como get_or_build, pero un valor cacheado se devuelve crudo (bytes).
+    """
+    async def _rebuild():
+        value = await build()
+        await set_many(redis_connection, [(key, value, policy)])
+        return value
+
+    async def _load():
+        return (await get_many(redis_connection, [key]))[0]
+
+    raw = (await get_raw_many(redis_connection, [key]))[0]
+    if raw:
+        status = cache.raw_status(raw)
+        if status == STALE:
+            schedule_refresh(key, lambda: singleflight.refresh_once_async(redis_connection, key, _rebuild))
+        return raw, status
+    await admission.escalate_async()
+    value = await singleflight.coalesce_async(redis_connection, key, _load, _rebuild)
+    return value, MISS
+
+
+# --------- Refresco en segundo plano ---------
+
+_pending: dict[str, asyncio.Task] = {}
+
+def schedule_refresh(key: str, refresh: Callable[[], Awaitable[object]]):
+    """
+    Lanza un refresco de `key` como tarea si no hay otro pendiente en este proceso.
+    Los errores se descartan: el valor stale sigue sirviéndose hasta el TTL duro.
+    """
+    CACHE_STALE.labels(cache.key_family(key)).inc()
+    if key in _pending:
+        return
+
+    async def _run():
+        try:
+            await refresh()
+        except Exception:
+            pass
+        finally:
+            _pending.pop(key, None)
+
+    # La referencia en _pending evita que la tarea se recolecte antes de terminar.
+    # Contexto vacío: el refresco no hereda el lugar de admisión del request
+    _pending[key] = asyncio.get_running_loop().create_task(_run(), context=contextvars.Context())
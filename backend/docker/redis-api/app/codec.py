@@ -0,0 +1,199 @@
+"""
+This module holds the pluggable codecs used to store cache entries in Redis.
+
+- JSONCodec: the original text envelope {"data": ..., "softExpiresAt": ts}.
+- MsgpackCodec: a binary frame with a 10-byte header (magic, compression,
+  soft expiry) followed by msgpack. Bodies above CACHE_COMPRESS_MIN_BYTES
+  are compressed with zstd, using a dictionary built from the sprite/API URL
+  templates and record field names, or with lz4.
+
+decode() recognizes both formats, so a reader never depends on the codec the
+writer used. Each codec also owns a key prefix: changing the codec (or the
+templates behind the dictionary) moves the cache to fresh keys instead of
+reinterpreting old ones.
+"""
+
+import json
+import os
+import struct
+import threading
+import zlib
+from typing import Optional
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - solo con CACHE_CODEC=json
+    msgpack = None
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover
+    lz4 = None
+from dotenv import load_dotenv
+from upstream import POKEAPI_BASE_URL
+
+load_dotenv()
+
+CACHE_CODEC = os.getenv('CACHE_CODEC', 'msgpack').lower()
+# zstd | lz4 | none
+CACHE_COMPRESSION = os.getenv('CACHE_COMPRESSION', 'zstd').lower()
+# Por debajo de este tamaño comprimir cuesta más de lo que ahorra
+CACHE_COMPRESS_MIN_BYTES = int(os.getenv('CACHE_COMPRESS_MIN_BYTES', '64'))
+CACHE_ZSTD_LEVEL = int(os.getenv('CACHE_ZSTD_LEVEL', '3'))
+
+SPRITES_BASE_URL = os.getenv('SPRITES_BASE_URL', 'https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon')
+
+# Plantillas de URL derivables del id del Pokémon (base del diccionario zstd)
+URL_TEMPLATES = {
+    "url": POKEAPI_BASE_URL + "/pokemon/{id}",
+    "icon": SPRITES_BASE_URL + "/{id}.png",
+    "officialArtwork": SPRITES_BASE_URL + "/other/official-artwork/{id}.png",
+}
+
+# Cabecera del frame binario: magic, compresión, softExpiresAt (float64)
+_MAGIC = 0xC1  # byte nunca usado por msgpack ni válido al inicio de JSON
+_MAGIC_BYTE = bytes((_MAGIC,))
+_HEADER = struct.Struct(">BBd")
+_NONE, _ZSTD, _LZ4 = 0, 1, 2
+
+
+class JSONCodec:
+    name = "json"
+    # Claves originales: compatible con entradas escritas antes de los codecs
+    key_prefix = ""
+
+    def encode(self, value, soft_expires_at: float) -> bytes:
+        return json.dumps({"data": value, "softExpiresAt": soft_expires_at}).encode()
+
+    def decode(self, raw: bytes) -> tuple[object, Optional[float]]:
+        decoded = json.loads(raw)
+        if isinstance(decoded, dict) and "softExpiresAt" in decoded and "data" in decoded:
+            return decoded["data"], decoded["softExpiresAt"]
+        # Entradas anteriores al sobre: sin expiración blanda
+        return decoded, None
+
+
+class MsgpackCodec:
+    name = "msgpack"
+
+    def __init__(self, compression: str = CACHE_COMPRESSION, min_bytes: int = CACHE_COMPRESS_MIN_BYTES):
+        if msgpack is None:
+            raise Exception("CACHE_CODEC=msgpack requiere el paquete msgpack")
+        self.compression = _NONE
+        if compression == "zstd" and zstandard is not None:
+            self.compression = _ZSTD
+        elif compression == "lz4" and lz4 is not None:
+            self.compression = _LZ4
+        self.min_bytes = min_bytes
+        # El diccionario forma parte del formato: si cambia, cambian las claves
+        self.key_prefix = f"v2-{_DICTIONARY_ID:08x}:"
+
+    def encode(self, value, soft_expires_at: float) -> bytes:
+        body = msgpack.packb(value, use_bin_type=True)
+        compression = _NONE
+        if self.compression != _NONE and len(body) >= self.min_bytes:
+            compression = self.compression
+            body = _zstd().compressor.compress(body) if compression == _ZSTD else lz4.frame.compress(body)
+        return _HEADER.pack(_MAGIC, compression, soft_expires_at) + body
+
+    def decode(self, raw: bytes) -> tuple[object, Optional[float]]:
+        _, compression, soft_expires_at = _HEADER.unpack_from(raw)
+        body = raw[_HEADER.size:]
+        if compression == _ZSTD:
+            body = _zstd().decompressor.decompress(body)
+        elif compression == _LZ4:
+            body = lz4.frame.decompress(body)
+        return msgpack.unpackb(body, raw=False), soft_expires_at
+
+
+# --------- Diccionario zstd ---------
+
+def _dictionary_content() -> bytes:
+    """
+    Contenido del diccionario: las plantillas de URL y los nombres de campo de
+    los registros. Las URLs se comprimen a referencias al diccionario y la
+    descompresión sigue siendo C puro (sin reconstruir campos en Python).
+    """
+    example_id = 0
+    light = {field: template.format(id=example_id) for field, template in URL_TEMPLATES.items()}
+    light = {"id": example_id, "name": "", **light}
+    full = {
+        **light, "height": 0, "weight": 0,
+        "species": {"name": "", "url": f"{POKEAPI_BASE_URL}/pokemon-species/"},
+        "eggsGroups": [], "abilities": [], "types": "", "evolutions": [light],
+    }
+    # Lo más frecuente al final: zstd prefiere las referencias cercanas
+    return msgpack.packb({"eggGroups": [], "chainUrl": f"{POKEAPI_BASE_URL}/evolution-chain/"}) + \
+        msgpack.packb(full) + msgpack.packb([light, light])
+
+_DICTIONARY = _dictionary_content() if msgpack is not None else b""
+_DICTIONARY_ID = zlib.crc32(_DICTIONARY)
+_local = threading.local()
+
+def _zstd():
+    # Los (de)compresores de zstandard no se comparten entre threads
+    if not hasattr(_local, "compressor"):
+        if zstandard is None:
+            raise Exception("Entrada comprimida con zstd y el paquete zstandard no está instalado")
+        dictionary = zstandard.ZstdCompressionDict(_DICTIONARY, dict_type=zstandard.DICT_TYPE_RAWCONTENT)
+        _local.compressor = zstandard.ZstdCompressor(
+            level=CACHE_ZSTD_LEVEL, dict_data=dictionary, write_checksum=False, write_dict_id=False,
+        )
+        _local.decompressor = zstandard.ZstdDecompressor(dict_data=dictionary)
+    return _local
+
+
+# --------- Selección ---------
+
+_json = JSONCodec()
+_codecs = {"json": JSONCodec, "msgpack": MsgpackCodec}
+
+def get_codec(name: str = CACHE_CODEC):
+    if name not in _codecs:
+        raise Exception(f"CACHE_CODEC desconocido: {name}")
+    return _codecs[name]()
+
+codec = get_codec()
+
+def encode(value, soft_expires_at: float) -> bytes:
+    return codec.encode(value, soft_expires_at)
+
+def decode(raw) -> tuple[object, Optional[float]]:
+    """
+    Decodifica una entrada escrita con cualquiera de los codecs.
+
+    Returns:
+        tuple: (valor, softExpiresAt o None si la entrada no lo tiene)
+    """
+    if isinstance(raw, str):
+        raw = raw.encode()
+    if raw[:1] == _MAGIC_BYTE:
+        # La cabecera dice cómo está comprimido: no depende del codec configurado
+        return MsgpackCodec.decode(codec, raw)
+    return _json.decode(raw)
+
+def soft_expiry(raw) -> Optional[float]:
+    """
+    softExpiresAt de una entrada. En el frame binario se lee de la cabecera
+    sin tocar el cuerpo.
+    """
+    if isinstance(raw, str):
+        raw = raw.encode()
+    if raw[:1] == _MAGIC_BYTE:
+        return _HEADER.unpack_from(raw)[2]
+    return _json.decode(raw)[1]
+
+def body(raw) -> bytes:
+    """
+    La parte de la entrada que depende solo del valor (sin la expiración
+    blanda del frame binario): dos escrituras del mismo valor dan el mismo
+    cuerpo, así que sirve para identificar el contenido.
+    """
+    if isinstance(raw, str):
+        raw = raw.encode()
+    if raw[:1] == _MAGIC_BYTE:
+        return raw[_HEADER.size:]
+    return raw
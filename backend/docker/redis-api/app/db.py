@@ -4,9 +4,18 @@ This module handles database connections and configurations.
 It uses the redis library to connect to a Redis database.
 It also loads environment variables using the dotenv library.
 
+Connections come from explicitly sized blocking pools with socket timeouts,
+TCP keepalive and health checks. When REDIS_READ_HOST points at the
+replicas service, cache reads (GET/MGET/EXISTS) go to the replicas and
+everything else to the primary; if the replicas are unreachable reads fall
+back to the primary for a while.
+
 """
 
+import threading
+import time
 import redis
+import redis.asyncio
 import os
 from dotenv import load_dotenv
 
@@ -15,29 +24,155 @@ load_dotenv()
 database_info = {
     'host': os.getenv('REDIS_HOST'),
     'port': int(os.getenv('REDIS_PORT')),
-    'user': os.getenv('REDIS_USER'),
+    'user': os.getenv('REDIS_USER') or None,
     'password': os.getenv('REDIS_PASSWORD'),
+    # Servicio de réplicas para lecturas; vacío = todo va al primario
+    'read_host': os.getenv('REDIS_READ_HOST', ''),
+    'read_port': int(os.getenv('REDIS_READ_PORT') or os.getenv('REDIS_PORT')),
 }
 
+# Conexiones máximas por pool (por proceso); con todas ocupadas, un comando
+# espera hasta REDIS_POOL_TIMEOUT segundos en lugar de fallar
+REDIS_MAX_CONNECTIONS = int(os.getenv('REDIS_MAX_CONNECTIONS', '64'))
+REDIS_POOL_TIMEOUT = float(os.getenv('REDIS_POOL_TIMEOUT', '5'))
+REDIS_SOCKET_TIMEOUT = float(os.getenv('REDIS_SOCKET_TIMEOUT', '2'))
+REDIS_CONNECT_TIMEOUT = float(os.getenv('REDIS_CONNECT_TIMEOUT', '1'))
+# PING antes de reutilizar una conexión ociosa más de N segundos
+REDIS_HEALTH_CHECK_INTERVAL = int(os.getenv('REDIS_HEALTH_CHECK_INTERVAL', '30'))
+# Tras un fallo de las réplicas, leer del primario durante N segundos
+REDIS_READ_FALLBACK_SECONDS = float(os.getenv('REDIS_READ_FALLBACK_SECONDS', '10'))
+REDIS_ASYNC_MAX_CONNECTIONS = int(os.getenv('REDIS_ASYNC_MAX_CONNECTIONS', '200'))
+REDIS_ASYNC_POOL_TIMEOUT = float(os.getenv('REDIS_ASYNC_POOL_TIMEOUT', str(REDIS_POOL_TIMEOUT)))
+
+# Comandos de solo lectura que se envían a las réplicas
+READ_COMMANDS = ('get', 'mget', 'exists')
+
+
+def _pool_kwargs(host: str, port: int) -> dict:
+    return {
+        'host': host,
+        'port': port,
+        'db': 0,
+        'decode_responses': True,
+        'username': database_info['user'],
+        'password': database_info['password'],
+        'socket_timeout': REDIS_SOCKET_TIMEOUT,
+        'socket_connect_timeout': REDIS_CONNECT_TIMEOUT,
+        'socket_keepalive': True,
+        'health_check_interval': REDIS_HEALTH_CHECK_INTERVAL,
+        'retry_on_timeout': True,
+    }
+
+def _make_client(host: str, port: int) -> redis.Redis:
+    pool = redis.BlockingConnectionPool(
+        max_connections=REDIS_MAX_CONNECTIONS, timeout=REDIS_POOL_TIMEOUT, **_pool_kwargs(host, port),
+    )
+    return redis.Redis(connection_pool=pool)
+
+def _make_async_client(host: str, port: int) -> redis.asyncio.Redis:
+    pool = redis.asyncio.BlockingConnectionPool(
+        max_connections=REDIS_ASYNC_MAX_CONNECTIONS, timeout=REDIS_ASYNC_POOL_TIMEOUT, **_pool_kwargs(host, port),
+    )
+    return redis.asyncio.Redis(connection_pool=pool)
+
+
+class _ReadFallback:
+    """
+    Recuerda cuándo fallaron las réplicas para leer del primario mientras tanto.
+    """
+
+    def __init__(self):
+        self._failed_at = None
+
+    @property
+    def replicas_ok(self) -> bool:
+        return self._failed_at is None or time.monotonic() - self._failed_at >= REDIS_READ_FALLBACK_SECONDS
+
+    def mark_failed(self):
+        self._failed_at = time.monotonic()
+
+
+class RoutedRedis:
+    """
+    Cliente con la misma interfaz que redis.Redis: GET/MGET/EXISTS van a las
+    réplicas y el resto (escrituras, pipelines, pub/sub, scripts) al primario.
+    """
+
+    def __init__(self, primary: redis.Redis, replica: redis.Redis):
+        self.primary = primary
+        self.replica = replica
+        self._fallback = _ReadFallback()
+
+    def __getattr__(self, name):
+        if name in READ_COMMANDS:
+            return lambda *args, **kwargs: self.read(lambda client: getattr(client, name)(*args, **kwargs))
+        return getattr(self.primary, name)
+
+    def read(self, fn):
+        """
+        Ejecuta fn(cliente) contra las réplicas, o contra el primario si no están disponibles.
+        """
+        if self._fallback.replicas_ok:
+            try:
+                return fn(self.replica)
+            except (redis.ConnectionError, redis.TimeoutError):
+                self._fallback.mark_failed()
+        return fn(self.primary)
+
+
+class AsyncRoutedRedis(RoutedRedis):
+    """
+    Igual que RoutedRedis para redis.asyncio.
+    """
+
+    async def read(self, fn):
+        if self._fallback.replicas_ok:
+            try:
+                return await fn(self.replica)
+            except (redis.ConnectionError, redis.TimeoutError):
+                self._fallback.mark_failed()
+        return await fn(self.primary)
+
+    async def aclose(self):
+        await self.primary.aclose()
+        await self.replica.aclose()
+
+
 # Class to handle Redis connection, singleton pattern
 class Database:
     _instance = None
     _connection = None
+    _async_connection = None
+    _lock = threading.Lock()
 
     def __new__(cls, *args, **kwargs):
         if not cls._instance:
-            cls._instance = super(Database, cls).__new__(cls)
+            with cls._lock:
+                if not cls._instance:
+                    cls._instance = super(Database, cls).__new__(cls)
         return cls._instance
 
     def get_connection(self):
         if not self._connection:
-            self._connection = redis.Redis(
-                host=database_info['host'],
-                port=database_info['port'],
-                db=0,
-                decode_responses=True,
-                password=database_info['password']
-            )
+            with self._lock:
+                if not self._connection:
+                    primary = _make_client(database_info['host'], database_info['port'])
+                    if database_info['read_host']:
+                        replica = _make_client(database_info['read_host'], database_info['read_port'])
+                        Database._connection = RoutedRedis(primary, replica)
+                    else:
+                        Database._connection = primary
         return self._connection
-    
-    
\ No newline at end of file
+
+    def get_async_connection(self):
+        # Cliente asyncio para el camino async (asgi.py); mismo enrutado que get_connection
+        if not self._async_connection:
+            with self._lock:
+                if not self._async_connection:
+                    primary = _make_async_client(database_info['host'], database_info['port'])
+                    if database_info['read_host']:
+                        replica = _make_async_client(database_info['read_host'], database_info['read_port'])
+                        Database._async_connection = AsyncRoutedRedis(primary, replica)
+                    else:
+                        Database._async_connection = primary
+        return self._async_connection
@@ -0,0 +1,190 @@
+"""
+This module implements the bounded fuzzy matching used by the search index.
+It provides a threshold-bounded, bit-parallel Levenshtein distance for a
+fixed query and a symmetric-deletion index over the normalized names, so
+typo queries only compare against the names within k edits of the query.
+
+With NumPy installed, CharBounds scores the whole catalogue at once with an
+upper bound of the fuzzy score, so the exact distance only runs on the
+names that can still reach the top-k.
+"""
+
+from collections import Counter
+from typing import Callable, Iterator
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - sin numpy se usa el recorrido escalar
+    np = None
+
+
+class QueryPattern:
+    """
+    Consulta precompilada para calcular muchas distancias contra ella con el
+    algoritmo bit-paralelo de Myers/Hyyrö: O(len(text)) operaciones por nombre
+    en lugar de la tabla completa.
+    """
+
+    __slots__ = ("text", "_peq", "_full", "_high")
+
+    def __init__(self, text: str):
+        self.text = text
+        self._peq: dict[str, int] = {}
+        for i, c in enumerate(text):
+            self._peq[c] = self._peq.get(c, 0) | (1 << i)
+        self._full = (1 << len(text)) - 1
+        self._high = 1 << (len(text) - 1) if text else 0
+
+    def distance(self, other: str, max_distance: int) -> int:
+        """
+        Distancia exacta a `other` si es <= max_distance, o max_distance + 1.
+        """
+        over = max_distance + 1
+        m = len(self.text)
+        if abs(m - len(other)) > max_distance:
+            return over
+        if m == 0:
+            return len(other)
+        peq, full, high = self._peq, self._full, self._high
+        vp, vn, dist = full, 0, m
+        remaining = len(other)
+        for c in other:
+            eq = peq.get(c, 0)
+            x = eq | vn
+            d0 = ((((x & vp) + vp) ^ vp) | x) & full
+            hp = (vn | ~(d0 | vp)) & full
+            hn = vp & d0
+            if hp & high:
+                dist += 1
+            elif hn & high:
+                dist -= 1
+            remaining -= 1
+            # Cada carácter restante puede bajar la distancia como mucho en 1
+            if dist - remaining > max_distance:
+                return over
+            hp = ((hp << 1) | 1) & full
+            hn = (hn << 1) & full
+            vp = (hn | ~(d0 | hp)) & full
+            vn = hp & d0
+        return dist if dist <= max_distance else over
+
+
+def _deletes(term: str, max_edits: int) -> set[str]:
+    """
+    Todas las variantes de `term` con hasta `max_edits` caracteres borrados.
+    """
+    variants = {term}
+    frontier = {term}
+    for _ in range(max_edits):
+        frontier = {t[:i] + t[i + 1:] for t in frontier for i in range(len(t))}
+        variants |= frontier
+    return variants
+
+
+class DeletionIndex:
+    """
+    Índice de borrado simétrico: si dos términos están a <= k ediciones,
+    comparten alguna variante con hasta k borrados cada uno. Una consulta
+    solo verifica los términos que comparten variantes con ella.
+    """
+
+    def __init__(self, max_edits: int = 2):
+        self.max_edits = max_edits
+        self._variants: dict[str, set[str]] = {}
+        self._items: dict[str, list[int]] = {}
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, term: str, item: int):
+        if term in self._items:
+            self._items[term].append(item)
+            return
+        self._items[term] = [item]
+        for variant in _deletes(term, self.max_edits):
+            self._variants.setdefault(variant, set()).add(term)
+
+    def search(self, pattern: QueryPattern, radius: int) -> Iterator[tuple[list[int], int]]:
+        """
+        Genera (items, distancia) de todos los términos a distancia <= radius.
+        """
+        radius = min(radius, self.max_edits)
+        if radius < 0:
+            return
+        terms: set[str] = set()
+        for variant in _deletes(pattern.text, radius):
+            terms |= self._variants.get(variant, set())
+        for term in terms:
+            dist = pattern.distance(term, radius)
+            if dist <= radius:
+                yield self._items[term], dist
+
+
+class CharBounds:
+    """
+    Histogramas de caracteres de todos los nombres en una matriz (nombres x
+    alfabeto). Cada edición cambia como mucho un carácter, así que
+    distance(q, c) >= max(len(q), len(c)) - caracteres en común, y eso da
+    una cota superior del score difuso calculada para todo el catálogo con
+    unas pocas operaciones vectorizadas.
+    """
+
+    def __init__(self, terms: list[str]):
+        if np is None:
+            raise Exception("CharBounds requiere numpy")
+        alphabet = sorted({c for term in terms for c in term})
+        self._columns = {c: i for i, c in enumerate(alphabet)}
+        self._counts = np.zeros((len(terms), len(alphabet)), dtype=np.uint8)
+        for row, term in enumerate(terms):
+            for c, count in Counter(term).items():
+                self._counts[row, self._columns[c]] = min(count, 255)
+        self._lengths = np.fromiter((len(term) for term in terms), dtype=np.float64, count=len(terms))
+
+    def __len__(self) -> int:
+        return len(self._lengths)
+
+    def fuzzy_upper_bounds(self, query: str) -> "np.ndarray":
+        """
+        Para cada nombre, el máximo valor posible de
+        similitud * 300 + proporción de longitudes * 50 frente a `query`.
+        """
+        common = np.zeros(len(self._lengths), dtype=np.float64)
+        for c in set(query):
+            col = self._columns.get(c)
+            if col is not None:
+                common += np.minimum(self._counts[:, col], query.count(c))
+        lq = len(query)
+        longest = np.maximum(self._lengths, lq)
+        shortest = np.minimum(self._lengths, lq)
+        # similitud <= 1 - (longest - common) / longest = common / longest
+        bounds = (300 * common + 50 * shortest) / np.maximum(longest, 1)
+        bounds[self._lengths == 0] = 0.0
+        return bounds
+
+    def candidates(self, bounds: "np.ndarray", skip: set[int], seeds: int,
+                   threshold: Callable[[], float]) -> Iterator[int]:
+        """
+        Genera las posiciones en orden de cota decreciente, sin las de `skip`.
+        Primero las `seeds` mejores (argpartition); después solo se ordenan
+        las que superan threshold() en ese momento, y se corta en cuanto la
+        cota queda por debajo del umbral vigente. Modifica `bounds`.
+        """
+        if skip:
+            bounds[np.fromiter(skip, dtype=np.intp, count=len(skip))] = -1.0
+        seeds = min(seeds, len(bounds))
+        if seeds < 1:
+            return
+        first = np.argpartition(-bounds, seeds - 1)[:seeds]
+        first = first[np.argsort(-bounds[first], kind="stable")]
+        for pos in first.tolist():
+            if bounds[pos] < 0:
+                return
+            yield pos
+        bounds[first] = -1.0
+        # Tolerancia para no descartar por redondeo un nombre que empata con el umbral
+        rest = np.flatnonzero(bounds >= threshold() - 1e-9)
+        rest = rest[np.argsort(-bounds[rest], kind="stable")]
+        for pos in rest.tolist():
+            if bounds[pos] < threshold() - 1e-9:
+                return
+            yield pos
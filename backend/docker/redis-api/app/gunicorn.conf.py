@@ -0,0 +1,73 @@
+"""
+Gunicorn configuration for the production serving mode.
+
+    gunicorn -c gunicorn.conf.py
+
+Workers are separate processes with a pool of threads each (gthread), so a
+few slow PokeAPI calls no longer stall the whole service. With
+SERVER_MODE=async the workers run the ASGI app (asgi.py) on uvicorn
+instead, and each one multiplexes its requests on an event loop. Prometheus
+metrics are shared between workers through PROMETHEUS_MULTIPROC_DIR.
+With WARMUP_ON_STARTUP=true the master runs warmup.py once, in its own
+process, when the server is ready; workers (and their recycles) never do.
+"""
+
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+
+# sync: Flask (main.py) con threads; async: Quart (asgi.py) sobre uvicorn
+SERVER_MODE = os.getenv('SERVER_MODE', 'sync').lower()
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+if SERVER_MODE == 'async':
+    wsgi_app = "asgi:app"
+    worker_class = "uvicorn.workers.UvicornWorker"
+else:
+    wsgi_app = "main:app"
+    worker_class = "gthread"
+workers = int(os.getenv('GUNICORN_WORKERS', str(min(multiprocessing.cpu_count() * 2 + 1, 8))))
+# Solo aplica al modo sync
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+# Un request que espera a PokeAPI no debe matar al worker antes de tiempo
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '60'))
+# SIGTERM: dejar de aceptar conexiones y terminar los requests en curso
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', '25'))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', '5'))
+# Reciclar workers de vez en cuando acota el crecimiento de memoria
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', '10000'))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', '1000'))
+accesslog = os.getenv('GUNICORN_ACCESSLOG', None)
+errorlog = "-"
+
+_warmup = None
+
+
+def on_starting(server):
+    # Limpiar métricas de una ejecución anterior del contenedor
+    path = os.getenv('PROMETHEUS_MULTIPROC_DIR')
+    if path:
+        shutil.rmtree(path, ignore_errors=True)
+        os.makedirs(path, exist_ok=True)
+
+
+def child_exit(server, worker):
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def when_ready(server):
+    # Un solo precalentamiento por arranque, en un proceso aparte del master
+    global _warmup
+    if os.getenv('WARMUP_ON_STARTUP', 'false').lower() == 'true':
+        app_dir = os.path.dirname(os.path.abspath(__file__))
+        _warmup = subprocess.Popen([sys.executable, os.path.join(app_dir, "warmup.py")], cwd=app_dir)
+        server.log.info("warmup iniciado (pid %s)", _warmup.pid)
+
+
+def on_exit(server):
+    if _warmup is not None and _warmup.poll() is None:
+        _warmup.terminate()
@@ -0,0 +1,93 @@
+"""
+This module implements the in-process (L1) cache that sits in front of Redis.
+It is an LRU bounded by entry count and by payload bytes, with a per-entry
+TTL. Values are stored exactly as they come from Redis (pre-serialized), so
+the memory bound is measurable and entries are never shared as mutable
+objects between requests.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from prometheus_client import Counter, Gauge
+
+# `cache` distingue las instancias: "l1" (valores de Redis), "responses", ...
+L1_HITS = Counter('l1_cache_hits_total', 'Lecturas servidas por la cache local', ['cache'])
+L1_MISSES = Counter('l1_cache_misses_total', 'Lecturas que no estaban en la cache local', ['cache'])
+L1_EVICTIONS = Counter('l1_cache_evictions_total', 'Entradas expulsadas de la cache local', ['cache', 'reason'])
+L1_ENTRIES = Gauge('l1_cache_entries', 'Entradas en la cache local', ['cache'], multiprocess_mode='livesum')
+L1_BYTES = Gauge('l1_cache_bytes', 'Tamaño aproximado de la cache local en bytes', ['cache'], multiprocess_mode='livesum')
+
+
+class LocalCache:
+    """
+    LRU + TTL thread-safe. `max_bytes` se mide sobre el tamaño del valor serializado.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl: float, name: str = "l1"):
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._data: OrderedDict[str, tuple[float, bytes]] = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._hits = L1_HITS.labels(name)
+        self._misses = L1_MISSES.labels(name)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._misses.inc()
+                return None
+            expires_at, value = entry
+            if time.monotonic() >= expires_at:
+                self._remove(key, "expired")
+                self._update_gauges()
+                self._misses.inc()
+                return None
+            self._data.move_to_end(key)
+            self._hits.inc()
+            return value
+
+    def set(self, key: str, value: bytes):
+        size = len(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._data:
+                self._remove(key, None)
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._bytes += size
+            while len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._data)), "size")
+            self._update_gauges()
+
+    def delete(self, key: str):
+        with self._lock:
+            if key in self._data:
+                self._remove(key, "invalidated")
+                self._update_gauges()
+
+    def clear(self):
+        with self._lock:
+            if self._data:
+                L1_EVICTIONS.labels(self.name, "invalidated").inc(len(self._data))
+            self._data.clear()
+            self._bytes = 0
+            self._update_gauges()
+
+    def _remove(self, key: str, reason: Optional[str]):
+        _, value = self._data.pop(key)
+        self._bytes -= len(value)
+        if reason:
+            L1_EVICTIONS.labels(self.name, reason).inc()
+
+    def _update_gauges(self):
+        L1_ENTRIES.labels(self.name).set(len(self._data))
+        L1_BYTES.labels(self.name).set(self._bytes)
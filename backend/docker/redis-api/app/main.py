@@ -1,48 +1,85 @@
-from flask import Flask
+from flask import Flask, Response
 from flask_cors import CORS
-import redis
-import json
-from pokemons import fetch_pokemons, fetch_pokemon_basic_list, get_full_pokemon, search_pokemon_by_name
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from pokemons import fetch_pokemons, fetch_pokemon_basic_list_raw, get_full_pokemon_raw, search_pokemon_by_name_raw
+from pokemons import BATCH_MAX_IDS, BATCH_STREAM_CHUNK, BATCH_STREAM_MAX_IDS, fetch_pokemons_batch, parse_batch_ids
+from pokemons import export_pokemons as export_pokemon_chunks
+from pokemons import FILTER_MAX_LIMIT, FILTER_PARAMS, filter_pokemon_raw, parse_filters
+from prometheus_client import generate_latest, CONTENT_TYPE_LATEST, CollectorRegistry, multiprocess
 import time
 from db import Database                      
 from flask import request        
-
-# --- Métricas ---
-REQUEST_COUNT = Counter(
-    'flask_http_requests_total', 
-    'Total de requests HTTP',
-    ['method', 'endpoint', 'http_status']
-)
-
-REQUEST_LATENCY = Histogram(
-    'flask_http_request_duration_seconds',
-    'Latencia de requests HTTP',
-    ['method', 'endpoint']
-)       
-
-
-
-    
+from search import SUGGEST_MAX_LIMIT, get_search_index
+import admission
+import cache
+import responses
+import upstream
+import warmup
+import os
+from metrics import REQUEST_COUNT, REQUEST_LATENCY, REQUESTS_IN_FLIGHT
 
 app = Flask(__name__)
 CORS(app)
 
+# El índice de búsqueda se construye una sola vez al arrancar
+get_search_index()
+
+def _endpoint() -> str:
+    # Plantilla de la ruta (/getPokemon/<int:pid>): con el path crudo cada id sería una serie
+    return request.url_rule.rule if request.url_rule is not None else 'unmatched'
+
 @app.before_request
 def start_timer():
     request.start_time = time.time()
+    REQUESTS_IN_FLIGHT.inc()
+    upstream.start_request()
+    if _endpoint() in admission.ADMISSION_EXEMPT:
+        return None
+    try:
+        admission.admit(Database().get_connection(), admission.client_id(request.headers, request.remote_addr))
+    except admission.Rejected as rejected:
+        return admission.response(rejected)
 
 @app.after_request
 def record_metrics(response):
+    # Rechazado al pedir lugar para PokeAPI: 503 aunque el handler lo haya tratado como error
+    rejected = admission.rejection()
+    if rejected is not None:
+        response = app.make_response(admission.response(rejected))
     resp_time = time.time() - request.start_time
-    REQUEST_LATENCY.labels(request.method, request.path).observe(resp_time)
-    REQUEST_COUNT.labels(request.method, request.path, response.status_code).inc()
+    REQUEST_LATENCY.labels(request.method, _endpoint()).observe(resp_time)
+    REQUEST_COUNT.labels(request.method, _endpoint(), response.status_code).inc()
     return response
 
+@app.teardown_request
+def end_request(exc):
+    # teardown corre siempre, también si el handler lanzó
+    REQUESTS_IN_FLIGHT.dec()
+    admission.leave()
+
 @app.route("/metrics")
 def metrics():
+    # Con varios workers (gunicorn) cada proceso escribe sus métricas en
+    # PROMETHEUS_MULTIPROC_DIR y aquí se agregan todas
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), 200, {'Content-Type': CONTENT_TYPE_LATEST}
     return generate_latest(), 200, {'Content-Type': CONTENT_TYPE_LATEST}
 
+@app.route('/healthz', methods=['GET'])
+def healthz():
+    # Liveness: el proceso responde
+    return {'status': 'ok'}, 200
+
+@app.route('/readyz', methods=['GET'])
+def readyz():
+    # Readiness: solo recibir tráfico si Redis responde
+    try:
+        Database().get_connection().ping()
+        return {'status': 'ok'}, 200
+    except Exception as e:
+        return {'status': 'unavailable', 'error': str(e)}, 503
+
 @app.route('/cache-test', methods=['GET'])
 def cache_test():
     try:
@@ -60,15 +97,8 @@ def cache_test():
 def get_pokemons():
     try:
         r = Database().get_connection()
-        cached_pokemons = r.get('pokemons')
-        
-        if cached_pokemons:
-            pokemons = json.loads(cached_pokemons)
-            return {'source': 'cache', 'data': pokemons}, 200
-        
-        pokemons = fetch_pokemons(limit=20, offset=0)
-        r.set('pokemons', json.dumps(pokemons), ex=300)  # Cache for 5 minutes
-        return {'source': 'api', 'data': pokemons}, 200
+        pokemons, source = cache.get_or_build_raw(r, cache.pokemons_key(), cache.LIST, lambda: fetch_pokemons(limit=20, offset=0))
+        return responses.render(responses.record_body(source, pokemons), responses.RESPONSE_LIST_MAX_AGE, request.headers)
     except Exception as e:
         return {'error': str(e)}, 500
     
@@ -80,13 +110,8 @@ def get_list_pokemon():
         if limit < 1 or offset < 0:
             return {'error': 'Parámetros inválidos'}, 400
         r = Database().get_connection()
-        cache_key = f"pokemon:list:{limit}:{offset}"
-        cached = r.get(cache_key)
-        if cached:
-            return {'source': 'cache', 'data': json.loads(cached)}, 200
-        data = fetch_pokemon_basic_list(r, limit=limit, offset=offset)
-        r.set(cache_key, json.dumps(data), ex=300)
-        return {'source': 'api', 'data': data}, 200
+        data, source = fetch_pokemon_basic_list_raw(r, limit=limit, offset=offset)
+        return responses.render(responses.list_body(source, data), responses.RESPONSE_LIST_MAX_AGE, request.headers)
     except Exception as e:
         return {'error': str(e)}, 500
 
@@ -96,15 +121,118 @@ def get_pokemon(pid: int):
         if pid < 1:
             return {'error': 'ID inválido'}, 400
         r = Database().get_connection()
-        cached_full = r.get(f"pokemon:{pid}:full")
-        data = get_full_pokemon(r, pid)
-        source = 'cache' if cached_full else 'api'
-        return {'source': source, 'data': data}, 200
+        data, source = get_full_pokemon_raw(r, pid)
+        return responses.render(responses.record_body(source, data), responses.RESPONSE_MAX_AGE, request.headers)
     except ValueError as ve:
         return {'error': str(ve)}, 400
     except Exception as e:
         return {'error': str(e)}, 500
-    
+
+def _stream(lines, headers: dict):
+    # El cuerpo se genera después del request (teardown ya corrió): el lugar
+    # en el presupuesto de PokeAPI se toma ahora y lo libera la respuesta al cerrarse
+    try:
+        release = admission.hold_for_stream()
+    except admission.Rejected as rejected:
+        return admission.response(rejected)
+    response = Response(lines, mimetype='application/x-ndjson', headers=headers)
+    response.call_on_close(release)
+    return response
+
+@app.route('/getPokemons', methods=['GET'])
+@app.route('/pokemons/batch', methods=['POST'])
+def get_pokemons_batch():
+    # GET /getPokemons?ids=1,4,7&detail=full  |  POST /pokemons/batch {"ids": [1, 4, 7], "detail": "full"}
+    try:
+        params = request.args
+        if request.method == 'POST':
+            params = request.get_json(silent=True)
+            if not isinstance(params, dict):
+                return {'error': 'Se esperaba un objeto JSON'}, 400
+        detail = params.get('detail', 'light')
+        if detail not in ('light', 'full'):
+            return {'error': 'detail debe ser light o full'}, 400
+        stream = str(params.get('stream', 'false')).lower() == 'true' or 'application/x-ndjson' in request.headers.get('Accept', '')
+        ids = parse_batch_ids(params.get('ids', ''), BATCH_STREAM_MAX_IDS if stream else BATCH_MAX_IDS)
+    except ValueError as ve:
+        return {'error': str(ve)}, 400
+    r = Database().get_connection()
+    if stream:
+        # NDJSON: una línea por id, emitidas tramo a tramo
+        def _lines():
+            for start in range(0, len(ids), BATCH_STREAM_CHUNK):
+                chunk = ids[start:start + BATCH_STREAM_CHUNK]
+                try:
+                    results = fetch_pokemons_batch(r, chunk, detail)
+                except Exception as e:
+                    results = [(pid, None, str(e)) for pid in chunk]
+                for result in results:
+                    yield responses.batch_line(*result) + b"\n"
+        return _stream(_lines(), {})
+    try:
+        results = fetch_pokemons_batch(r, ids, detail)
+        return responses.render(responses.batch_body(results), responses.RESPONSE_MAX_AGE, request.headers)
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+@app.route('/exportPokemons', methods=['GET'])
+def export_pokemons():
+    # NDJSON de toda la Pokédex en orden de id; para reanudar: ?after=<último id recibido>
+    detail = request.args.get('detail', 'light')
+    after = request.args.get('after', default=0, type=int)
+    limit = request.args.get('limit', default=None, type=int)
+    if detail not in ('light', 'full') or after < 0 or (limit is not None and limit < 1):
+        return {'error': 'Parámetros inválidos'}, 400
+    r = Database().get_connection()
+
+    def _lines():
+        for results in export_pokemon_chunks(r, detail, after, limit):
+            yield b"".join(responses.batch_line(*result) + b"\n" for result in results)
+    return _stream(_lines(), {'Cache-Control': 'no-store'})
+
+
+@app.route('/suggest', methods=['GET'])
+def suggest():
+    # Autocompletado: solo el índice en memoria; Redis solo si se piden los lights (detail=light)
+    q = request.args.get('q', '')
+    limit = request.args.get('limit', default=10, type=int)
+    detail = request.args.get('detail', 'none')
+    if not q.strip() or limit < 1 or limit > SUGGEST_MAX_LIMIT or detail not in ('none', 'light'):
+        return {'error': 'Parámetros inválidos'}, 400
+    suggestions = get_search_index().suggest(q, limit)
+    if detail == 'none':
+        body = responses.record_body(None, [{'id': pid, 'name': name} for pid, name in suggestions])
+        return responses.render(body, responses.RESPONSE_LIST_MAX_AGE, request.headers)
+    try:
+        r = Database().get_connection()
+        results = fetch_pokemons_batch(r, [pid for pid, _ in suggestions], 'light')
+        # Si falla un light se entrega igual el id y el nombre
+        items = [item if item is not None else {'id': pid, 'name': name}
+                 for (pid, name), (_, item, _) in zip(suggestions, results)]
+        return responses.render(responses.list_body(None, items), responses.RESPONSE_LIST_MAX_AGE, request.headers)
+    except Exception as e:
+        return {'error': str(e)}, 500
+
+
+@app.route('/filterPokemon', methods=['GET'])
+def filter_pokemon():
+    # /filterPokemon?type=fire&ability=blaze: respondido desde los índices por atributo de Redis
+    limit = request.args.get('limit', default=20, type=int)
+    offset = request.args.get('offset', default=0, type=int)
+    if limit < 1 or limit > FILTER_MAX_LIMIT or offset < 0:
+        return {'error': 'Parámetros inválidos'}, 400
+    try:
+        clauses = parse_filters({param: request.args.getlist(param) for param in FILTER_PARAMS})
+    except ValueError as ve:
+        return {'error': str(ve)}, 400
+    try:
+        r = Database().get_connection()
+        items, total, indexed = filter_pokemon_raw(r, clauses, limit=limit, offset=offset)
+        body = responses.page_body(items, {'total': total, 'indexed': indexed, 'limit': limit, 'offset': offset})
+        return responses.render(body, responses.RESPONSE_LIST_MAX_AGE, request.headers)
+    except Exception as e:
+        return {'error': str(e)}, 500
+
 
 @app.route('/searchPokemon/<name>', methods=['GET'])
 def search_pokemon(name: str):
@@ -112,14 +240,16 @@ def search_pokemon(name: str):
         if not name:
             return {'error': 'Nombre inválido'}, 400
         r = Database().get_connection()
-        data = search_pokemon_by_name(r, name)
+        data = search_pokemon_by_name_raw(r, name)
         if not data:
             return {'error': 'Pokémon no encontrado'}, 404
-        return {'data': data}, 200
+        return responses.render(responses.list_body(None, data), responses.RESPONSE_LIST_MAX_AGE, request.headers)
     except Exception as e:
         return {'error': str(e)}, 500
 
     
 if __name__ == '__main__':
+    # Servidor de desarrollo. En producción: gunicorn -c gunicorn.conf.py
     # Se ejecuta el servidor Flask en el puerto 5000, en docker se mapea al puerto 5000
+    warmup.start_background()
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
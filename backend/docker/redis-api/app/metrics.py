@@ -0,0 +1,171 @@
+"""
+Metrics shared by the sync (main.py) and async (asgi.py) apps, so both
+serving modes export the same series.
+
+HTTP series are labelled with the route template (/getPokemon/<int:pid>),
+never with the raw path, so ids and search terms do not create new series.
+The per-stage series break a request down into Redis round trips, cache
+lookups per key family, PokeAPI calls and search scoring. timed() and
+stage() cost one perf_counter pair and one observe(), with the label child
+resolved up front, so they can sit on the hot paths.
+
+The admission series (slots in use, queue depth and shed requests per
+budget) are the ones to autoscale on: a growing upstream queue or shed rate
+means the replicas are saturated.
+"""
+
+import functools
+import inspect
+import time
+
+from prometheus_client import Counter, Gauge, Histogram
+
+REQUEST_COUNT = Counter(
+    'flask_http_requests_total',
+    'Total de requests HTTP',
+    ['method', 'endpoint', 'http_status']
+)
+
+REQUEST_LATENCY = Histogram(
+    'flask_http_request_duration_seconds',
+    'Latencia de requests HTTP',
+    ['method', 'endpoint']
+)
+
+REQUESTS_IN_FLIGHT = Gauge(
+    'http_requests_in_flight',
+    'Requests HTTP en curso',
+    multiprocess_mode='livesum'
+)
+
+# Las etapas internas duran desde decenas de µs (L1, MGET) hasta segundos (PokeAPI)
+STAGE_BUCKETS = (.0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1.0, 2.5, 5.0, 10.0)
+
+REDIS_LATENCY = Histogram(
+    'redis_command_duration_seconds',
+    'Latencia de round trips a Redis',
+    ['command'],
+    buckets=STAGE_BUCKETS
+)
+
+# result: l1 | redis | miss
+CACHE_LOOKUPS = Counter(
+    'cache_lookups_total',
+    'Lecturas de cache por familia de clave',
+    ['family', 'result']
+)
+
+CACHE_STALE = Counter(
+    'cache_stale_total',
+    'Entradas stale servidas con refresco en segundo plano',
+    ['family']
+)
+
+# Un intento por observación; status es el código HTTP o "error" (red/timeout)
+UPSTREAM_LATENCY = Histogram(
+    'pokeapi_request_duration_seconds',
+    'Latencia de cada intento contra PokeAPI',
+    ['resource', 'status'],
+    buckets=STAGE_BUCKETS
+)
+
+UPSTREAM_RETRIES = Counter(
+    'pokeapi_retries_total',
+    'Reintentos contra PokeAPI',
+    ['resource']
+)
+
+# path: scalar | vectorized (solo rankings calculados, no los cacheados)
+SEARCH_LATENCY = Histogram(
+    'search_scoring_duration_seconds',
+    'Tiempo de cálculo del ranking de búsqueda',
+    ['path'],
+    buckets=STAGE_BUCKETS
+)
+
+STAGE_LATENCY = Histogram(
+    'pokedex_stage_duration_seconds',
+    'Latencia por etapa del servicio',
+    ['stage'],
+    buckets=STAGE_BUCKETS
+)
+
+# budget: cache | upstream. Gauges sumados entre los workers vivos
+ADMISSION_IN_USE = Gauge(
+    'admission_in_use',
+    'Requests admitidos en curso por presupuesto',
+    ['budget'],
+    multiprocess_mode='livesum'
+)
+
+ADMISSION_QUEUE_DEPTH = Gauge(
+    'admission_queue_depth',
+    'Requests esperando un lugar por presupuesto',
+    ['budget'],
+    multiprocess_mode='livesum'
+)
+
+ADMISSION_WAIT = Histogram(
+    'admission_wait_seconds',
+    'Espera hasta obtener un lugar en el presupuesto',
+    ['budget'],
+    buckets=STAGE_BUCKETS
+)
+
+# budget: cache | upstream | client; reason: queue_full | timeout | rate_limit
+ADMISSION_SHED = Counter(
+    'admission_shed_total',
+    'Requests rechazados por el control de admisión',
+    ['budget', 'reason']
+)
+
+
+class timed:
+    """
+    Observa en el histograma los segundos que tarda el bloque, incluso si lanza.
+
+        with timed(REDIS_LATENCY, "mget"):
+            ...
+    """
+
+    __slots__ = ("_child", "_started")
+
+    def __init__(self, histogram: Histogram, *labels: str):
+        self._child = histogram.labels(*labels) if labels else histogram
+
+    def __enter__(self):
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._child.observe(time.perf_counter() - self._started)
+        return False
+
+
+def stage(name: str):
+    """
+    Decorador: observa la duración de cada llamada en STAGE_LATENCY{stage=name}.
+    Sirve tanto para funciones como para corrutinas.
+    """
+    child = STAGE_LATENCY.labels(name)
+
+    def decorator(fn):
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    child.observe(time.perf_counter() - started)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
@@ -3,14 +3,15 @@ This is a module for fetching and processing Pokémon data from an external API.
 It uses the requests library to make HTTP requests and the json library to handle JSON data.
 """
 
-import requests
-import json
+import os
 import redis
 from db import Database
-from typing import Optional, TypedDict
-import time
-import os
-import unicodedata
+from typing import Iterator, Optional, TypedDict
+import cache
+import upstream
+import singleflight
+from metrics import STAGE_LATENCY, stage, timed
+from search import get_search_index, ranked
 
 class PokemonLight(TypedDict):
     id: int
@@ -35,7 +36,17 @@ class PokemonFull(PokemonLight):
     
 
 
-POKEAPI_BASE_URL = "https://pokeapi.co/api/v2"
+POKEAPI_BASE_URL = upstream.POKEAPI_BASE_URL
+
+# Ids máximos por lote (respuesta completa / streaming NDJSON)
+BATCH_MAX_IDS = int(os.getenv('BATCH_MAX_IDS', '100'))
+BATCH_STREAM_MAX_IDS = int(os.getenv('BATCH_STREAM_MAX_IDS', '2000'))
+# En streaming, cada tramo de ids es un MGET + descargas antes de emitir sus líneas
+BATCH_STREAM_CHUNK = int(os.getenv('BATCH_STREAM_CHUNK', '50'))
+# Página máxima de /filterPokemon
+FILTER_MAX_LIMIT = int(os.getenv('FILTER_MAX_LIMIT', '100'))
+# Parámetro de query -> atributo indexado (cache.INDEXED_ATTRIBUTES)
+FILTER_PARAMS = {"type": "type", "ability": "ability", "eggGroup": "egg_group"}
 
 def fetch_pokemons(limit=20, offset=0):
     """
@@ -49,12 +60,11 @@ def fetch_pokemons(limit=20, offset=0):
         list: A list of dictionaries containing Pokémon data.
     """
     url = f"{POKEAPI_BASE_URL}/pokemon?limit={limit}&offset={offset}"
-    response = requests.get(url)
-    
-    if response.status_code != 200:
-        raise Exception(f"Error fetching data from PokeAPI: {response.status_code}")
+    try:
+        data = upstream.get_json(url)
+    except upstream.UpstreamError as e:
+        raise Exception(f"Error fetching data from PokeAPI: {e.status or e}")
     
-    data = response.json()
     return data.get('results', [])
 
 def retrieve_pokemons_from_cache(redis_connection: redis.Redis, limit=20, offset=0):
@@ -69,25 +79,25 @@ def retrieve_pokemons_from_cache(redis_connection: redis.Redis, limit=20, offset
     Returns:
         list: A list of dictionaries containing Pokémon data from cache or API.
     """
-    ids = [str(i) for i in range(offset, offset + limit)]
+    # Los ids de PokeAPI empiezan en 1
+    ids = range(offset + 1, offset + limit + 1)
     
     # If cache miss, raise an exception
-    keys = [f"pokemon:{i}:light" for i in ids]
-    values = redis_connection.mget(keys)
+    keys = [cache.light_key(i) for i in ids]
+    values = cache.get_many(redis_connection, keys)
     
     pokemons = []
-    for value in values:
+    for key, value in zip(keys, values):
         if value:
-            pokemons.append(json.loads(value))
+            pokemons.append(value)
         else:
-            raise Exception(f"Cache miss: Missing data for pokemon with key {keys[values.index(value)]}")
+            raise Exception(f"Cache miss: Missing data for pokemon with key {key}")
     
     return pokemons
 
 def get_cached_pokemon(key: str) -> Optional[dict]:
     try:
-        cached = Database().get_connection().get(key)
-        return json.loads(cached) if cached else None
+        return cache.get_many(Database().get_connection(), [key])[0]
     except Exception as e:
         raise Exception(f"Error getting cached Pokémon data: {str(e)}")
 
@@ -100,9 +110,8 @@ def cache_full_pokemon(redis_connection: redis.Redis, pokemon_data: dict):
         redis_connection (redis.Redis): The Redis connection object.
         pokemon_data (dict): The Pokémon data to cache.
     """
-    formatted_data = json.dumps(pokemon_data)
     try:
-        redis_connection.set(f"pokemon:{pokemon_data['id']}:full", formatted_data, ex=3600)  # Cache for 1 hour
+        cache.set_many(redis_connection, [(cache.full_key(pokemon_data['id']), pokemon_data, cache.FULL)])
     except Exception as e:
         raise Exception(f"Error caching full Pokémon data: {str(e)}")
 
@@ -115,28 +124,26 @@ def cache_light_pokemon(redis_connection: redis.Redis, pokemon_data: PokemonLigh
         redis_connection (redis.Redis): The Redis connection object.
         pokemon_data (dict): The Pokémon data to cache.
     """
-    formatted_data = json.dumps(pokemon_data)
+    cache_light_pokemons(redis_connection, [pokemon_data])
+
+def cache_light_pokemons(redis_connection: redis.Redis, pokemons: list[PokemonLight]):
+    """
+    Cache several light Pokémon records in Redis with a single pipelined write.
+
+    Args:
+        redis_connection (redis.Redis): The Redis connection object.
+        pokemons (list): The Pokémon data to cache.
+    """
     try:
-        redis_connection.set(f"pokemon:{pokemon_data['id']}:light", formatted_data, ex=3600)  # Cache for 1 hour
+        cache.set_many(redis_connection, [(cache.light_key(p['id']), p, cache.LIGHT) for p in pokemons])
     except Exception as e:
         raise Exception(f"Error caching light Pokémon data: {str(e)}")
 
 
 # --------- Helpers HTTP y formateo ---------
 
-def _http_get_json(url: str, retries: int = 3, backoff: float = 0.5) -> dict:
-    last_exc = None
-    for attempt in range(retries):
-        try:
-            resp = requests.get(url, timeout=10)
-            if resp.status_code == 200:
-                return resp.json()
-            else:
-                raise Exception(f"HTTP {resp.status_code} GET {url}")
-        except Exception as e:
-            last_exc = e
-            time.sleep(backoff * (attempt + 1))
-    raise Exception(f"Fallo al obtener {url}: {last_exc}")
+def _http_get_json(url: str) -> dict:
+    return upstream.get_json(url)
 
 def _build_light_from_detail(detail: dict) -> PokemonLight:
     return {
@@ -147,6 +154,16 @@ def _build_light_from_detail(detail: dict) -> PokemonLight:
         "officialArtwork": detail["sprites"]["other"]["official-artwork"]["front_default"],
     }
 
+def _fetch_lights_concurrently(urls: list[str]) -> list[tuple[Optional[PokemonLight], Optional[Exception]]]:
+    """
+    Descarga los detalles en paralelo (pool acotado) y arma los lights.
+    Devuelve (light, error) por url, en el mismo orden.
+    """
+    if not urls:
+        return []
+    with timed(STAGE_LATENCY, "fetch_lights"):
+        return upstream.map_concurrent(lambda url: _build_light_from_detail(_http_get_json(url)), urls)
+
 def _extract_types(detail: dict) -> list[str]:
     return [t["type"]["name"] for t in detail.get("types", [])]
 
@@ -156,12 +173,59 @@ def _extract_abilities(detail: dict) -> list[str]:
 # --------- Lectura / escritura cache centralizadas ---------
 
 def _get_cached_light(redis_connection: redis.Redis, pid: int) -> Optional[PokemonLight]:
-    raw = redis_connection.get(f"pokemon:{pid}:light")
-    return json.loads(raw) if raw else None
+    return cache.get_many(redis_connection, [cache.light_key(pid)])[0]
 
 def _get_cached_full(redis_connection: redis.Redis, pid: int) -> Optional[PokemonFull]:
-    raw = redis_connection.get(f"pokemon:{pid}:full")
-    return json.loads(raw) if raw else None
+    return cache.get_many(redis_connection, [cache.full_key(pid)])[0]
+
+def _get_cached_lights(redis_connection: redis.Redis, ids: list[int]) -> dict[int, PokemonLight]:
+    """
+    Un solo MGET para todos los ids. Devuelve solo los encontrados (id -> light).
+    Los stale se devuelven igual y se refrescan en segundo plano.
+    """
+    return _get_cached_lights_with_status(redis_connection, ids)[0]
+
+def _get_cached_lights_with_status(redis_connection: redis.Redis, ids: list[int]) -> tuple[dict[int, PokemonLight], str]:
+    """
+    Como _get_cached_lights; además devuelve STALE si algún light estaba stale
+    (HIT si no). Los ausentes no cambian el estado.
+    """
+    raws, page_status = _get_cached_light_raws_with_status(redis_connection, ids)
+    return {pid: cache.value_of(raw) for pid, raw in raws.items()}, page_status
+
+def _get_cached_light_raws_with_status(redis_connection: redis.Redis, ids: list[int]) -> tuple[dict[int, bytes], str]:
+    """
+    Como _get_cached_lights_with_status, pero con las entradas crudas (sin decodificar).
+    """
+    found: dict[int, bytes] = {}
+    page_status = cache.HIT
+    for pid, raw in zip(ids, cache.get_raw_many(redis_connection, [cache.light_key(pid) for pid in ids])):
+        if raw:
+            found[pid] = raw
+            if cache.raw_status(raw) == cache.STALE:
+                page_status = cache.STALE
+                cache.schedule_refresh(cache.light_key(pid), lambda pid=pid: _refresh_light(redis_connection, pid))
+    return found, page_status
+
+def _get_cached_full_raws(redis_connection: redis.Redis, ids: list[int]) -> dict[int, bytes]:
+    """
+    Fulls cacheados y crudos (id -> bytes) con un solo MGET; los stale se refrescan en segundo plano.
+    """
+    found: dict[int, bytes] = {}
+    for pid, raw in zip(ids, cache.get_raw_many(redis_connection, [cache.full_key(pid) for pid in ids])):
+        if raw:
+            found[pid] = raw
+            if cache.raw_status(raw) == cache.STALE:
+                url = f"{POKEAPI_BASE_URL}/pokemon/{pid}"
+                cache.schedule_refresh(cache.full_key(pid), lambda url=url, pid=pid: singleflight.refresh_once(
+                    redis_connection, cache.full_key(pid), lambda: _build_full_pokemon(redis_connection, url, pid)))
+    return found
+
+def _refresh_light(redis_connection: redis.Redis, pid: int):
+    def _build():
+        light = _build_light_from_detail(_http_get_json(f"{POKEAPI_BASE_URL}/pokemon/{pid}"))
+        cache_light_pokemon(redis_connection, light)
+    singleflight.refresh_once(redis_connection, cache.light_key(pid), _build)
 
 # --------- Funciones equivalentes a service.ts ---------
 
@@ -179,22 +243,38 @@ def fetch_pokemon_by_id(redis_connection: redis.Redis, pid: int) -> PokemonLight
 def fetch_pokemons_by_ids(redis_connection: redis.Redis, ids: list[int]) -> list[PokemonLight]:
     if not ids:
         raise ValueError("Lista de IDs vacía")
-    result: list[PokemonLight] = []
-    missing: list[int] = []
-    # Primero intentar cache masiva
     for pid in ids:
-        cached = _get_cached_light(redis_connection, pid)
-        if cached:
-            result.append(cached)
-        else:
-            missing.append(pid)
-    for pid in missing:
-        result.append(fetch_pokemon_by_id(redis_connection, pid))
+        if pid < 1:
+            raise ValueError("ID debe ser positivo")
+    # Primero intentar cache masiva
+    ordered = _get_cached_lights(redis_connection, ids)
+    missing = [pid for pid in dict.fromkeys(ids) if pid not in ordered]
+    fetched = _fetch_lights_concurrently([f"{POKEAPI_BASE_URL}/pokemon/{pid}" for pid in missing])
+    for light, error in fetched:
+        if error:
+            raise error
+    lights = [light for light, _ in fetched]
+    ordered.update((light["id"], light) for light in lights)
+    cache_light_pokemons(redis_connection, lights)
     # Mantener orden según ids
-    ordered = {p["id"]: p for p in result}
     return [ordered[i] for i in ids if i in ordered]
 
 def fetch_pokemon_by_url(redis_connection: redis.Redis, url: str) -> PokemonFull:
+    return fetch_pokemon_by_url_with_status(redis_connection, url)[0]
+
+def fetch_pokemon_by_url_with_status(redis_connection: redis.Redis, url: str) -> tuple[PokemonFull, str]:
+    """
+    Como fetch_pokemon_by_url, pero devuelve también el estado de cache (hit/stale/miss).
+    """
+    item, status = fetch_pokemon_by_url_raw(redis_connection, url)
+    return cache.value_of(item), status
+
+@stage("full")
+def fetch_pokemon_by_url_raw(redis_connection: redis.Redis, url: str) -> tuple[object, str]:
+    """
+    Como fetch_pokemon_by_url_with_status, pero un full cacheado se devuelve
+    crudo (bytes) para servirlo sin decodificarlo.
+    """
     # La URL esperada: https://pokeapi.co/api/v2/pokemon/{id}
     if not url.startswith(f"{POKEAPI_BASE_URL}/pokemon/"):
         raise ValueError("URL inválida para Pokémon")
@@ -202,13 +282,43 @@ def fetch_pokemon_by_url(redis_connection: redis.Redis, url: str) -> PokemonFull
         pid = int(url.rstrip("/").split("/")[-1])
     except Exception:
         raise ValueError("No se pudo extraer ID de la URL")
-    cached_full = _get_cached_full(redis_connection, pid)
-    if cached_full:
-        return cached_full
+    raw = cache.get_raw_many(redis_connection, [cache.full_key(pid)])[0]
+    if raw:
+        status = cache.raw_status(raw)
+        if status == cache.STALE:
+            cache.schedule_refresh(cache.full_key(pid), lambda: singleflight.refresh_once(
+                redis_connection, cache.full_key(pid), lambda: _build_full_pokemon(redis_connection, url, pid)))
+        return raw, status
+    # Un solo rebuild por clave aunque expire para muchos requests a la vez
+    full = singleflight.coalesce(
+        redis_connection,
+        cache.full_key(pid),
+        lambda: _get_cached_full(redis_connection, pid),
+        lambda: _build_full_pokemon(redis_connection, url, pid),
+    )
+    return full, cache.MISS
+
+@stage("build_full")
+def _build_full_pokemon(redis_connection: redis.Redis, url: str, pid: int) -> PokemonFull:
+    """
+    Arma el PokemonFull desde PokeAPI y lo cachea (full + light).
+    """
     detail = _http_get_json(url)
     # Evoluciones + egg groups desde species
     evo_and_eggs = fetch_pokemon_evolutions_and_egg_groups(redis_connection, detail["species"]["url"])
-    full: PokemonFull = {
+    full = _build_full_from_detail(detail, url, evo_and_eggs["eggGroups"], evo_and_eggs["evolutions"])
+    # Full y light en un solo pipeline
+    try:
+        cache.set_many(redis_connection, [
+            (cache.full_key(pid), full, cache.FULL),
+            (cache.light_key(pid), _build_light_from_detail(detail), cache.LIGHT),
+        ])
+    except Exception as e:
+        raise Exception(f"Error caching full Pokémon data: {str(e)}")
+    return full
+
+def _build_full_from_detail(detail: dict, url: str, egg_groups: list[str], evolutions: list[PokemonLight]) -> PokemonFull:
+    return {
         "id": detail["id"],
         "name": detail["name"],
         "url": url,
@@ -220,39 +330,201 @@ def fetch_pokemon_by_url(redis_connection: redis.Redis, url: str) -> PokemonFull
             "name": detail["species"]["name"],
             "url": detail["species"]["url"],
         },
-        "eggsGroups": evo_and_eggs["eggGroups"],
+        "eggsGroups": egg_groups,
         "abilities": _extract_abilities(detail),
         # En tu TypedDict types es str; aquí concateno. Cambia a list[str] si ajustas el tipo.
         "types": ",".join(_extract_types(detail)),
-        "evolutions": evo_and_eggs["evolutions"],
+        "evolutions": evolutions,
     }
-    cache_full_pokemon(redis_connection, full)
-    # Asegurar también el light
-    if not _get_cached_light(redis_connection, pid):
-        cache_light_pokemon(redis_connection, _build_light_from_detail(detail))
-    return full
 
 def fetch_pokemon_basic_list(redis_connection: redis.Redis, limit=20, offset=0) -> list[PokemonLight]:
     """
     Similar a fetchPokemons en TS: obtiene lista (light). Usa cache individual.
     """
-    base_list = fetch_pokemons(limit=limit, offset=offset)  # ya devuelve name/url
+    return fetch_pokemon_basic_list_with_status(redis_connection, limit=limit, offset=offset)[0]
+
+def fetch_pokemon_basic_list_with_status(redis_connection: redis.Redis, limit=20, offset=0) -> tuple[list[PokemonLight], str]:
+    """
+    Página del listado armada desde los lights por id: los ids salen del
+    índice local, se leen con un solo MGET y solo los que faltan van a
+    PokeAPI. No se cachean páginas, así que paginar no duplica registros.
+
+    Returns:
+        tuple: (lights en orden de id, estado de cache de la página)
+    """
+    items, status = fetch_pokemon_basic_list_raw(redis_connection, limit=limit, offset=offset)
+    return [cache.value_of(item) for item in items], status
+
+@stage("list_page")
+def fetch_pokemon_basic_list_raw(redis_connection: redis.Redis, limit=20, offset=0) -> tuple[list[object], str]:
+    """
+    Como fetch_pokemon_basic_list_with_status, pero los lights cacheados se
+    devuelven crudos (bytes) y solo los descargados llegan como dict.
+    """
+    ids = get_search_index().page_ids(limit, offset)
+    if not ids:
+        return [], cache.HIT
+    return _lights_raw(redis_connection, ids)
+
+def _lights_raw(redis_connection: redis.Redis, ids: list[int]) -> tuple[list[object], str]:
+    """
+    Lights de `ids` en orden: un MGET y solo los que faltan van a PokeAPI.
+    Los cacheados llegan crudos (bytes).
+    """
+    cached, status = _get_cached_light_raws_with_status(redis_connection, ids)
+    missing = [pid for pid in ids if pid not in cached]
+    fetched: list[PokemonLight] = []
+    for pid, (light, error) in zip(missing, _fetch_lights_concurrently([f"{POKEAPI_BASE_URL}/pokemon/{pid}" for pid in missing])):
+        if error:
+            raise error
+        cached[pid] = light
+        fetched.append(light)
+    cache_light_pokemons(redis_connection, fetched)
+    return [cached[pid] for pid in ids], cache.MISS if missing else status
+
+# --------- Lotes ---------
+
+def parse_batch_ids(value, max_ids: int = BATCH_MAX_IDS) -> list[int]:
+    """
+    Ids de un pedido de lote: "1,4,7" (query string) o [1, 4, 7] (JSON).
+
+    Raises:
+        ValueError: Si la lista está vacía, no son enteros o supera max_ids.
+    """
+    if isinstance(value, str):
+        value = [token for token in value.split(",") if token.strip()]
+    if not isinstance(value, list) or not value:
+        raise ValueError("Lista de IDs vacía")
+    try:
+        ids = [int(pid) for pid in value]
+    except (TypeError, ValueError):
+        raise ValueError("Los IDs deben ser enteros")
+    if len(ids) > max_ids:
+        raise ValueError(f"Máximo {max_ids} IDs por pedido")
+    return ids
+
+def _batch_error(error: Exception) -> str:
+    if isinstance(error, upstream.UpstreamError) and error.status == 404:
+        return "Pokémon no encontrado"
+    return str(error)
+
+def _load_full(redis_connection: redis.Redis, pid: int) -> PokemonFull:
+    url = f"{POKEAPI_BASE_URL}/pokemon/{pid}"
+    return singleflight.coalesce(
+        redis_connection,
+        cache.full_key(pid),
+        lambda: _get_cached_full(redis_connection, pid),
+        lambda: _build_full_pokemon(redis_connection, url, pid),
+    )
+
+@stage("batch")
+def fetch_pokemons_batch(redis_connection: redis.Redis, ids: list[int], detail: str = "light") -> list[tuple[int, object, Optional[str]]]:
+    """
+    Varios registros (light o full) en una sola llamada: un MGET para todos,
+    los que faltan se descargan en paralelo y cada id reporta su propio error
+    en lugar de hacer fallar el lote.
+
+    Args:
+        ids (list): Ids pedidos; se respeta el orden y los repetidos.
+        detail (str): "light" o "full".
+
+    Returns:
+        list: Tuplas (id, registro o None, mensaje de error o None). Los
+        registros cacheados llegan crudos (bytes), como en las variantes *_raw.
+    """
+    valid = [pid for pid in dict.fromkeys(ids) if pid >= 1]
+    found: dict[int, object]
+    if detail == "full":
+        found = _get_cached_full_raws(redis_connection, valid)
+        missing = [pid for pid in valid if pid not in found]
+        fetched = upstream.map_builds(lambda pid: _load_full(redis_connection, pid), missing)
+    else:
+        found = _get_cached_light_raws_with_status(redis_connection, valid)[0]
+        missing = [pid for pid in valid if pid not in found]
+        fetched = _fetch_lights_concurrently([f"{POKEAPI_BASE_URL}/pokemon/{pid}" for pid in missing])
+    errors: dict[int, str] = {}
     lights: list[PokemonLight] = []
-    for item in base_list:
-        # extraer id desde URL de la API
+    for pid, (record, error) in zip(missing, fetched):
+        if error:
+            errors[pid] = _batch_error(error)
+        else:
+            found[pid] = record
+            lights.append(record)
+    if detail != "full":
+        # Los fulls ya se cachean al construirse
+        cache_light_pokemons(redis_connection, lights)
+    return [
+        (pid, found.get(pid), None if pid in found else errors.get(pid, "ID debe ser positivo"))
+        for pid in ids
+    ]
+
+def export_pokemons(redis_connection: redis.Redis, detail: str = "light", after: int = 0,
+                    limit: Optional[int] = None) -> Iterator[list[tuple[int, object, Optional[str]]]]:
+    """
+    Recorre la Pokédex en orden de id a partir de `after`, de a
+    BATCH_STREAM_CHUNK ids: cada tramo es un MGET más las descargas de los
+    que falten. Es un generador, así que solo hay un tramo en memoria y el
+    siguiente no se lee hasta que el consumidor pide más.
+
+    Yields:
+        list: Resultados del tramo, como fetch_pokemons_batch.
+    """
+    index = get_search_index()
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = BATCH_STREAM_CHUNK if remaining is None else min(BATCH_STREAM_CHUNK, remaining)
+        ids = index.ids_after(after, size)
+        if not ids:
+            return
         try:
-            pid = int(item["url"].rstrip("/").split("/")[-1])
-        except Exception:
-            continue
-        cached = _get_cached_light(redis_connection, pid)
-        if cached:
-            lights.append(cached)
-            continue
-        detail = _http_get_json(item["url"])
-        light = _build_light_from_detail(detail)
-        cache_light_pokemon(redis_connection, light)
-        lights.append(light)
-    return lights
+            results = fetch_pokemons_batch(redis_connection, ids, detail)
+        except Exception as e:
+            results = [(pid, None, str(e)) for pid in ids]
+        yield results
+        after = ids[-1]
+        if remaining is not None:
+            remaining -= len(ids)
+
+# --------- Filtros por atributo ---------
+
+def parse_filters(params: dict[str, list[str]]) -> list[tuple[str, list[str]]]:
+    """
+    Cláusulas de /filterPokemon: cada aparición de un parámetro es una
+    cláusula y sus valores separados por coma se unen; las cláusulas se
+    intersecan. type=fire,water -> fuego o agua; type=fire&type=flying ->
+    fuego y volador.
+
+    Args:
+        params (dict): Parámetro de query -> lista de apariciones.
+
+    Raises:
+        ValueError: Si no hay ningún filtro.
+    """
+    clauses = []
+    for param, attribute in FILTER_PARAMS.items():
+        for occurrence in params.get(param, []):
+            values = sorted({value.strip().lower() for value in occurrence.split(",") if value.strip()})
+            if values:
+                clauses.append((attribute, values))
+    if not clauses:
+        raise ValueError(f"Se requiere al menos un filtro: {', '.join(FILTER_PARAMS)}")
+    return clauses
+
+@stage("filter")
+def filter_pokemon_raw(redis_connection: redis.Redis, clauses: list[tuple[str, list[str]]],
+                       limit: int = 20, offset: int = 0) -> tuple[list[object], int, int]:
+    """
+    Página de los Pokémon que cumplen los filtros, resuelta con los índices
+    de Redis: un round trip para los ids y un MGET para los lights de la
+    página. Solo aparecen los Pokémon con su full ya cacheado (indexado).
+
+    Returns:
+        tuple: (lights de la página en orden de id, total que cumple, total indexado)
+    """
+    ids, indexed = cache.filter_ids(redis_connection, clauses)
+    page = ids[offset:offset + limit]
+    items = _lights_raw(redis_connection, page)[0] if page else []
+    return items, len(ids), indexed
 
 # --------- Evoluciones y Egg Groups ---------
 
@@ -260,18 +532,64 @@ def fetch_pokemon_evolutions_and_egg_groups(redis_connection: redis.Redis, speci
     """
     Devuelve {"evolutions": list[PokemonLight], "eggGroups": list[str]}
     """
-    species = _http_get_json(species_url)
-    egg_groups = [g["name"] for g in species.get("egg_groups", [])]
-    evo_chain_url = species["evolution_chain"]["url"]
-    evolutions = fetch_evolution_chain(redis_connection, evo_chain_url)
+    species = get_species_info(redis_connection, species_url)
+    evolutions = fetch_evolution_chain(redis_connection, species["chainUrl"])
     return {
         "evolutions": evolutions,
-        "eggGroups": egg_groups,
+        "eggGroups": species["eggGroups"],
     }
 
 def fetch_evolution_chain(redis_connection: redis.Redis, chain_url: str) -> list[PokemonLight]:
-    chain = _http_get_json(chain_url)
-    evolutions: list[PokemonLight] = []
+    pids = get_chain_ids(redis_connection, chain_url)
+    if not pids:
+        return []
+    # lights en un solo MGET
+    return fetch_pokemons_by_ids(redis_connection, pids)
+
+def _id_from_url(url: str) -> int:
+    try:
+        return int(url.rstrip("/").split("/")[-1])
+    except Exception:
+        raise ValueError(f"No se pudo extraer ID de la URL {url}")
+
+def _species_info_from_json(species: dict) -> dict:
+    return {
+        "eggGroups": [g["name"] for g in species.get("egg_groups", [])],
+        "chainUrl": species["evolution_chain"]["url"],
+    }
+
+@stage("species")
+def get_species_info(redis_connection: redis.Redis, species_url: str) -> dict:
+    """
+    Egg groups y URL de la cadena evolutiva de una species, cacheados bajo
+    su propia clave para no re-descargar la species por cada Pokémon.
+
+    Returns:
+        dict: {"eggGroups": list[str], "chainUrl": str}
+    """
+    info, _ = cache.get_or_build(
+        redis_connection, cache.species_key(_id_from_url(species_url)), cache.SPECIES,
+        lambda: _species_info_from_json(_http_get_json(species_url)),
+    )
+    return info
+
+@stage("chain")
+def get_chain_ids(redis_connection: redis.Redis, chain_url: str) -> list[int]:
+    """
+    Ids resueltos de una cadena evolutiva, cacheados una vez por cadena
+    (p. ej. Eevee y sus 8 evoluciones comparten la misma entrada).
+    """
+    pids, _ = cache.get_or_build(
+        redis_connection, cache.chain_key(_id_from_url(chain_url)), cache.CHAIN,
+        lambda: _chain_pids(_http_get_json(chain_url)),
+    )
+    return pids
+
+def _chain_pids(chain: dict) -> list[int]:
+    """
+    Ids de la cadena evolutiva en orden de recorrido, sin duplicados.
+    """
+    pids: list[int] = []
     def _traverse(node: dict):
         if not node:
             return
@@ -282,128 +600,26 @@ def fetch_evolution_chain(redis_connection: redis.Redis, chain_url: str) -> list
         except Exception:
             pid = None
         if pid:
-            evolutions.append(fetch_pokemon_by_id(redis_connection, pid))
+            pids.append(pid)
         for nxt in node.get("evolves_to", []):
             _traverse(nxt)
     _traverse(chain["chain"])
     # eliminar duplicados conservando orden
-    seen = set()
-    unique: list[PokemonLight] = []
-    for p in evolutions:
-        if p["id"] not in seen:
-            seen.add(p["id"])
-            unique.append(p)
-    return unique
+    return list(dict.fromkeys(pids))
 
 # --------- Endpoint oriented helpers (opcional) ---------
 
 def get_full_pokemon(redis_connection: redis.Redis, pid: int) -> PokemonFull:
-    url = f"{POKEAPI_BASE_URL}/pokemon/{pid}"
-    return fetch_pokemon_by_url(redis_connection, url)
+    return get_full_pokemon_with_status(redis_connection, pid)[0]
 
+def get_full_pokemon_with_status(redis_connection: redis.Redis, pid: int) -> tuple[PokemonFull, str]:
+    url = f"{POKEAPI_BASE_URL}/pokemon/{pid}"
+    return fetch_pokemon_by_url_with_status(redis_connection, url)
 
-def _load_search_index() -> dict[str, int]:
-    """
-    Carga y cachea el índice (name -> id) desde el json.
-    """
-    path = os.path.join(os.path.dirname(__file__), "search_pokemons.json")
-    with open(path, "r", encoding="utf-8") as f:
-        return json.load(f)
+def get_full_pokemon_raw(redis_connection: redis.Redis, pid: int) -> tuple[object, str]:
+    url = f"{POKEAPI_BASE_URL}/pokemon/{pid}"
+    return fetch_pokemon_by_url_raw(redis_connection, url)
 
-def _normalize(txt: str) -> str:
-    txt = txt.lower()
-    txt = unicodedata.normalize("NFD", txt)
-    txt = "".join(c for c in txt if unicodedata.category(c) != "Mn")
-    # Reemplazar separadores por espacio y colapsar
-    out = []
-    last_space = False
-    for c in txt:
-        if c.isalnum():
-            out.append(c)
-            last_space = False
-        else:
-            if not last_space:
-                out.append(" ")
-                last_space = True
-    return " ".join("".join(out).split())
-
-def _levenshtein(a: str, b: str, max_distance: int | None = None) -> int:
-    """
-    Distancia Levenshtein iterativa con poda opcional (early exit).
-    """
-    if a == b:
-        return 0
-    la, lb = len(a), len(b)
-    if la == 0:
-        return lb
-    if lb == 0:
-        return la
-    if la > lb:
-        a, b = b, a
-        la, lb = lb, la
-    prev = list(range(la + 1))
-    for j in range(1, lb + 1):
-        cur = [j] + [0] * la
-        bj = b[j - 1]
-        # Rango de poda
-        min_row = float("inf")
-        for i in range(1, la + 1):
-            cost = 0 if a[i - 1] == bj else 1
-            cur[i] = min(
-                prev[i] + 1,      # eliminación
-                cur[i - 1] + 1,   # inserción
-                prev[i - 1] + cost  # sustitución
-            )
-            if cur[i] < min_row:
-                min_row = cur[i]
-        prev = cur
-        if max_distance is not None and min_row > max_distance:
-            return max_distance + 1
-    return prev[la]
-
-def _similarity(a: str, b: str) -> float:
-    """
-    Similitud normalizada basada en Levenshtein.
-    """
-    if not a or not b:
-        return 0.0
-    dist = _levenshtein(a, b, max_distance=max(len(a), len(b)))
-    return 1.0 - dist / max(len(a), len(b))
-
-def _score(query_norm: str, candidate_norm: str, original_candidate: str) -> float:
-    """
-    Calcula un score heurístico:
-    - match exacto
-    - prefijo
-    - substring
-    - similitud difusa
-    - cobertura de tokens
-    """
-    if not candidate_norm:
-        return 0.0
-    score = 0.0
-    if candidate_norm == query_norm:
-        score += 1000
-    if candidate_norm.startswith(query_norm):
-        score += 800 * (len(query_norm) / max(len(candidate_norm), 1))
-    # Substring
-    if query_norm in candidate_norm and not candidate_norm.startswith(query_norm):
-        pos = candidate_norm.find(query_norm)
-        penalty = pos * 5
-        score += max(600 - penalty, 100)
-    # Tokens
-    q_tokens = set(query_norm.split())
-    c_tokens = set(candidate_norm.split())
-    if q_tokens:
-        overlap = len(q_tokens & c_tokens) / len(q_tokens)
-        score += overlap * 400
-    # Fuzzy completo
-    sim = _similarity(query_norm, candidate_norm)
-    score += sim * 300
-    # Bonus por proximidad de longitud (evita que nombres muy largos dominen)
-    length_ratio = min(len(candidate_norm), len(query_norm)) / max(len(candidate_norm), len(query_norm))
-    score += length_ratio * 50
-    return score
 
 def search_pokemon_by_name(redis_connection: redis.Redis, query: str, limit: int = 10) -> list[PokemonLight]:
     """
@@ -412,36 +628,39 @@ def search_pokemon_by_name(redis_connection: redis.Redis, query: str, limit: int
     - Ranking por varios criterios.
     Retorna lista de PokemonLight ordenados por relevancia.
     """
+    return [cache.value_of(item) for item in search_pokemon_by_name_raw(redis_connection, query, limit=limit)]
+
+@stage("search")
+def search_pokemon_by_name_raw(redis_connection: redis.Redis, query: str, limit: int = 10) -> list[object]:
+    """
+    Como search_pokemon_by_name, pero los lights cacheados se devuelven crudos (bytes).
+    """
     query = (query or "").strip()
     if not query:
         return []
-    index = _load_search_index()
-    query_norm = _normalize(query)
-    scored: list[tuple[float, str, int]] = []
-    for name, pid in index.items():
-        norm = _normalize(name)
-        score = _score(query_norm, norm, name)
-        if score > 0:
-            scored.append((score, name, pid))
+    scored = ranked(query, limit=limit, redis_connection=redis_connection)
     if not scored:
         return []
-    scored.sort(key=lambda x: (-x[0], x[1]))  # score desc, nombre asc para estabilidad
-    results: list[PokemonLight] = []
-    for _, name, pid in scored[:limit]:
-        # intentar cache; si no, fetch
-        cached = _get_cached_light(redis_connection, pid)
-        if cached:
-            results.append(cached)
+    cached = _get_cached_light_raws_with_status(redis_connection, [pid for _, _, pid in scored])[0]
+    # intentar cache; si no, fetch concurrente de los que faltan
+    missing = [pid for _, _, pid in scored if pid not in cached]
+    fetched: list[PokemonLight] = []
+    for pid, (light, error) in zip(missing, _fetch_lights_concurrently([f"{POKEAPI_BASE_URL}/pokemon/{pid}" for pid in missing])):
+        if not error:
+            cached[pid] = light
+            fetched.append(light)
+    results: list[object] = []
+    for _, name, pid in scored:
+        if pid in cached:
+            results.append(cached[pid])
         else:
-            try:
-                results.append(fetch_pokemon_by_id(redis_connection, pid))
-            except Exception:
-                # Si falla la API, al menos entregar un light mínimo
-                results.append({
-                    "id": pid,
-                    "name": name,
-                    "url": f"{POKEAPI_BASE_URL}/pokemon/{pid}",
-                    "icon": "",
-                    "officialArtwork": "",
-                })
+            # Si falla la API, al menos entregar un light mínimo
+            results.append({
+                "id": pid,
+                "name": name,
+                "url": f"{POKEAPI_BASE_URL}/pokemon/{pid}",
+                "icon": "",
+                "officialArtwork": "",
+            })
+    cache_light_pokemons(redis_connection, fetched)
     return results
\ No newline at end of file
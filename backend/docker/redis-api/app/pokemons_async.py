@@ -0,0 +1,339 @@
+"""
+This module is the asyncio version of the Pokémon service layer used by the
+async serving mode (asgi.py). It mirrors pokemons.py function by function
+and reuses its formatting helpers, cache keys and TTL policies, so both
+paths return the same payloads and share the same Redis entries.
+"""
+
+import redis.asyncio
+import cache
+import cache_async
+import singleflight
+import upstream
+import upstream_async
+from metrics import STAGE_LATENCY, stage, timed
+from typing import AsyncIterator, Optional
+from pokemons import (
+    BATCH_STREAM_CHUNK,
+    POKEAPI_BASE_URL,
+    PokemonFull,
+    PokemonLight,
+    _batch_error,
+    _build_full_from_detail,
+    _build_light_from_detail,
+    _chain_pids,
+    _id_from_url,
+    _species_info_from_json,
+)
+from search import get_search_index, ranked_async
+
+
+async def fetch_pokemons(limit=20, offset=0):
+    url = f"{POKEAPI_BASE_URL}/pokemon?limit={limit}&offset={offset}"
+    try:
+        data = await upstream_async.get_json(url)
+    except upstream.UpstreamError as e:
+        raise Exception(f"Error fetching data from PokeAPI: {e.status or e}")
+    return data.get('results', [])
+
+async def cache_light_pokemons(redis_connection: redis.asyncio.Redis, pokemons: list[PokemonLight]):
+    try:
+        await cache_async.set_many(redis_connection, [(cache.light_key(p['id']), p, cache.LIGHT) for p in pokemons])
+    except Exception as e:
+        raise Exception(f"Error caching light Pokémon data: {str(e)}")
+
+
+# --------- Helpers HTTP y cache ---------
+
+async def _fetch_light(url: str) -> PokemonLight:
+    return _build_light_from_detail(await upstream_async.get_json(url))
+
+async def _fetch_lights_concurrently(urls: list[str]) -> list[tuple[Optional[PokemonLight], Optional[Exception]]]:
+    if not urls:
+        return []
+    with timed(STAGE_LATENCY, "fetch_lights"):
+        return await upstream_async.map_concurrent(_fetch_light, urls)
+
+async def _get_cached_lights(redis_connection: redis.asyncio.Redis, ids: list[int]) -> dict[int, PokemonLight]:
+    """
+    Un solo MGET para todos los ids. Devuelve solo los encontrados (id -> light).
+    Los stale se devuelven igual y se refrescan en segundo plano.
+    """
+    return (await _get_cached_lights_with_status(redis_connection, ids))[0]
+
+async def _get_cached_lights_with_status(redis_connection: redis.asyncio.Redis, ids: list[int]) -> tuple[dict[int, PokemonLight], str]:
+    raws, page_status = await _get_cached_light_raws_with_status(redis_connection, ids)
+    return {pid: cache.value_of(raw) for pid, raw in raws.items()}, page_status
+
+async def _get_cached_light_raws_with_status(redis_connection: redis.asyncio.Redis, ids: list[int]) -> tuple[dict[int, bytes], str]:
+    found: dict[int, bytes] = {}
+    page_status = cache.HIT
+    raws = await cache_async.get_raw_many(redis_connection, [cache.light_key(pid) for pid in ids])
+    for pid, raw in zip(ids, raws):
+        if raw:
+            found[pid] = raw
+            if cache.raw_status(raw) == cache.STALE:
+                page_status = cache.STALE
+                cache_async.schedule_refresh(cache.light_key(pid), lambda pid=pid: _refresh_light(redis_connection, pid))
+    return found, page_status
+
+async def _get_cached_full_raws(redis_connection: redis.asyncio.Redis, ids: list[int]) -> dict[int, bytes]:
+    found: dict[int, bytes] = {}
+    raws = await cache_async.get_raw_many(redis_connection, [cache.full_key(pid) for pid in ids])
+    for pid, raw in zip(ids, raws):
+        if raw:
+            found[pid] = raw
+            if cache.raw_status(raw) == cache.STALE:
+                url = f"{POKEAPI_BASE_URL}/pokemon/{pid}"
+                cache_async.schedule_refresh(cache.full_key(pid), lambda url=url, pid=pid: singleflight.refresh_once_async(
+                    redis_connection, cache.full_key(pid), lambda: _build_full_pokemon(redis_connection, url, pid)))
+    return found
+
+async def _refresh_light(redis_connection: redis.asyncio.Redis, pid: int):
+    async def _build():
+        light = await _fetch_light(f"{POKEAPI_BASE_URL}/pokemon/{pid}")
+        await cache_light_pokemons(redis_connection, [light])
+    await singleflight.refresh_once_async(redis_connection, cache.light_key(pid), _build)
+
+
+# --------- Servicio ---------
+
+async def fetch_pokemons_by_ids(redis_connection: redis.asyncio.Redis, ids: list[int]) -> list[PokemonLight]:
+    if not ids:
+        raise ValueError("Lista de IDs vacía")
+    for pid in ids:
+        if pid < 1:
+            raise ValueError("ID debe ser positivo")
+    ordered = await _get_cached_lights(redis_connection, ids)
+    missing = [pid for pid in dict.fromkeys(ids) if pid not in ordered]
+    fetched = await _fetch_lights_concurrently([f"{POKEAPI_BASE_URL}/pokemon/{pid}" for pid in missing])
+    for light, error in fetched:
+        if error:
+            raise error
+    lights = [light for light, _ in fetched]
+    ordered.update((light["id"], light) for light in lights)
+    await cache_light_pokemons(redis_connection, lights)
+    return [ordered[i] for i in ids if i in ordered]
+
+async def fetch_pokemon_by_url_with_status(redis_connection: redis.asyncio.Redis, url: str) -> tuple[PokemonFull, str]:
+    item, status = await fetch_pokemon_by_url_raw(redis_connection, url)
+    return cache.value_of(item), status
+
+@stage("full")
+async def fetch_pokemon_by_url_raw(redis_connection: redis.asyncio.Redis, url: str) -> tuple[object, str]:
+    if not url.startswith(f"{POKEAPI_BASE_URL}/pokemon/"):
+        raise ValueError("URL inválida para Pokémon")
+    try:
+        pid = int(url.rstrip("/").split("/")[-1])
+    except Exception:
+        raise ValueError("No se pudo extraer ID de la URL")
+    key = cache.full_key(pid)
+    raw = (await cache_async.get_raw_many(redis_connection, [key]))[0]
+    if raw:
+        status = cache.raw_status(raw)
+        if status == cache.STALE:
+            cache_async.schedule_refresh(key, lambda: singleflight.refresh_once_async(
+                redis_connection, key, lambda: _build_full_pokemon(redis_connection, url, pid)))
+        return raw, status
+
+    async def _load():
+        return (await cache_async.get_many(redis_connection, [key]))[0]
+
+    full = await singleflight.coalesce_async(
+        redis_connection, key, _load, lambda: _build_full_pokemon(redis_connection, url, pid),
+    )
+    return full, cache.MISS
+
+@stage("build_full")
+async def _build_full_pokemon(redis_connection: redis.asyncio.Redis, url: str, pid: int) -> PokemonFull:
+    detail = await upstream_async.get_json(url)
+    evo_and_eggs = await fetch_pokemon_evolutions_and_egg_groups(redis_connection, detail["species"]["url"])
+    full = _build_full_from_detail(detail, url, evo_and_eggs["eggGroups"], evo_and_eggs["evolutions"])
+    try:
+        await cache_async.set_many(redis_connection, [
+            (cache.full_key(pid), full, cache.FULL),
+            (cache.light_key(pid), _build_light_from_detail(detail), cache.LIGHT),
+        ])
+    except Exception as e:
+        raise Exception(f"Error caching full Pokémon data: {str(e)}")
+    return full
+
+async def fetch_pokemon_basic_list(redis_connection: redis.asyncio.Redis, limit=20, offset=0) -> list[PokemonLight]:
+    return (await fetch_pokemon_basic_list_with_status(redis_connection, limit=limit, offset=offset))[0]
+
+async def fetch_pokemon_basic_list_with_status(redis_connection: redis.asyncio.Redis, limit=20, offset=0) -> tuple[list[PokemonLight], str]:
+    items, status = await fetch_pokemon_basic_list_raw(redis_connection, limit=limit, offset=offset)
+    return [cache.value_of(item) for item in items], status
+
+@stage("list_page")
+async def fetch_pokemon_basic_list_raw(redis_connection: redis.asyncio.Redis, limit=20, offset=0) -> tuple[list[object], str]:
+    ids = get_search_index().page_ids(limit, offset)
+    if not ids:
+        return [], cache.HIT
+    return await _lights_raw(redis_connection, ids)
+
+async def _lights_raw(redis_connection: redis.asyncio.Redis, ids: list[int]) -> tuple[list[object], str]:
+    cached, status = await _get_cached_light_raws_with_status(redis_connection, ids)
+    missing = [pid for pid in ids if pid not in cached]
+    fetched: list[PokemonLight] = []
+    results = await _fetch_lights_concurrently([f"{POKEAPI_BASE_URL}/pokemon/{pid}" for pid in missing])
+    for pid, (light, error) in zip(missing, results):
+        if error:
+            raise error
+        cached[pid] = light
+        fetched.append(light)
+    await cache_light_pokemons(redis_connection, fetched)
+    return [cached[pid] for pid in ids], cache.MISS if missing else status
+
+
+# --------- Lotes ---------
+
+async def _load_full(redis_connection: redis.asyncio.Redis, pid: int) -> PokemonFull:
+    url = f"{POKEAPI_BASE_URL}/pokemon/{pid}"
+
+    async def _load():
+        return (await cache_async.get_many(redis_connection, [cache.full_key(pid)]))[0]
+
+    return await singleflight.coalesce_async(
+        redis_connection, cache.full_key(pid), _load, lambda: _build_full_pokemon(redis_connection, url, pid),
+    )
+
+@stage("batch")
+async def fetch_pokemons_batch(redis_connection: redis.asyncio.Redis, ids: list[int], detail: str = "light") -> list[tuple[int, object, Optional[str]]]:
+    valid = [pid for pid in dict.fromkeys(ids) if pid >= 1]
+    found: dict[int, object]
+    if detail == "full":
+        found = await _get_cached_full_raws(redis_connection, valid)
+        missing = [pid for pid in valid if pid not in found]
+        fetched = await upstream_async.map_concurrent(lambda pid: _load_full(redis_connection, pid), missing)
+    else:
+        found = (await _get_cached_light_raws_with_status(redis_connection, valid))[0]
+        missing = [pid for pid in valid if pid not in found]
+        fetched = await _fetch_lights_concurrently([f"{POKEAPI_BASE_URL}/pokemon/{pid}" for pid in missing])
+    errors: dict[int, str] = {}
+    lights: list[PokemonLight] = []
+    for pid, (record, error) in zip(missing, fetched):
+        if error:
+            errors[pid] = _batch_error(error)
+        else:
+            found[pid] = record
+            lights.append(record)
+    if detail != "full":
+        await cache_light_pokemons(redis_connection, lights)
+    return [
+        (pid, found.get(pid), None if pid in found else errors.get(pid, "ID debe ser positivo"))
+        for pid in ids
+    ]
+
+async def export_pokemons(redis_connection: redis.asyncio.Redis, detail: str = "light", after: int = 0,
+                          limit: Optional[int] = None) -> AsyncIterator[list[tuple[int, object, Optional[str]]]]:
+    index = get_search_index()
+    remaining = limit
+    while remaining is None or remaining > 0:
+        size = BATCH_STREAM_CHUNK if remaining is None else min(BATCH_STREAM_CHUNK, remaining)
+        ids = index.ids_after(after, size)
+        if not ids:
+            return
+        try:
+            results = await fetch_pokemons_batch(redis_connection, ids, detail)
+        except Exception as e:
+            results = [(pid, None, str(e)) for pid in ids]
+        yield results
+        after = ids[-1]
+        if remaining is not None:
+            remaining -= len(ids)
+
+
+# --------- Filtros por atributo ---------
+
+@stage("filter")
+async def filter_pokemon_raw(redis_connection: redis.asyncio.Redis, clauses: list[tuple[str, list[str]]],
+                             limit: int = 20, offset: int = 0) -> tuple[list[object], int, int]:
+    ids, indexed = await cache_async.filter_ids(redis_connection, clauses)
+    page = ids[offset:offset + limit]
+    items = (await _lights_raw(redis_connection, page))[0] if page else []
+    return items, len(ids), indexed
+
+
+# --------- Evoluciones y Egg Groups ---------
+
+async def fetch_pokemon_evolutions_and_egg_groups(redis_connection: redis.asyncio.Redis, species_url: str) -> dict:
+    species = await get_species_info(redis_connection, species_url)
+    evolutions = await fetch_evolution_chain(redis_connection, species["chainUrl"])
+    return {
+        "evolutions": evolutions,
+        "eggGroups": species["eggGroups"],
+    }
+
+async def fetch_evolution_chain(redis_connection: redis.asyncio.Redis, chain_url: str) -> list[PokemonLight]:
+    pids = await get_chain_ids(redis_connection, chain_url)
+    if not pids:
+        return []
+    return await fetch_pokemons_by_ids(redis_connection, pids)
+
+@stage("species")
+async def get_species_info(redis_connection: redis.asyncio.Redis, species_url: str) -> dict:
+    async def _build():
+        return _species_info_from_json(await upstream_async.get_json(species_url))
+    info, _ = await cache_async.get_or_build(
+        redis_connection, cache.species_key(_id_from_url(species_url)), cache.SPECIES, _build,
+    )
+    return info
+
+@stage("chain")
+async def get_chain_ids(redis_connection: redis.asyncio.Redis, chain_url: str) -> list[int]:
+    async def _build():
+        return _chain_pids(await upstream_async.get_json(chain_url))
+    pids, _ = await cache_async.get_or_build(
+        redis_connection, cache.chain_key(_id_from_url(chain_url)), cache.CHAIN, _build,
+    )
+    return pids
+
+
+# --------- Endpoint oriented helpers ---------
+
+async def get_full_pokemon(redis_connection: redis.asyncio.Redis, pid: int) -> PokemonFull:
+    return (await get_full_pokemon_with_status(redis_connection, pid))[0]
+
+async def get_full_pokemon_with_status(redis_connection: redis.asyncio.Redis, pid: int) -> tuple[PokemonFull, str]:
+    url = f"{POKEAPI_BASE_URL}/pokemon/{pid}"
+    return await fetch_pokemon_by_url_with_status(redis_connection, url)
+
+async def get_full_pokemon_raw(redis_connection: redis.asyncio.Redis, pid: int) -> tuple[object, str]:
+    url = f"{POKEAPI_BASE_URL}/pokemon/{pid}"
+    return await fetch_pokemon_by_url_raw(redis_connection, url)
+
+async def search_pokemon_by_name(redis_connection: redis.asyncio.Redis, query: str, limit: int = 10) -> list[PokemonLight]:
+    return [cache.value_of(item) for item in await search_pokemon_by_name_raw(redis_connection, query, limit=limit)]
+
+@stage("search")
+async def search_pokemon_by_name_raw(redis_connection: redis.asyncio.Redis, query: str, limit: int = 10) -> list[object]:
+    query = (query or "").strip()
+    if not query:
+        return []
+    scored = await ranked_async(query, limit=limit, redis_connection=redis_connection)
+    if not scored:
+        return []
+    cached = (await _get_cached_light_raws_with_status(redis_connection, [pid for _, _, pid in scored]))[0]
+    missing = [pid for _, _, pid in scored if pid not in cached]
+    fetched: list[PokemonLight] = []
+    results_missing = await _fetch_lights_concurrently([f"{POKEAPI_BASE_URL}/pokemon/{pid}" for pid in missing])
+    for pid, (light, error) in zip(missing, results_missing):
+        if not error:
+            cached[pid] = light
+            fetched.append(light)
+    results: list[object] = []
+    for _, name, pid in scored:
+        if pid in cached:
+            results.append(cached[pid])
+        else:
+            # Si falla la API, al menos entregar un light mínimo
+            results.append({
+                "id": pid,
+                "name": name,
+                "url": f"{POKEAPI_BASE_URL}/pokemon/{pid}",
+                "icon": "",
+                "officialArtwork": "",
+            })
+    await cache_light_pokemons(redis_connection, fetched)
+    return results
@@ -0,0 +1,199 @@
+"""
+This module renders the JSON bodies of the cached endpoints.
+
+A cached value is turned into its JSON fragment once per process and the
+fragment is memoized under a digest of the stored entry. A later hit on the
+same entry (or on a list or search result that contains it) splices the
+memoized bytes into the body, with no decode/encode round trip.
+
+The ETag is computed from the data only, not from the "source" field
+(hit/stale/miss), so a record keeps its ETag whichever way it was served;
+those tags are weak because the bytes around the data differ. If-None-Match
+is checked before compressing, so a 304 costs one hash. gzip/brotli
+variants are compressed once per body and then served from memory.
+
+The helpers return (body, status, headers) tuples, which both the Flask
+(main.py) and Quart (asgi.py) apps accept.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+from typing import Iterable, Optional
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - brotli es opcional
+    brotli = None
+from dotenv import load_dotenv
+import codec
+from local_cache import LocalCache
+
+load_dotenv()
+
+# Cache-Control de fichas individuales y de listados/búsquedas
+RESPONSE_MAX_AGE = int(os.getenv('RESPONSE_MAX_AGE', '300'))
+RESPONSE_LIST_MAX_AGE = int(os.getenv('RESPONSE_LIST_MAX_AGE', '60'))
+# Cuerpos más chicos no se comprimen
+RESPONSE_COMPRESS_MIN_BYTES = int(os.getenv('RESPONSE_COMPRESS_MIN_BYTES', '1024'))
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv('RESPONSE_CACHE_MAX_ENTRIES', '20000'))
+RESPONSE_CACHE_MAX_BYTES = int(os.getenv('RESPONSE_CACHE_MAX_BYTES', str(32 * 1024 * 1024)))
+# Las claves son digests del contenido: el TTL solo renueva memoria
+RESPONSE_CACHE_TTL = float(os.getenv('RESPONSE_CACHE_TTL', '3600'))
+
+# digest de la entrada cacheada -> JSON del valor
+_fragments = LocalCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES // 2, RESPONSE_CACHE_TTL, name="fragments")
+# "<digest del cuerpo>:<encoding>" -> cuerpo comprimido
+_variants = LocalCache(RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_MAX_BYTES // 2, RESPONSE_CACHE_TTL, name="responses")
+
+_ENCODINGS = (("br", lambda body: brotli.compress(body)),) if brotli is not None else ()
+_ENCODINGS += (("gzip", lambda body: gzip.compress(body, compresslevel=6, mtime=0)),)
+
+
+def _dumps(value) -> bytes:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+def fragment(item) -> bytes:
+    """
+    JSON de un elemento devuelto por las variantes *_raw del servicio. Las
+    entradas crudas (bytes) se memoizan por su contenido; un valor recién
+    construido se serializa directamente.
+    """
+    if not isinstance(item, bytes):
+        return _dumps(item)
+    key = hashlib.blake2b(codec.body(item), digest_size=16).hexdigest()
+    cached = _fragments.get(key)
+    if cached is None:
+        cached = _dumps(codec.decode(item)[0])
+        _fragments.set(key, cached)
+    return cached
+
+def _array(fragments: Iterable[bytes]) -> bytes:
+    return b"[" + b",".join(fragments) + b"]"
+
+class Body(bytes):
+    """
+    Cuerpo JSON que recuerda qué parte identifica su contenido (`validator`)
+    para el ETag: con "source" es solo data, que no cambia entre hit y miss.
+    """
+
+    validator: Optional[bytes] = None
+
+
+def _envelope(source: Optional[str], data: bytes) -> bytes:
+    # Mismo cuerpo que {'source': ..., 'data': ...} / {'data': ...}
+    if source is None:
+        return b'{"data":' + data + b"}"
+    body = Body(b'{"source":"' + source.encode() + b'","data":' + data + b"}")
+    body.validator = data
+    return body
+
+
+def _digest(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _etag(body: bytes) -> str:
+    validator = getattr(body, "validator", None)
+    if validator is not None:
+        # Débil: mismo contenido, bytes distintos según source
+        return 'W/"' + _digest(validator) + '"'
+    return '"' + _digest(body) + '"'
+
+def _opaque(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+def _accepted(accept_encoding: str) -> set[str]:
+    accepted = set()
+    for part in (accept_encoding or "").split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+def _matches(if_none_match: str, etags: tuple[str, ...]) -> bool:
+    if not if_none_match:
+        return False
+    # If-None-Match usa comparación débil: se ignora el prefijo W/ de ambos lados
+    opaque = {_opaque(etag) for etag in etags}
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*" or _opaque(tag) in opaque:
+            return True
+    return False
+
+def render(body: bytes, max_age: int, request_headers):
+    """
+    Respuesta 200 (o 304) para un cuerpo JSON ya codificado.
+
+    Args:
+        body (bytes): Cuerpo completo en JSON.
+        max_age (int): Segundos de Cache-Control.
+        request_headers: Headers del request (If-None-Match, Accept-Encoding).
+
+    Returns:
+        tuple: (cuerpo, status, headers)
+    """
+    if_none_match = request_headers.get("If-None-Match", "")
+    accept_encoding = request_headers.get("Accept-Encoding", "")
+    etag = _etag(body)
+    headers = {
+        "Content-Type": "application/json",
+        "Cache-Control": f"public, max-age={max_age}",
+        "Vary": "Accept-Encoding",
+    }
+    encoding, compress = None, None
+    if len(body) >= RESPONSE_COMPRESS_MIN_BYTES:
+        accepted = _accepted(accept_encoding)
+        encoding, compress = next(((name, fn) for name, fn in _ENCODINGS if name in accepted), (None, None))
+    # Cada representación tiene su propio ETag
+    variant_etag = etag if encoding is None else f'{etag[:-1]}-{encoding}"'
+    headers["ETag"] = variant_etag
+    # Antes de comprimir: un 304 no paga gzip/brotli
+    if _matches(if_none_match, (etag, variant_etag)):
+        return b"", 304, headers
+    if encoding:
+        # Por el cuerpo completo: hit y miss comparten ETag pero no bytes
+        key = f"{_digest(body)}:{encoding}"
+        compressed = _variants.get(key)
+        if compressed is None:
+            compressed = compress(body)
+            _variants.set(key, compressed)
+        body = compressed
+        headers["Content-Encoding"] = encoding
+    return body, 200, headers
+
+
+# --------- Cuerpos de los endpoints ---------
+
+def record_body(source: Optional[str], item) -> bytes:
+    """
+    Cuerpo {"source": ..., "data": registro}.
+    """
+    return _envelope(source, fragment(item))
+
+def list_body(source: Optional[str], items: Iterable) -> bytes:
+    """
+    Cuerpo {"source": ..., "data": [...]}: cada registro cacheado aporta su fragmento memoizado.
+    """
+    return _envelope(source, _array(fragment(item) for item in items))
+
+def page_body(items: Iterable, meta: dict) -> bytes:
+    """
+    Cuerpo {...meta, "data": [...]} de un listado paginado con metadatos (total, etc.).
+    """
+    head = b"".join(_dumps(key) + b":" + _dumps(value) + b"," for key, value in meta.items())
+    return b"{" + head + b'"data":' + _array(fragment(item) for item in items) + b"}"
+
+def batch_line(pid: int, item, error: Optional[str]) -> bytes:
+    """
+    Un elemento de un lote: {"id": ..., "data": registro} o {"id": ..., "error": mensaje}.
+    """
+    if error is not None:
+        return b'{"id":' + str(pid).encode() + b',"error":' + _dumps(error) + b"}"
+    return b'{"id":' + str(pid).encode() + b',"data":' + fragment(item) + b"}"
+
+def batch_body(results: Iterable[tuple]) -> bytes:
+    return _envelope(None, _array(batch_line(*result) for result in results))
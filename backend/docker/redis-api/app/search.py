@@ -0,0 +1,509 @@
+"""
+This module implements the in-memory search engine used by /searchPokemon.
+The name index (search_pokemons.json) is loaded and normalized once, and
+exact, prefix, substring and token candidates are resolved through indexes
+instead of scanning and re-scoring every name on each request.
+
+Ranked results are memoized per normalized query in an in-process LRU and,
+with SEARCH_CACHE_SHARED=true, in Redis so replicas share them. The index
+is immutable for the life of a deploy, so entries only need a TTL to bound
+memory; the Redis key carries the index version. suggest() serves the
+autocomplete endpoint straight from the prefix index.
+
+With NumPy installed, ranking bounds every name's score (exact lexical part
+plus a vectorized fuzzy bound) and only computes exact distances while a
+name can still reach the top-k; results are identical to the scalar path.
+"""
+
+import heapq
+import json
+import os
+import threading
+import unicodedata
+import zlib
+from bisect import bisect_left, bisect_right
+from typing import Optional
+from fuzzy import CharBounds, DeletionIndex, QueryPattern, np
+from local_cache import LocalCache
+from metrics import SEARCH_LATENCY, timed
+
+NGRAM_SIZE = 3
+
+# Typos: ~1 edición cada 4 caracteres de la consulta, hasta FUZZY_MAX_EDITS
+FUZZY_RADIUS_DIVISOR = 4
+FUZZY_MAX_EDITS = 2
+
+# Cota superior de la parte puramente difusa de _score (sim * 300 + length_ratio * 50)
+_FUZZY_MAX_SCORE = 350.0
+
+# Ranking podado con la cota vectorizada de fuzzy.CharBounds si numpy está
+# instalado; "false" fuerza el recorrido escalar
+SEARCH_VECTORIZED = os.getenv('SEARCH_VECTORIZED', 'true').lower() == 'true'
+
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', '5000'))
+SEARCH_CACHE_MAX_BYTES = int(os.getenv('SEARCH_CACHE_MAX_BYTES', str(4 * 1024 * 1024)))
+SEARCH_CACHE_TTL = float(os.getenv('SEARCH_CACHE_TTL', '3600'))
+# Compartir los rankings entre réplicas a través de Redis
+SEARCH_CACHE_SHARED = os.getenv('SEARCH_CACHE_SHARED', 'false').lower() == 'true'
+SEARCH_CACHE_SHARED_TTL = int(os.getenv('SEARCH_CACHE_SHARED_TTL', '86400'))
+SUGGEST_MAX_LIMIT = int(os.getenv('SUGGEST_MAX_LIMIT', '50'))
+
+
+def _load_search_index() -> dict[str, int]:
+    """
+    Carga el índice (name -> id) desde el json.
+    """
+    path = os.path.join(os.path.dirname(__file__), "search_pokemons.json")
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def _normalize(txt: str) -> str:
+    txt = txt.lower()
+    txt = unicodedata.normalize("NFD", txt)
+    txt = "".join(c for c in txt if unicodedata.category(c) != "Mn")
+    # Reemplazar separadores por espacio y colapsar
+    out = []
+    last_space = False
+    for c in txt:
+        if c.isalnum():
+            out.append(c)
+            last_space = False
+        else:
+            if not last_space:
+                out.append(" ")
+                last_space = True
+    return " ".join("".join(out).split())
+
+def _levenshtein(a: str, b: str, max_distance: int | None = None) -> int:
+    """
+    Distancia Levenshtein iterativa con poda opcional (early exit).
+    """
+    if a == b:
+        return 0
+    la, lb = len(a), len(b)
+    if la == 0:
+        return lb
+    if lb == 0:
+        return la
+    if la > lb:
+        a, b = b, a
+        la, lb = lb, la
+    prev = list(range(la + 1))
+    for j in range(1, lb + 1):
+        cur = [j] + [0] * la
+        bj = b[j - 1]
+        # Rango de poda
+        min_row = float("inf")
+        for i in range(1, la + 1):
+            cost = 0 if a[i - 1] == bj else 1
+            cur[i] = min(
+                prev[i] + 1,      # eliminación
+                cur[i - 1] + 1,   # inserción
+                prev[i - 1] + cost  # sustitución
+            )
+            if cur[i] < min_row:
+                min_row = cur[i]
+        prev = cur
+        if max_distance is not None and min_row > max_distance:
+            return max_distance + 1
+    return prev[la]
+
+def _similarity(a: str, b: str, distance: int | None = None) -> float:
+    """
+    Similitud normalizada basada en Levenshtein.
+    Si ya se conoce la distancia entre a y b se puede pasar en `distance`.
+    """
+    if not a or not b:
+        return 0.0
+    if distance is None:
+        distance = _levenshtein(a, b, max_distance=max(len(a), len(b)))
+    return 1.0 - distance / max(len(a), len(b))
+
+def _score(query_norm: str, candidate_norm: str, original_candidate: str, distance: int | None = None) -> float:
+    """
+    Calcula un score heurístico:
+    - match exacto
+    - prefijo
+    - substring
+    - similitud difusa
+    - cobertura de tokens
+    """
+    if not candidate_norm:
+        return 0.0
+    score = _lexical_score(query_norm, candidate_norm)
+    # Fuzzy completo
+    sim = _similarity(query_norm, candidate_norm, distance)
+    score += sim * 300
+    # Bonus por proximidad de longitud (evita que nombres muy largos dominen)
+    length_ratio = min(len(candidate_norm), len(query_norm)) / max(len(candidate_norm), len(query_norm))
+    score += length_ratio * 50
+    return score
+
+def _lexical_score(query_norm: str, candidate_norm: str) -> float:
+    """
+    La parte de _score que no depende de la distancia: exacto, prefijo,
+    substring y tokens (se suman en el mismo orden que en _score).
+    """
+    score = 0.0
+    if candidate_norm == query_norm:
+        score += 1000
+    if candidate_norm.startswith(query_norm):
+        score += 800 * (len(query_norm) / max(len(candidate_norm), 1))
+    # Substring
+    if query_norm in candidate_norm and not candidate_norm.startswith(query_norm):
+        pos = candidate_norm.find(query_norm)
+        penalty = pos * 5
+        score += max(600 - penalty, 100)
+    # Tokens
+    q_tokens = set(query_norm.split())
+    c_tokens = set(candidate_norm.split())
+    if q_tokens:
+        overlap = len(q_tokens & c_tokens) / len(q_tokens)
+        score += overlap * 400
+    return score
+
+def _ngrams(txt: str, n: int = NGRAM_SIZE) -> set[str]:
+    return {txt[i:i + n] for i in range(len(txt) - n + 1)}
+
+
+class SearchIndex:
+    """
+    Índice de nombres precalculado. Se construye una sola vez y es de solo
+    lectura, por lo que puede compartirse entre threads sin locks.
+    """
+
+    def __init__(self, index: dict[str, int]):
+        self._names: list[str] = []
+        self._ids: list[int] = []
+        self._norms: list[str] = []
+        for name, pid in index.items():
+            self._names.append(name)
+            self._ids.append(pid)
+            self._norms.append(_normalize(name))
+        # Prefijos: nombres normalizados ordenados para búsqueda con bisect
+        order = sorted(range(len(self._norms)), key=lambda i: self._norms[i])
+        self._sorted_norms = [self._norms[i] for i in order]
+        self._sorted_pos = order
+        # Substrings: índice invertido de n-gramas
+        self._grams: dict[str, set[int]] = {}
+        # Tokens: token -> posiciones
+        self._tokens: dict[str, set[int]] = {}
+        # Difuso: índice de borrado simétrico sobre los nombres normalizados
+        self._typos = DeletionIndex(max_edits=FUZZY_MAX_EDITS)
+        self._by_length: dict[int, list[int]] = {}
+        for pos, norm in enumerate(self._norms):
+            for gram in _ngrams(norm):
+                self._grams.setdefault(gram, set()).add(pos)
+            for token in set(norm.split()):
+                self._tokens.setdefault(token, set()).add(pos)
+            self._typos.add(norm, pos)
+            self._by_length.setdefault(len(norm), []).append(pos)
+
+        # Ids conocidos en el orden del listado de PokeAPI (por id)
+        self._sorted_ids = sorted(set(self._ids))
+        self._bounds = CharBounds(self._norms) if SEARCH_VECTORIZED and np is not None else None
+        # Cambia si cambia el contenido del índice (invalida rankings compartidos)
+        self.version = zlib.crc32(json.dumps(sorted(index.items())).encode())
+
+    def __len__(self) -> int:
+        return len(self._names)
+
+    def page_ids(self, limit: int, offset: int) -> list[int]:
+        """
+        Ids de la página (limit, offset) del listado, sin consultar PokeAPI.
+        """
+        return self._sorted_ids[offset:offset + limit]
+
+    def ids_after(self, cursor: int, limit: int) -> list[int]:
+        """
+        Hasta `limit` ids mayores que `cursor`, en orden (paginación por cursor).
+        """
+        start = bisect_right(self._sorted_ids, cursor)
+        return self._sorted_ids[start:start + limit]
+
+    def _prefix_candidates(self, query_norm: str) -> set[int]:
+        found = set()
+        i = bisect_left(self._sorted_norms, query_norm)
+        while i < len(self._sorted_norms) and self._sorted_norms[i].startswith(query_norm):
+            found.add(self._sorted_pos[i])
+            i += 1
+        return found
+
+    def suggest(self, prefix: str, limit: int = 10) -> list[tuple[int, str]]:
+        """
+        Autocompletado: hasta `limit` pares (id, name) cuyo nombre normalizado
+        empieza por `prefix`, los más cortos primero. Solo usa el índice de prefijos.
+        """
+        prefix_norm = _normalize(prefix or "")
+        if not prefix_norm or limit < 1:
+            return []
+        i = bisect_left(self._sorted_norms, prefix_norm)
+        j = bisect_right(self._sorted_norms, prefix_norm + "\uffff", lo=i)
+        positions = sorted(self._sorted_pos[i:j], key=lambda pos: (len(self._norms[pos]), self._norms[pos]))
+        return [(self._ids[pos], self._names[pos]) for pos in positions[:limit]]
+
+    def _substring_candidates(self, query_norm: str) -> set[int]:
+        if len(query_norm) < NGRAM_SIZE:
+            # Consultas muy cortas: no hay n-grama que indexar
+            return {pos for pos, norm in enumerate(self._norms) if query_norm in norm}
+        postings = []
+        for gram in _ngrams(query_norm):
+            posting = self._grams.get(gram)
+            if not posting:
+                return set()
+            postings.append(posting)
+        postings.sort(key=len)
+        found = set(postings[0]).intersection(*postings[1:])
+        return {pos for pos in found if query_norm in self._norms[pos]}
+
+    def _token_candidates(self, query_norm: str) -> set[int]:
+        found: set[int] = set()
+        for token in set(query_norm.split()):
+            found |= self._tokens.get(token, set())
+        return found
+
+    def _fuzzy_candidates(self, pattern: QueryPattern, skip: set[int], top: list[float], limit: int) -> list[tuple[int, int]]:
+        """
+        Candidatos que solo puntúan por similitud difusa y longitud.
+        1. Índice de borrados con radio pequeño: los typos típicos ("pikachoo").
+        2. Si aún no hay top-k, siembra con los nombres que más n-gramas comparten.
+        3. Recorre el resto por longitud con distancia acotada por el umbral
+           del top-k, cortando cuando la cota de score ya no alcanza.
+        Devuelve (posición, distancia).
+        """
+        query_norm = pattern.text
+        lq = len(query_norm)
+        found: list[tuple[int, int]] = []
+        seen = set(skip)
+
+        def _add(pos: int, dist: int):
+            seen.add(pos)
+            found.append((pos, dist))
+            heapq.heappush(top, _score(query_norm, self._norms[pos], self._names[pos], dist))
+            if len(top) > limit:
+                heapq.heappop(top)
+
+        radius = min(FUZZY_MAX_EDITS, max(1, lq // FUZZY_RADIUS_DIVISOR))
+        for items, dist in self._typos.search(pattern, radius):
+            for pos in items:
+                if pos not in seen:
+                    _add(pos, dist)
+        if len(top) < limit:
+            shared: dict[int, int] = {}
+            for gram in _ngrams(query_norm):
+                for pos in self._grams.get(gram, ()):
+                    if pos not in seen:
+                        shared[pos] = shared.get(pos, 0) + 1
+            for pos in heapq.nlargest(limit - len(top), shared, key=shared.get):
+                norm = self._norms[pos]
+                _add(pos, pattern.distance(norm, max(lq, len(norm))))
+        # Un nombre a distancia d aporta a lo sumo 350 - 300 * d / (lq + d)
+        outside = radius + 1
+        threshold = top[0] if len(top) >= limit else 0.0
+        if _FUZZY_MAX_SCORE - 300 * outside / (lq + outside) < threshold:
+            return found
+        for length, positions in self._length_buckets(lq):
+            m, big = min(length, lq), max(length, lq)
+            threshold = top[0] if len(top) >= limit else 0.0
+            if _FUZZY_MAX_SCORE * m / big < threshold:
+                break
+            for pos in positions:
+                if pos in seen:
+                    continue
+                threshold = top[0] if len(top) >= limit else 0.0
+                # Máxima distancia que todavía alcanza el umbral
+                max_distance = int(big - (threshold * big - 50 * m) / 300 + 1e-9)
+                if max_distance < big - m:
+                    continue
+                dist = pattern.distance(self._norms[pos], max_distance)
+                if dist <= max_distance:
+                    _add(pos, dist)
+        return found
+
+    def _ranked_scalar(self, pattern: QueryPattern, candidates: set[int], limit: int) -> list[tuple[float, str, int]]:
+        """
+        Ranking sin numpy: los candidatos léxicos se puntúan completos y el
+        resto se recorre con _fuzzy_candidates.
+        """
+        query_norm = pattern.text
+        scored: list[tuple[float, str, int]] = []
+        top: list[float] = []
+        for pos in candidates:
+            norm = self._norms[pos]
+            dist = pattern.distance(norm, max(len(query_norm), len(norm)))
+            score = _score(query_norm, norm, self._names[pos], dist)
+            if score > 0:
+                scored.append((score, self._names[pos], self._ids[pos]))
+                heapq.heappush(top, score)
+                if len(top) > limit:
+                    heapq.heappop(top)
+        # El resto solo puede puntuar por similitud difusa y longitud
+        for pos, dist in self._fuzzy_candidates(pattern, candidates, top, limit):
+            score = _score(query_norm, self._norms[pos], self._names[pos], dist)
+            if score > 0:
+                scored.append((score, self._names[pos], self._ids[pos]))
+        return scored
+
+    def _ranked_vectorized(self, pattern: QueryPattern, candidates: set[int], limit: int) -> list[tuple[float, str, int]]:
+        """
+        Ranking con la cota de CharBounds: cada nombre tiene una cota superior
+        de su score (parte léxica exacta + cota difusa vectorizada) y la
+        distancia exacta solo se calcula, en orden de cota, mientras la cota
+        todavía alcance el top-k.
+        """
+        query_norm = pattern.text
+        lq = len(query_norm)
+        bounds = self._bounds.fuzzy_upper_bounds(query_norm)
+        scored: list[tuple[float, str, int]] = []
+        top: list[float] = []
+
+        def _threshold() -> float:
+            return top[0] if len(top) >= limit else 0.0
+
+        def _rank(pos: int, lexical: float):
+            norm = self._norms[pos]
+            m, big = min(len(norm), lq), max(len(norm), lq)
+            # Máxima distancia con la que lexical + 300 * (1 - d / big) + 50 * m / big alcanza el umbral
+            max_distance = min(big, int(big - ((_threshold() - lexical) * big - 50 * m) / 300 + 1e-9))
+            if max_distance < big - m:
+                return
+            dist = pattern.distance(norm, max_distance)
+            if dist > max_distance:
+                return
+            score = _score(query_norm, norm, self._names[pos], dist)
+            if score > 0:
+                scored.append((score, self._names[pos], self._ids[pos]))
+                heapq.heappush(top, score)
+                if len(top) > limit:
+                    heapq.heappop(top)
+
+        lexical = {pos: _lexical_score(query_norm, self._norms[pos]) for pos in candidates}
+        # Tolerancia: la cota se calcula con otra aritmética que _score
+        for pos in sorted(candidates, key=lambda pos: -(lexical[pos] + bounds[pos])):
+            if lexical[pos] + bounds[pos] < _threshold() - 1e-9:
+                break
+            _rank(pos, lexical[pos])
+        # El resto solo puede puntuar por similitud difusa y longitud
+        for pos in self._bounds.candidates(bounds, candidates, limit, _threshold):
+            _rank(pos, 0.0)
+        return scored
+
+    def _length_buckets(self, lq: int) -> list[tuple[int, list[int]]]:
+        """
+        Grupos de nombres por longitud, del más parecido en longitud a lq al menos.
+        """
+        return sorted(
+            ((length, positions) for length, positions in self._by_length.items() if length),
+            key=lambda item: -(min(item[0], lq) / max(item[0], lq)),
+        )
+
+    def search(self, query: str, limit: int = 10) -> list[tuple[float, str, int]]:
+        """
+        Devuelve hasta `limit` tuplas (score, name, id) ordenadas igual que
+        un ranking completo con _score: score desc, nombre asc.
+        """
+        query_norm = _normalize(query or "")
+        if not query_norm or limit < 1:
+            return []
+        candidates = self._prefix_candidates(query_norm)
+        candidates |= self._substring_candidates(query_norm)
+        candidates |= self._token_candidates(query_norm)
+        pattern = QueryPattern(query_norm)
+        if self._bounds is not None:
+            scored = self._ranked_vectorized(pattern, candidates, limit)
+        else:
+            scored = self._ranked_scalar(pattern, candidates, limit)
+        scored.sort(key=lambda x: (-x[0], x[1]))  # score desc, nombre asc para estabilidad
+        return scored[:limit]
+
+
+_search_index: SearchIndex | None = None
+_search_index_lock = threading.Lock()
+
+def get_search_index() -> SearchIndex:
+    """
+    Devuelve el índice de búsqueda del proceso, construyéndolo la primera vez.
+    """
+    global _search_index
+    if _search_index is None:
+        with _search_index_lock:
+            if _search_index is None:
+                _search_index = SearchIndex(_load_search_index())
+    return _search_index
+
+
+# --------- Cache de rankings ---------
+
+_results = LocalCache(SEARCH_CACHE_MAX_ENTRIES, SEARCH_CACHE_MAX_BYTES, SEARCH_CACHE_TTL, name="search")
+
+def _results_key(query: str, limit: int) -> Optional[str]:
+    query_norm = _normalize(query or "")
+    if not query_norm or limit < 1:
+        return None
+    return f"pokemon:search:{get_search_index().version:08x}:{limit}:{query_norm}"
+
+def _decode_results(raw) -> list[tuple[float, str, int]]:
+    return [tuple(item) for item in json.loads(raw)]
+
+def _timed_search(query: str, limit: int) -> list[tuple[float, str, int]]:
+    index = get_search_index()
+    with timed(SEARCH_LATENCY, "scalar" if index._bounds is None else "vectorized"):
+        return index.search(query, limit=limit)
+
+def ranked(query: str, limit: int = 10, redis_connection=None) -> list[tuple[float, str, int]]:
+    """
+    Igual que get_search_index().search, memoizado por consulta normalizada:
+    primero la LRU del proceso y, con SEARCH_CACHE_SHARED, Redis.
+    """
+    key = _results_key(query, limit)
+    if key is None:
+        return []
+    raw = _results.get(key)
+    if raw is None and SEARCH_CACHE_SHARED and redis_connection is not None:
+        try:
+            raw = redis_connection.get(key)
+        except Exception:
+            raw = None
+        if raw is not None:
+            raw = raw.encode() if isinstance(raw, str) else raw
+            _results.set(key, raw)
+    if raw is not None:
+        return _decode_results(raw)
+    scored = _timed_search(query, limit)
+    raw = json.dumps(scored).encode()
+    _results.set(key, raw)
+    if SEARCH_CACHE_SHARED and redis_connection is not None:
+        try:
+            redis_connection.set(key, raw, ex=SEARCH_CACHE_SHARED_TTL)
+        except Exception:
+            pass
+    return scored
+
+async def ranked_async(query: str, limit: int = 10, redis_connection=None) -> list[tuple[float, str, int]]:
+    """
+    ranked() para redis.asyncio.
+    """
+    key = _results_key(query, limit)
+    if key is None:
+        return []
+    raw = _results.get(key)
+    if raw is None and SEARCH_CACHE_SHARED and redis_connection is not None:
+        try:
+            raw = await redis_connection.get(key)
+        except Exception:
+            raw = None
+        if raw is not None:
+            raw = raw.encode() if isinstance(raw, str) else raw
+            _results.set(key, raw)
+    if raw is not None:
+        return _decode_results(raw)
+    # El ranking es CPU puro y tarda pocos ms: se ejecuta en el loop
+    scored = _timed_search(query, limit)
+    raw = json.dumps(scored).encode()
+    _results.set(key, raw)
+    if SEARCH_CACHE_SHARED and redis_connection is not None:
+        try:
+            await redis_connection.set(key, raw, ex=SEARCH_CACHE_SHARED_TTL)
+        except Exception:
+            pass
+    return scored
@@ -0,0 +1,233 @@
+"""
+This module coalesces concurrent cache rebuilds (single-flight).
+Inside a process only one thread rebuilds a given key while the others wait
+for its result. Across replicas a short Redis lease elects one builder and
+the other replicas poll the cache until the value appears, so an expired
+hot key triggers one upstream fan-out instead of one per request.
+
+The *_async functions do the same for the asyncio serving mode, with
+redis.asyncio and one shared build task per key instead of threads.
+"""
+
+import asyncio
+import contextvars
+import os
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Optional, TypeVar
+import redis
+import redis.asyncio
+from db import RoutedRedis
+from metrics import REDIS_LATENCY, timed
+
+T = TypeVar("T")
+
+# Duración del lease en Redis: debe cubrir una reconstrucción completa
+SINGLEFLIGHT_LEASE_MS = int(os.getenv('SINGLEFLIGHT_LEASE_MS', '10000'))
+SINGLEFLIGHT_POLL_INTERVAL = float(os.getenv('SINGLEFLIGHT_POLL_INTERVAL', '0.05'))
+
+# Borra el lease solo si sigue siendo nuestro
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class _Call:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """
+    Coalescencia en proceso: las llamadas concurrentes con la misma clave
+    comparten una sola ejecución de fn (y su resultado o excepción).
+    """
+
+    def __init__(self):
+        self._calls: dict[str, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], T]) -> T:
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+_group = SingleFlight()
+
+
+def _lease_key(key: str) -> str:
+    return f"lock:{key}"
+
+def _primary(redis_connection):
+    # El estado del lease se consulta en el primario: una réplica atrasada no lo vería aún
+    return redis_connection.primary if isinstance(redis_connection, RoutedRedis) else redis_connection
+
+def _with_lease(redis_connection: redis.Redis, key: str, load_cached: Callable[[], Optional[T]], build: Callable[[], T]) -> T:
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + SINGLEFLIGHT_LEASE_MS / 1000
+    while True:
+        try:
+            with timed(REDIS_LATENCY, "lease"):
+                acquired = redis_connection.set(_lease_key(key), token, nx=True, px=SINGLEFLIGHT_LEASE_MS)
+        except redis.RedisError:
+            # Sin Redis no hay coordinación entre réplicas: construir localmente
+            return build()
+        if acquired:
+            try:
+                return build()
+            finally:
+                try:
+                    redis_connection.eval(_RELEASE_SCRIPT, 1, _lease_key(key), token)
+                except redis.RedisError:
+                    pass
+        # Otra réplica está construyendo: esperar a que aparezca el valor
+        while time.monotonic() < deadline:
+            time.sleep(SINGLEFLIGHT_POLL_INTERVAL)
+            cached = load_cached()
+            if cached is not None:
+                return cached
+            try:
+                held = _primary(redis_connection).exists(_lease_key(key))
+            except redis.RedisError:
+                return build()
+            if not held:
+                # El constructor terminó sin dejar valor (falló): reintentar el lease
+                break
+        else:
+            # Lease vencido sin resultado: no esperar más
+            return build()
+
+def refresh_once(redis_connection: redis.Redis, key: str, build: Callable[[], T]) -> Optional[T]:
+    """
+    Refresco en segundo plano: solo una réplica lo ejecuta. Si otra ya tiene
+    el lease de `key` no hace nada y devuelve None.
+    """
+    token = uuid.uuid4().hex
+    if not redis_connection.set(_lease_key(key), token, nx=True, px=SINGLEFLIGHT_LEASE_MS):
+        return None
+    try:
+        return build()
+    finally:
+        try:
+            redis_connection.eval(_RELEASE_SCRIPT, 1, _lease_key(key), token)
+        except redis.RedisError:
+            pass
+
+def coalesce(redis_connection: redis.Redis, key: str, load_cached: Callable[[], Optional[T]], build: Callable[[], T]) -> T:
+    """
+    Reconstruye `key` una sola vez aunque haya muchos llamadores concurrentes,
+    en este proceso y entre réplicas.
+
+    Args:
+        redis_connection (redis.Redis): Conexión usada para el lease.
+        key (str): Clave de cache que se está reconstruyendo.
+        load_cached (callable): Lee el valor ya cacheado (None si no está).
+        build (callable): Construye y cachea el valor; devuelve el valor.
+    """
+    return _group.do(key, lambda: _with_lease(redis_connection, key, load_cached, build))
+
+
+# --------- Variante asyncio ---------
+
+_inflight: dict[str, asyncio.Task] = {}
+
+async def _with_lease_async(redis_connection: redis.asyncio.Redis, key: str,
+                            load_cached: Callable[[], Awaitable[Optional[T]]],
+                            build: Callable[[], Awaitable[T]]) -> T:
+    token = uuid.uuid4().hex
+    deadline = time.monotonic() + SINGLEFLIGHT_LEASE_MS / 1000
+    while True:
+        try:
+            with timed(REDIS_LATENCY, "lease"):
+                acquired = await redis_connection.set(_lease_key(key), token, nx=True, px=SINGLEFLIGHT_LEASE_MS)
+        except redis.RedisError:
+            return await build()
+        if acquired:
+            try:
+                return await build()
+            finally:
+                try:
+                    await redis_connection.eval(_RELEASE_SCRIPT, 1, _lease_key(key), token)
+                except redis.RedisError:
+                    pass
+        while time.monotonic() < deadline:
+            await asyncio.sleep(SINGLEFLIGHT_POLL_INTERVAL)
+            cached = await load_cached()
+            if cached is not None:
+                return cached
+            try:
+                held = await _primary(redis_connection).exists(_lease_key(key))
+            except redis.RedisError:
+                return await build()
+            if not held:
+                break
+        else:
+            return await build()
+
+async def refresh_once_async(redis_connection: redis.asyncio.Redis, key: str,
+                             build: Callable[[], Awaitable[T]]) -> Optional[T]:
+    """
+    Igual que refresh_once, con redis.asyncio.
+    """
+    token = uuid.uuid4().hex
+    if not await redis_connection.set(_lease_key(key), token, nx=True, px=SINGLEFLIGHT_LEASE_MS):
+        return None
+    try:
+        return await build()
+    finally:
+        try:
+            await redis_connection.eval(_RELEASE_SCRIPT, 1, _lease_key(key), token)
+        except redis.RedisError:
+            pass
+
+async def coalesce_async(redis_connection: redis.asyncio.Redis, key: str,
+                         load_cached: Callable[[], Awaitable[Optional[T]]],
+                         build: Callable[[], Awaitable[T]]) -> T:
+    """
+    Igual que coalesce: las corrutinas de este proceso que piden la misma
+    clave esperan la misma tarea, y entre réplicas decide el lease.
+    """
+    task = _inflight.get(key)
+    if task is None:
+        # El build es una tarea propia, no parte del llamador que la lanzó: si
+        # ese request se cancela los demás la siguen esperando. Contexto vacío
+        # para no heredar su lugar de admisión
+        task = asyncio.get_running_loop().create_task(
+            _with_lease_async(redis_connection, key, load_cached, build), context=contextvars.Context())
+        _inflight[key] = task
+        task.add_done_callback(lambda done: _build_done(key, done))
+    # shield: si este llamador se cancela no se cancela el build compartido
+    return await asyncio.shield(task)
+
+def _build_done(key: str, task: asyncio.Task):
+    if _inflight.get(key) is task:
+        del _inflight[key]
+    # Evitar "Task exception was never retrieved" si nadie más esperaba
+    if not task.cancelled():
+        task.exception()
@@ -0,0 +1,357 @@
+"""
+This module is the shared client for the upstream PokeAPI.
+All calls go through one pooled keep-alive requests.Session with separate
+connect/read timeouts, jittered retries that honour Retry-After, and a
+circuit breaker that fails fast while PokeAPI is unhealthy. Fan-outs (list
+pages, evolution chains, search results) run on a shared, bounded thread
+pool so a cold page costs about one upstream round trip instead of one per
+item. Whole-record builds (batches of full records) run on a second pool,
+because they wait on the first one and on each other. The time a request
+may spend sleeping between retries is one budget shared by all of its
+PokeAPI calls, including those its fan-outs run on the pools.
+
+If POKEAPI_DUMP_DIR points at a local PokeAPI dump (the api-data layout,
+e.g. <dir>/pokemon/25/index.json), resources are read from disk instead.
+"""
+
+import contextvars
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Callable, Iterable, Optional, TypeVar
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+import admission
+from metrics import UPSTREAM_LATENCY, UPSTREAM_RETRIES
+
+load_dotenv()
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+POKEAPI_BASE_URL = os.getenv('POKEAPI_BASE_URL', 'https://pokeapi.co/api/v2').rstrip('/')
+
+# Máximo de llamadas simultáneas a PokeAPI por proceso
+POKEAPI_MAX_CONCURRENCY = int(os.getenv('POKEAPI_MAX_CONCURRENCY', '8'))
+# Conexiones keep-alive por host en el pool de la sesión
+POKEAPI_POOL_SIZE = int(os.getenv('POKEAPI_POOL_SIZE', str(POKEAPI_MAX_CONCURRENCY)))
+POKEAPI_CONNECT_TIMEOUT = float(os.getenv('POKEAPI_CONNECT_TIMEOUT', '3.05'))
+POKEAPI_READ_TIMEOUT = float(os.getenv('POKEAPI_READ_TIMEOUT', '10'))
+POKEAPI_RETRIES = int(os.getenv('POKEAPI_RETRIES', '3'))
+POKEAPI_BACKOFF = float(os.getenv('POKEAPI_BACKOFF', '0.25'))
+# Tiempo total máximo que un request puede pasar esperando entre reintentos,
+# sumando todas sus llamadas a PokeAPI
+POKEAPI_RETRY_BUDGET = float(os.getenv('POKEAPI_RETRY_BUDGET', '1.0'))
+POKEAPI_BREAKER_THRESHOLD = int(os.getenv('POKEAPI_BREAKER_THRESHOLD', '5'))
+POKEAPI_BREAKER_COOLDOWN = float(os.getenv('POKEAPI_BREAKER_COOLDOWN', '30'))
+# Registros completos que un batch construye a la vez por proceso
+POKEAPI_BUILD_CONCURRENCY = int(os.getenv('POKEAPI_BUILD_CONCURRENCY', '4'))
+# Directorio con un dump local de PokeAPI (api/v2); vacío = usar la red
+POKEAPI_DUMP_DIR = os.getenv('POKEAPI_DUMP_DIR', '')
+
+
+class UpstreamError(Exception):
+    """
+    Error al obtener datos de PokeAPI. `status` es el código HTTP si lo hubo.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+
+class UpstreamUnavailable(UpstreamError):
+    """
+    El circuit breaker está abierto: no se intenta la llamada.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por proceso. Tras `threshold` fallos consecutivos se abre
+    durante `cooldown` segundos; luego deja pasar una sola llamada de prueba
+    (half-open) que lo cierra si sale bien o lo reabre si falla.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def is_open(self) -> bool:
+        with self._lock:
+            return self._opened_at is not None and time.monotonic() - self._opened_at < self.cooldown
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.cooldown or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def abandon_probe(self):
+        """
+        La llamada terminó sin resultado (cancelada o con un error no previsto):
+        si era la de prueba, otra puede intentarlo; el estado no cambia.
+        """
+        with self._lock:
+            if self._opened_at is not None:
+                self._probing = False
+
+
+breaker = CircuitBreaker(POKEAPI_BREAKER_THRESHOLD, POKEAPI_BREAKER_COOLDOWN)
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+def get_session() -> requests.Session:
+    """
+    Sesión HTTP compartida del proceso (pool de conexiones keep-alive).
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                # Los reintentos se gestionan aquí, no en urllib3
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POKEAPI_POOL_SIZE, max_retries=0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                _session = session
+    return _session
+
+def _retry_after(resp: requests.Response) -> Optional[float]:
+    value = resp.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except Exception:
+        return None
+
+def _is_retryable(status: Optional[int]) -> bool:
+    # Errores de red, 429 y 5xx; un 404 no se arregla reintentando
+    return status is None or status == 429 or status >= 500
+
+# Recursos que se etiquetan por nombre en las métricas; el resto va como "other"
+_RESOURCES = {"pokemon", "pokemon-species", "evolution-chain"}
+
+def _resource(url: str) -> str:
+    """
+    Recurso de PokeAPI de una URL para las métricas: .../pokemon/25 -> pokemon,
+    .../pokemon?limit=20 -> pokemon-list.
+    """
+    path = url[len(POKEAPI_BASE_URL):] if url.startswith(POKEAPI_BASE_URL) else url.split("/api/v2/", 1)[-1]
+    parts = path.split("?", 1)[0].strip("/").split("/")
+    name = parts[0] if parts[0] in _RESOURCES else "other"
+    return f"{name}-list" if name != "other" and len(parts) == 1 else name
+
+class RetryBudget:
+    """
+    Segundos de espera entre reintentos que le quedan a un request. Lo
+    comparten todas sus llamadas, también las que corren en los pools.
+    """
+
+    def __init__(self, seconds: float):
+        self._left = seconds
+        self._lock = threading.Lock()
+
+    def take(self, delay: float) -> bool:
+        with self._lock:
+            if delay > self._left:
+                return False
+            self._left -= delay
+            return True
+
+_retry_budget: contextvars.ContextVar[Optional[RetryBudget]] = contextvars.ContextVar("retry_budget", default=None)
+
+def start_request():
+    """
+    Abre el presupuesto de reintentos del request actual (before_request).
+    Fuera de un request (warmup, refrescos) cada llamada tiene el suyo.
+    """
+    _retry_budget.set(RetryBudget(POKEAPI_RETRY_BUDGET))
+
+def retry_budget() -> RetryBudget:
+    return _retry_budget.get() or RetryBudget(POKEAPI_RETRY_BUDGET)
+
+def set_dump_dir(path: str):
+    """
+    Lee los recursos desde un dump local de PokeAPI en lugar de la red.
+    """
+    global POKEAPI_DUMP_DIR
+    POKEAPI_DUMP_DIR = path
+
+def _read_dump(url: str) -> dict:
+    # https://pokeapi.co/api/v2/pokemon/25/ -> <dump>/pokemon/25/index.json
+    if url.startswith(POKEAPI_BASE_URL):
+        path = url[len(POKEAPI_BASE_URL):]
+    else:
+        path = "/" + url.split("/api/v2/", 1)[-1]
+    path = path.split("?", 1)[0].strip("/")
+    for candidate in (os.path.join(POKEAPI_DUMP_DIR, path, "index.json"), os.path.join(POKEAPI_DUMP_DIR, f"{path}.json")):
+        if os.path.isfile(candidate):
+            with open(candidate, "r", encoding="utf-8") as f:
+                return json.load(f)
+    raise UpstreamError(f"Fallo al obtener {url}: no existe en el dump {POKEAPI_DUMP_DIR}", 404)
+
+def get_json(url: str, retries: int = POKEAPI_RETRIES) -> dict:
+    """
+    GET de un recurso JSON de PokeAPI con reintentos y circuit breaker.
+
+    Raises:
+        UpstreamUnavailable: Si el breaker está abierto.
+        UpstreamError: Si la llamada falla tras los reintentos.
+        admission.Rejected: Si el presupuesto de PokeAPI está saturado.
+    """
+    if POKEAPI_DUMP_DIR:
+        return _read_dump(url)
+    # Antes del breaker: un rechazo no debe consumir la llamada de prueba
+    admission.escalate()
+    if not breaker.allow():
+        raise UpstreamUnavailable(f"PokeAPI no disponible (circuit breaker abierto): {url}")
+    budget = retry_budget()
+    resource = _resource(url)
+    last_exc: Optional[Exception] = None
+    status: Optional[int] = None
+    try:
+        for attempt in range(retries):
+            delay = None
+            started = time.perf_counter()
+            try:
+                resp = get_session().get(url, timeout=(POKEAPI_CONNECT_TIMEOUT, POKEAPI_READ_TIMEOUT))
+                status = resp.status_code
+                UPSTREAM_LATENCY.labels(resource, str(status)).observe(time.perf_counter() - started)
+                if status == 200:
+                    data = resp.json()
+                    breaker.record_success()
+                    return data
+                last_exc = Exception(f"HTTP {status} GET {url}")
+                delay = _retry_after(resp)
+            except requests.RequestException as e:
+                UPSTREAM_LATENCY.labels(resource, "error").observe(time.perf_counter() - started)
+                status = None
+                last_exc = e
+            if not _is_retryable(status):
+                # El servidor respondió: no cuenta como fallo para el breaker
+                breaker.record_success()
+                break
+            if attempt == retries - 1:
+                break
+            # Full jitter; si el servidor pide esperar más que el presupuesto, fallar ya
+            if delay is None:
+                delay = random.uniform(0, POKEAPI_BACKOFF * (2 ** attempt))
+            if not budget.take(delay):
+                break
+            UPSTREAM_RETRIES.labels(resource).inc()
+            time.sleep(delay)
+    except BaseException:
+        # Un error no previsto: la llamada de prueba del half-open no puede
+        # quedar tomada para siempre
+        breaker.abandon_probe()
+        raise
+    if _is_retryable(status):
+        breaker.record_failure()
+    raise UpstreamError(f"Fallo al obtener {url}: {last_exc}", status)
+
+
+# --------- Fan-out concurrente ---------
+
+_executor = ThreadPoolExecutor(max_workers=POKEAPI_MAX_CONCURRENCY, thread_name_prefix="pokeapi")
+# Constructores de registros completos: esperan a su propio fan-out en
+# _executor y a otros constructores (single-flight), así que no pueden ocupar
+# sus workers. _executor solo corre llamadas hoja, que nunca esperan a nadie
+_build_executor = ThreadPoolExecutor(max_workers=POKEAPI_BUILD_CONCURRENCY, thread_name_prefix="pokeapi-build")
+_local = threading.local()
+
+
+def _with_budget(budget: Optional[RetryBudget], fn: Callable[[T], R], item: T) -> R:
+    # Los threads de los pools no heredan el contexto del request
+    token = _retry_budget.set(budget)
+    try:
+        return fn(item)
+    finally:
+        _retry_budget.reset(token)
+
+def _run_in_worker(budget: Optional[RetryBudget], fn: Callable[[T], R], item: T) -> R:
+    _local.in_worker = True
+    return _with_budget(budget, fn, item)
+
+def map_concurrent(fn: Callable[[T], R], items: Iterable[T]) -> list[tuple[Optional[R], Optional[Exception]]]:
+    """
+    Aplica fn a cada item en el pool compartido.
+
+    Returns:
+        list: Un par (resultado, excepción) por item, en el mismo orden de entrada,
+        para que cada llamador decida cómo tratar los errores individuales.
+    """
+    items = list(items)
+    if items:
+        # Los threads del pool no heredan el lugar del request: se cambia aquí
+        admission.escalate()
+    # Si ya estamos dentro del pool (fan-out anidado) o hay un solo item,
+    # se ejecuta en serie para no bloquear workers esperando a otros workers
+    if len(items) <= 1 or getattr(_local, "in_worker", False):
+        return _run_serial(fn, items)
+    budget = _retry_budget.get()
+    return _collect([_executor.submit(_run_in_worker, budget, fn, item) for item in items])
+
+def map_builds(fn: Callable[[T], R], items: Iterable[T]) -> list[tuple[Optional[R], Optional[Exception]]]:
+    """
+    Como map_concurrent, para fn que construyen registros completos (con su
+    propio fan-out y single-flight): corren en un pool aparte para que un
+    constructor nunca ocupe el worker que necesita otro.
+    """
+    items = list(items)
+    if items:
+        admission.escalate()
+    if len(items) <= 1:
+        return _run_serial(fn, items)
+    budget = _retry_budget.get()
+    return _collect([_build_executor.submit(_with_budget, budget, fn, item) for item in items])
+
+def _run_serial(fn: Callable[[T], R], items: list[T]) -> list[tuple[Optional[R], Optional[Exception]]]:
+    results = []
+    for item in items:
+        try:
+            results.append((fn(item), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
+
+def _collect(futures: list) -> list[tuple[Optional[R], Optional[Exception]]]:
+    results = []
+    for future in futures:
+        try:
+            results.append((future.result(), None))
+        except Exception as e:
+            results.append((None, e))
+    return results
@@ -0,0 +1,140 @@
+"""
+This module is the asyncio counterpart of upstream.py for the async serving
+mode (asgi.py). It uses a single httpx.AsyncClient per process with the same
+timeouts, jittered retries, Retry-After handling and circuit breaker as the
+sync client, so a slow PokeAPI call only parks a coroutine instead of a
+thread and one process can keep thousands of them in flight.
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Awaitable, Callable, Iterable, Optional, TypeVar
+import httpx
+import admission
+import upstream
+from upstream import UpstreamError, UpstreamUnavailable, breaker
+from metrics import UPSTREAM_LATENCY, UPSTREAM_RETRIES
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Llamadas simultáneas a PokeAPI por proceso en modo async (mucho más alto
+# que en el pool de threads: esperar a PokeAPI no ocupa un thread)
+POKEAPI_ASYNC_MAX_CONCURRENCY = int(os.getenv('POKEAPI_ASYNC_MAX_CONCURRENCY', '1000'))
+# Conexiones keep-alive abiertas hacia PokeAPI
+POKEAPI_ASYNC_POOL_SIZE = int(os.getenv('POKEAPI_ASYNC_POOL_SIZE', '100'))
+
+_client: Optional[httpx.AsyncClient] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Cliente HTTP async compartido del proceso (pool de conexiones keep-alive).
+    """
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(upstream.POKEAPI_READ_TIMEOUT, connect=upstream.POKEAPI_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=POKEAPI_ASYNC_MAX_CONCURRENCY,
+                max_keepalive_connections=POKEAPI_ASYNC_POOL_SIZE,
+            ),
+        )
+    return _client
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(POKEAPI_ASYNC_MAX_CONCURRENCY)
+    return _semaphore
+
+async def close():
+    global _client, _semaphore
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _semaphore = None
+
+async def get_json(url: str, retries: int = upstream.POKEAPI_RETRIES) -> dict:
+    """
+    GET async de un recurso JSON de PokeAPI con reintentos y circuit breaker.
+
+    Raises:
+        UpstreamUnavailable: Si el breaker está abierto.
+        UpstreamError: Si la llamada falla tras los reintentos.
+    """
+    if upstream.POKEAPI_DUMP_DIR:
+        return await asyncio.to_thread(upstream._read_dump, url)
+    await admission.escalate_async()
+    if not breaker.allow():
+        raise UpstreamUnavailable(f"PokeAPI no disponible (circuit breaker abierto): {url}")
+    budget = upstream.retry_budget()
+    resource = upstream._resource(url)
+    last_exc: Optional[Exception] = None
+    status: Optional[int] = None
+    try:
+        for attempt in range(retries):
+            delay = None
+            try:
+                async with _get_semaphore():
+                    # Sin contar la espera por el semáforo: solo la llamada
+                    started = time.perf_counter()
+                    resp = await get_client().get(url)
+                status = resp.status_code
+                UPSTREAM_LATENCY.labels(resource, str(status)).observe(time.perf_counter() - started)
+                if status == 200:
+                    data = resp.json()
+                    breaker.record_success()
+                    return data
+                last_exc = Exception(f"HTTP {status} GET {url}")
+                delay = upstream._retry_after(resp)
+            except httpx.HTTPError as e:
+                UPSTREAM_LATENCY.labels(resource, "error").observe(time.perf_counter() - started)
+                status = None
+                last_exc = e
+            if not upstream._is_retryable(status):
+                # El servidor respondió: no cuenta como fallo para el breaker
+                breaker.record_success()
+                break
+            if attempt == retries - 1:
+                break
+            # Full jitter; si el servidor pide esperar más que el presupuesto, fallar ya
+            if delay is None:
+                delay = random.uniform(0, upstream.POKEAPI_BACKOFF * (2 ** attempt))
+            if not budget.take(delay):
+                break
+            UPSTREAM_RETRIES.labels(resource).inc()
+            await asyncio.sleep(delay)
+    except BaseException:
+        # Cancelada (el cliente se fue) o un error no previsto (JSON inválido):
+        # la llamada de prueba del half-open no puede quedar tomada para siempre
+        breaker.abandon_probe()
+        raise
+    if upstream._is_retryable(status):
+        breaker.record_failure()
+    raise UpstreamError(f"Fallo al obtener {url}: {last_exc}", status)
+
+
+async def map_concurrent(fn: Callable[[T], Awaitable[R]], items: Iterable[T]) -> list[tuple[Optional[R], Optional[Exception]]]:
+    """
+    Ejecuta fn(item) para todos los items a la vez (acotado por el semáforo de get_json).
+
+    Returns:
+        list: Un par (resultado, excepción) por item, en el mismo orden de entrada.
+    """
+    items = list(items)
+    if items:
+        await admission.escalate_async()
+    results = await asyncio.gather(*(fn(item) for item in items), return_exceptions=True)
+    pairs: list[tuple[Optional[R], Optional[Exception]]] = []
+    for result in results:
+        if isinstance(result, Exception):
+            pairs.append((None, result))
+        elif isinstance(result, BaseException):
+            raise result
+        else:
+            pairs.append((result, None))
+    return pairs
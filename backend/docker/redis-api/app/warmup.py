@@ -0,0 +1,228 @@
+"""
+Bulk warm-up of the Pokédex cache.
+
+Streams every id in search_pokemons.json through the same fetch/format logic
+as the API, with bounded concurrency, and bulk-loads the light and full
+records into Redis through pipelines. Species and evolution-chain responses
+are fetched once per run and shared by every Pokémon that references them,
+and so is each /pokemon detail, even when an earlier member of its
+evolution chain needs its light record first. Concurrency never exceeds
+the HTTP connection pool. Ids already cached are skipped (their light
+records are read from Redis), so an interrupted run can simply be resumed;
+skipped ids whose full record predates the attribute indexes are indexed
+from Redis without going back to PokeAPI.
+
+Usage:
+    python warmup.py [--concurrency 8] [--chunk-size 100] [--dump-dir DIR] [--force]
+
+With --dump-dir (or POKEAPI_DUMP_DIR) the data is read from a local PokeAPI
+dump instead of the network.
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Optional
+
+import redis
+import cache
+import upstream
+from db import Database
+from pokemons import (
+    POKEAPI_BASE_URL,
+    PokemonLight,
+    _build_full_from_detail,
+    _build_light_from_detail,
+    _chain_pids,
+    _id_from_url,
+    _species_info_from_json,
+)
+from search import _load_search_index
+
+# Nunca más que el pool de conexiones: de lo contrario urllib3 abre y descarta conexiones
+WARMUP_CONCURRENCY = int(os.getenv('WARMUP_CONCURRENCY', str(upstream.POKEAPI_POOL_SIZE)))
+WARMUP_CHUNK_SIZE = int(os.getenv('WARMUP_CHUNK_SIZE', '100'))
+# Precalentar al arrancar el servicio: una vez por arranque, no por worker
+WARMUP_ON_STARTUP = os.getenv('WARMUP_ON_STARTUP', 'false').lower() == 'true'
+
+
+class _Memo:
+    """
+    Memoización thread-safe: cada clave se calcula una sola vez aunque la
+    pidan varios workers a la vez.
+    """
+
+    def __init__(self):
+        self._futures: dict = {}
+        self._lock = threading.Lock()
+
+    def get(self, key, compute: Callable):
+        with self._lock:
+            future = self._futures.get(key)
+            owner = future is None
+            if owner:
+                future = self._futures[key] = Future()
+        if owner:
+            try:
+                future.set_result(compute())
+            except Exception as e:
+                # Los errores no se memorizan: el próximo que lo pida reintenta
+                with self._lock:
+                    self._futures.pop(key, None)
+                future.set_exception(e)
+        return future.result()
+
+    def put(self, key, value):
+        with self._lock:
+            if key not in self._futures:
+                future = Future()
+                future.set_result(value)
+                self._futures[key] = future
+
+    def pop(self, key):
+        with self._lock:
+            self._futures.pop(key, None)
+
+
+class Warmer:
+    def __init__(self, redis_connection: redis.Redis, concurrency: int = WARMUP_CONCURRENCY):
+        self.redis = redis_connection
+        concurrency = max(1, min(concurrency, upstream.POKEAPI_POOL_SIZE))
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="warmup")
+        # Solo se guardan datos pequeños entre chunks: lights, egg groups y cadenas
+        self._lights = _Memo()   # pid -> PokemonLight
+        self._species = _Memo()  # species url -> {eggGroups, chainUrl}
+        self._chains = _Memo()   # chain url -> [pid]
+        # Detalles de miembros de cadena pedidos antes de su propio _build; se sueltan al construirlo
+        self._details = _Memo()  # pid -> detalle crudo
+        self._pending: set[int] = set()
+
+    def _detail(self, pid: int) -> dict:
+        return self._details.get(pid, lambda: upstream.get_json(f"{POKEAPI_BASE_URL}/pokemon/{pid}"))
+
+    def _light(self, pid: int) -> PokemonLight:
+        # Un miembro que aún falta construir comparte el detalle con su _build
+        if pid in self._pending:
+            return self._lights.get(pid, lambda: _build_light_from_detail(self._detail(pid)))
+        return self._lights.get(pid, lambda: _build_light_from_detail(
+            upstream.get_json(f"{POKEAPI_BASE_URL}/pokemon/{pid}")))
+
+    def _species_info(self, url: str) -> dict:
+        return self._species.get(url, lambda: _species_info_from_json(upstream.get_json(url)))
+
+    def _chain(self, url: str) -> list[int]:
+        return self._chains.get(url, lambda: _chain_pids(upstream.get_json(url)))
+
+    def _build(self, pid: int) -> list[tuple[str, dict, cache.TTLPolicy]]:
+        url = f"{POKEAPI_BASE_URL}/pokemon/{pid}"
+        detail = self._detail(pid)
+        light = _build_light_from_detail(detail)
+        self._lights.put(pid, light)
+        self._pending.discard(pid)
+        self._details.pop(pid)
+        species_url = detail["species"]["url"]
+        species = self._species_info(species_url)
+        chain = self._chain(species["chainUrl"])
+        evolutions = [self._light(member) for member in chain]
+        full = _build_full_from_detail(detail, url, species["eggGroups"], evolutions)
+        return [
+            (cache.full_key(pid), full, cache.FULL),
+            (cache.light_key(pid), light, cache.LIGHT),
+            # Species y cadena también quedan cacheadas para el camino normal
+            (cache.species_key(_id_from_url(species_url)), species, cache.SPECIES),
+            (cache.chain_key(_id_from_url(species["chainUrl"])), chain, cache.CHAIN),
+        ]
+
+    def _already_cached(self, ids: list[int]) -> set[int]:
+        pipe = self.redis.pipeline(transaction=False)
+        for pid in ids:
+            pipe.exists(cache.full_key(pid), cache.light_key(pid))
+            pipe.sismember(cache.indexed_ids_key(), pid)
+        replies = pipe.execute()
+        cached = {pid for pid, count in zip(ids, replies[::2]) if count == 2}
+        # Fulls cacheados antes de existir los índices: se indexan sin volver a PokeAPI
+        unindexed = [pid for pid, indexed in zip(ids, replies[1::2]) if pid in cached and not indexed]
+        fulls = [full for full in cache.get_many(self.redis, [cache.full_key(pid) for pid in unindexed]) if full]
+        cache.index_fulls(self.redis, fulls)
+        # Los lights ya cacheados sirven a las cadenas sin volver a PokeAPI
+        cached_ids = sorted(cached)
+        lights = cache.get_many(self.redis, [cache.light_key(pid) for pid in cached_ids])
+        for pid, light in zip(cached_ids, lights):
+            if light:
+                self._lights.put(pid, light)
+        return cached
+
+    def run(self, ids: list[int], chunk_size: int = WARMUP_CHUNK_SIZE, force: bool = False, log=print) -> dict:
+        """
+        Precalienta `ids` por chunks. Devuelve estadísticas de la corrida.
+        """
+        stats = {"total": len(ids), "loaded": 0, "skipped": 0, "errors": 0, "seconds": 0.0}
+        started = time.monotonic()
+        if not force:
+            # Primero todos los ya cacheados: las cadenas pueden apuntar a ids de chunks posteriores
+            cached: set[int] = set()
+            for start in range(0, len(ids), chunk_size):
+                cached |= self._already_cached(ids[start:start + chunk_size])
+            stats["skipped"] = len(cached)
+            ids = [pid for pid in ids if pid not in cached]
+        self._pending = set(ids)
+        for start in range(0, len(ids), chunk_size):
+            chunk = ids[start:start + chunk_size]
+            items: list[tuple[str, dict, cache.TTLPolicy]] = []
+            for pid, future in [(pid, self._executor.submit(self._build, pid)) for pid in chunk]:
+                try:
+                    items.extend(future.result())
+                except Exception as e:
+                    stats["errors"] += 1
+                    log(f"[warmup] error en {pid}: {e}")
+            # Un pipeline por chunk para todos los full + light
+            cache.set_many(self.redis, items)
+            stats["loaded"] += sum(1 for key, _, _ in items if key.endswith(":full"))
+            elapsed = time.monotonic() - started
+            done = stats["skipped"] + min(start + chunk_size, len(ids))
+            log(f"[warmup] {done}/{stats['total']} ids, {stats['loaded']} cargados, "
+                f"{stats['skipped']} ya en cache, {stats['errors']} errores, "
+                f"{stats['loaded'] / elapsed if elapsed else 0:.1f} pokémon/s")
+        stats["seconds"] = time.monotonic() - started
+        self._executor.shutdown(wait=False)
+        return stats
+
+
+def all_ids() -> list[int]:
+    return sorted(set(_load_search_index().values()))
+
+def run_warmup(concurrency: int = WARMUP_CONCURRENCY, chunk_size: int = WARMUP_CHUNK_SIZE,
+               dump_dir: Optional[str] = None, force: bool = False) -> dict:
+    if dump_dir:
+        upstream.set_dump_dir(dump_dir)
+    warmer = Warmer(Database().get_connection(), concurrency)
+    return warmer.run(all_ids(), chunk_size=chunk_size, force=force)
+
+
+def start_background() -> Optional[threading.Thread]:
+    # Para los servidores de desarrollo (un solo proceso); gunicorn lo lanza desde el master
+    if not WARMUP_ON_STARTUP:
+        return None
+    thread = threading.Thread(target=run_warmup, name="warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Precalienta la cache de Redis con toda la Pokédex.")
+    parser.add_argument("--concurrency", type=int, default=WARMUP_CONCURRENCY, help="Llamadas simultáneas a PokeAPI")
+    parser.add_argument("--chunk-size", type=int, default=WARMUP_CHUNK_SIZE, help="Pokémon por pipeline")
+    parser.add_argument("--dump-dir", default=os.getenv('POKEAPI_DUMP_DIR', ''), help="Dump local de PokeAPI (api/v2)")
+    parser.add_argument("--force", action="store_true", help="Recargar también los ya cacheados")
+    args = parser.parse_args(argv)
+    stats = run_warmup(args.concurrency, args.chunk_size, args.dump_dir or None, args.force)
+    print(f"[warmup] terminado: {stats['loaded']} cargados, {stats['skipped']} ya en cache, "
+          f"{stats['errors']} errores en {stats['seconds']:.1f}s")
+    return 1 if stats["errors"] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
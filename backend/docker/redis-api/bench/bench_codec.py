@@ -0,0 +1,146 @@
+"""
+Compares the cache codecs (codec.py) on the whole Pokédex: stored bytes and
+per-entry encode/decode time for JSON versus msgpack with and without
+compression.
+
+Records are built from search_pokemons.json with the same shape the API
+caches (light, full with its evolution chain, and 20-item list pages). With
+--dump-dir they are built from a local PokeAPI dump instead, and with
+--redis-url the entries are also written to Redis to report MEMORY USAGE.
+
+Usage:
+    python bench/bench_codec.py [--dump-dir DIR] [--redis-url redis://localhost:6379/15]
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import codec  # noqa: E402
+from upstream import POKEAPI_BASE_URL  # noqa: E402
+
+SPRITES = codec.SPRITES_BASE_URL
+
+
+def _synthetic_records() -> dict[str, list]:
+    with open(os.path.join(os.path.dirname(__file__), "..", "app", "search_pokemons.json"), encoding="utf-8") as f:
+        index = json.load(f)
+    lights = {
+        pid: {
+            "id": pid,
+            "name": name,
+            "url": f"{POKEAPI_BASE_URL}/pokemon/{pid}",
+            "icon": f"{SPRITES}/{pid}.png",
+            "officialArtwork": f"{SPRITES}/other/official-artwork/{pid}.png",
+        }
+        for name, pid in index.items()
+    }
+    ids = sorted(lights)
+    fulls = []
+    for pid in ids:
+        # Cadenas de 3 como aproximación a las reales
+        start = pid - (pid - 1) % 3
+        chain = [lights[i] for i in range(start, start + 3) if i in lights]
+        fulls.append({
+            **lights[pid],
+            "height": 7,
+            "weight": 69,
+            "species": {"name": lights[pid]["name"], "url": f"{POKEAPI_BASE_URL}/pokemon-species/{pid}/"},
+            "eggsGroups": ["monster", "plant"],
+            "abilities": ["overgrow", "chlorophyll"],
+            "types": "grass,poison",
+            "evolutions": chain,
+        })
+    pages = [[lights[i] for i in ids[start:start + 20]] for start in range(0, len(ids), 20)]
+    return {"light": [lights[i] for i in ids], "full": fulls, "list": pages}
+
+def _dump_records(dump_dir: str) -> dict[str, list]:
+    import upstream
+    from pokemons import _build_full_from_detail, _build_light_from_detail, _chain_pids, _species_info_from_json
+    upstream.set_dump_dir(dump_dir)
+    with open(os.path.join(os.path.dirname(__file__), "..", "app", "search_pokemons.json"), encoding="utf-8") as f:
+        ids = sorted(set(json.load(f).values()))
+    details = {}
+    for pid in ids:
+        try:
+            details[pid] = upstream.get_json(f"{POKEAPI_BASE_URL}/pokemon/{pid}")
+        except upstream.UpstreamError:
+            continue
+    lights = {pid: _build_light_from_detail(d) for pid, d in details.items()}
+    fulls = []
+    for pid, detail in details.items():
+        species = _species_info_from_json(upstream.get_json(detail["species"]["url"]))
+        chain = [lights[i] for i in _chain_pids(upstream.get_json(species["chainUrl"])) if i in lights]
+        fulls.append(_build_full_from_detail(detail, f"{POKEAPI_BASE_URL}/pokemon/{pid}", species["eggGroups"], chain))
+    ordered = sorted(lights)
+    pages = [[lights[i] for i in ordered[start:start + 20]] for start in range(0, len(ordered), 20)]
+    return {"light": [lights[i] for i in ordered], "full": fulls, "list": pages}
+
+def _bench(name: str, c, records: list, rounds: int) -> dict:
+    payloads = [c.encode(r, 0.0) for r in records]
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for r in records:
+            c.encode(r, 0.0)
+    encode_us = (time.perf_counter() - started) / (rounds * len(records)) * 1e6
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for p in payloads:
+            codec.decode(p)
+    decode_us = (time.perf_counter() - started) / (rounds * len(records)) * 1e6
+    return {"codec": name, "bytes": sum(len(p) for p in payloads), "encode_us": encode_us,
+            "decode_us": decode_us, "payloads": payloads}
+
+def _redis_memory(redis_url: str, family: str, payloads: list) -> int:
+    import redis
+    r = redis.Redis.from_url(redis_url)
+    keys = [f"bench:codec:{family}:{i}" for i in range(len(payloads))]
+    pipe = r.pipeline(transaction=False)
+    for key, payload in zip(keys, payloads):
+        pipe.set(key, payload)
+    pipe.execute()
+    pipe = r.pipeline(transaction=False)
+    for key in keys:
+        pipe.memory_usage(key, samples=0)
+    total = sum(pipe.execute())
+    r.delete(*keys)
+    return total
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark de los codecs de cache.")
+    parser.add_argument("--dump-dir", default="", help="Dump local de PokeAPI para usar registros reales")
+    parser.add_argument("--redis-url", default="", help="Redis donde medir MEMORY USAGE (se borran las claves)")
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    families = _dump_records(args.dump_dir) if args.dump_dir else _synthetic_records()
+    codecs = [
+        ("json", codec.JSONCodec()),
+        ("msgpack", codec.MsgpackCodec(compression="none")),
+        ("msgpack+zstd", codec.MsgpackCodec(compression="zstd")),
+        ("msgpack+lz4", codec.MsgpackCodec(compression="lz4")),
+    ]
+    header = f"{'familia':<6} {'codec':<13} {'entradas':>8} {'bytes':>10} {'vs json':>8} {'enc µs':>8} {'dec µs':>8}"
+    if args.redis_url:
+        header += f" {'redis bytes':>12}"
+    print(header)
+    for family, records in families.items():
+        baseline = None
+        for name, c in codecs:
+            result = _bench(name, c, records, args.rounds)
+            baseline = baseline or result["bytes"]
+            line = (f"{family:<6} {name:<13} {len(records):>8} {result['bytes']:>10} "
+                    f"{result['bytes'] / baseline:>7.0%} {result['encode_us']:>8.1f} {result['decode_us']:>8.1f}")
+            if args.redis_url:
+                line += f" {_redis_memory(args.redis_url, family, result['payloads']):>12}"
+            print(line)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
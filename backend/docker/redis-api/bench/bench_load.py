@@ -0,0 +1,347 @@
+"""
+End-to-end load scenarios against the real service, with the production
+entry point (gunicorn -c gunicorn.conf.py), a local PokeAPI stub
+(pokeapi_stub.py) and a Redis stand-in (redis_standin.py, fakeredis over
+TCP) or a real Redis given with --redis-url.
+
+Scenarios:
+- list_cold / list_warm: /getListPokemon pages across the whole Pokédex.
+- pokemon_cold / pokemon_warm: /getPokemon/<pid> over a sample of ids.
+- search_cold / search_warm: type-ahead /searchPokemon sessions, one request
+  per typed character of a sampled name.
+
+A cold scenario starts from an empty Redis and a freshly started service
+(no L1, no search memo) and sends each request once. A warm scenario first
+sends all its requests once, unmeasured, and then replays them at random
+for --duration seconds. Every scenario reports p50/p95/p99, RPS, the status
+codes, how many requests admission control shed (429/503) and how many
+calls reached the PokeAPI stub.
+
+With --target the scenarios hit an already running deployment instead.
+Nothing is restarted then, so cold scenarios are only cold the first time.
+
+The service always uses Redis db 0, and cold scenarios FLUSHDB it: only
+point --redis-url at a throwaway Redis.
+
+Usage:
+    python bench/bench_load.py [--scenarios list_cold,pokemon_warm] [--concurrency 16] [--duration 10]
+                               [--latency-ms 50] [--error-rate 0.01] [--server-mode sync|async] [--output FILE]
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.parse
+import urllib.request
+from collections import Counter, deque
+from typing import Optional
+
+import report
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCH_DIR, "..", "app")
+SCENARIOS = ["list_cold", "list_warm", "pokemon_cold", "pokemon_warm", "search_cold", "search_warm"]
+# Pausa antes de repetir un request rechazado (429/503) en la pasada previa de los warm
+SHED_RETRY_DELAY = 0.2
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _wait(check, timeout: float, what: str):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except Exception:
+            pass
+        time.sleep(0.1)
+    raise SystemExit(f"{what} no respondió en {timeout:.0f}s")
+
+def _http_ok(url: str) -> bool:
+    with urllib.request.urlopen(url, timeout=2) as resp:
+        return resp.status == 200
+
+
+class Environment:
+    """
+    Procesos de una corrida: stub de PokeAPI, Redis (stand-in o real) y el
+    servicio bajo gunicorn. Con --target solo apunta a la URL dada.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.workdir = tempfile.mkdtemp(prefix="pokedex-bench-")
+        self.processes: dict[str, subprocess.Popen] = {}
+        self.stub_url = ""
+        self.redis_host, self.redis_port = "", 0
+        self.base_url = args.target.rstrip("/")
+        self.managed = not args.target
+
+    def _spawn(self, name: str, cmd: list[str], cwd: str = BENCH_DIR, env: Optional[dict] = None):
+        log = open(os.path.join(self.workdir, f"{name}.log"), "ab")
+        self.processes[name] = subprocess.Popen(cmd, cwd=cwd, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+    def _stop(self, name: str):
+        process = self.processes.pop(name, None)
+        if process is None:
+            return
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    def start(self):
+        if not self.managed:
+            _wait(lambda: _http_ok(f"{self.base_url}/healthz"), 30, self.base_url)
+            return
+        import redis
+        stub_port = _free_port()
+        self._spawn("stub", [sys.executable, "pokeapi_stub.py", "--port", str(stub_port),
+                             "--latency-ms", str(self.args.latency_ms), "--jitter-ms", str(self.args.jitter_ms),
+                             "--error-rate", str(self.args.error_rate), "--seed", str(self.args.seed)])
+        self.stub_url = f"http://127.0.0.1:{stub_port}"
+        _wait(lambda: _http_ok(f"{self.stub_url}/_stub/stats"), 30, "El stub de PokeAPI")
+        if self.args.redis_url:
+            url = urllib.parse.urlparse(self.args.redis_url)
+            self.redis_host, self.redis_port = url.hostname or "127.0.0.1", url.port or 6379
+        else:
+            self.redis_host, self.redis_port = "127.0.0.1", _free_port()
+            self._spawn("redis", [sys.executable, "redis_standin.py", "--port", str(self.redis_port)])
+        self.redis = redis.Redis(host=self.redis_host, port=self.redis_port, db=0)
+        _wait(self.redis.ping, 30, "Redis")
+        self._start_service()
+
+    def _start_service(self):
+        port = _free_port()
+        env = dict(os.environ)
+        env.update({
+            "PORT": str(port),
+            "REDIS_HOST": self.redis_host,
+            "REDIS_PORT": str(self.redis_port),
+            "POKEAPI_BASE_URL": f"{self.stub_url}/api/v2",
+            "SERVER_MODE": self.args.server_mode,
+            "GUNICORN_WORKERS": str(self.args.workers),
+            "GUNICORN_THREADS": str(self.args.threads),
+            "PROMETHEUS_MULTIPROC_DIR": os.path.join(self.workdir, "prometheus"),
+            "WARMUP_ON_STARTUP": "false",
+        })
+        self._spawn("service", [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py"], cwd=APP_DIR, env=env)
+        self.base_url = f"http://127.0.0.1:{port}"
+        _wait(lambda: _http_ok(f"{self.base_url}/readyz"), 60, "El servicio")
+
+    def reset(self) -> bool:
+        """
+        Estado frío: Redis vacío y el servicio recién arrancado. False si no se puede (--target).
+        """
+        if not self.managed:
+            return False
+        self._stop("service")
+        self.redis.flushdb()
+        self._start_service()
+        return True
+
+    def upstream_calls(self) -> Optional[int]:
+        if not self.stub_url:
+            return None
+        with urllib.request.urlopen(f"{self.stub_url}/_stub/stats", timeout=5) as resp:
+            return json.load(resp).get("requests", 0)
+
+    def stop(self):
+        for name in ("service", "redis", "stub"):
+            self._stop(name)
+        if self.args.keep_logs:
+            print(f"logs: {self.workdir}")
+        else:
+            shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+# --------- Cliente de carga ---------
+
+class _Client:
+    """
+    Una conexión keep-alive por thread, como un navegador o un proxy.
+    """
+
+    def __init__(self, base_url: str):
+        url = urllib.parse.urlparse(base_url)
+        self.host, self.port = url.hostname, url.port or 80
+        self.conn: Optional[http.client.HTTPConnection] = None
+
+    def get(self, path: str) -> tuple[int, float]:
+        started = time.perf_counter()
+        try:
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=60)
+            self.conn.request("GET", path, headers={"Accept-Encoding": "gzip"})
+            resp = self.conn.getresponse()
+            resp.read()
+            status = resp.status
+            if resp.will_close:
+                self.conn.close()
+                self.conn = None
+        except (OSError, http.client.HTTPException):
+            if self.conn is not None:
+                self.conn.close()
+            self.conn = None
+            status = 0
+        return status, time.perf_counter() - started
+
+def run_sessions(base_url: str, sessions: list[list[str]], concurrency: int,
+                 duration: Optional[float] = None, seed: int = 0, retry_shed: bool = False) -> dict:
+    """
+    Ejecuta las sesiones (listas de paths que se piden en orden) con
+    `concurrency` threads: cada sesión una vez, o al azar durante `duration`
+    segundos. Con retry_shed los 429/503 se repiten hasta que se atienden.
+    """
+    pending = deque(sessions)
+    lock = threading.Lock()
+    latencies: list[list[float]] = [[] for _ in range(concurrency)]
+    statuses: list[Counter] = [Counter() for _ in range(concurrency)]
+    deadline = None if duration is None else time.perf_counter() + duration
+
+    def _worker(i: int):
+        client = _Client(base_url)
+        rng = random.Random(seed + i)
+        while True:
+            if deadline is None:
+                with lock:
+                    if not pending:
+                        return
+                    session = pending.popleft()
+            elif time.perf_counter() >= deadline:
+                return
+            else:
+                session = rng.choice(sessions)
+            for path in session:
+                status, elapsed = client.get(path)
+                while retry_shed and status in (429, 503):
+                    time.sleep(SHED_RETRY_DELAY)
+                    status, elapsed = client.get(path)
+                latencies[i].append(elapsed)
+                statuses[i][status] += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=_worker, args=(i,)) for i in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    samples = [s * 1000 for worker in latencies for s in worker]
+    status = sum(statuses, Counter())
+    return {
+        "requests": len(samples),
+        # 429/503 son rechazos del control de admisión, no fallos del servicio
+        "errors": sum(n for code, n in status.items() if code == 0 or (code >= 500 and code != 503)),
+        "shed": status[429] + status[503],
+        "status": {str(code): n for code, n in sorted(status.items())},
+        "duration_s": wall,
+        "rps": len(samples) / wall if wall else 0.0,
+        "latency_ms": report.percentiles(samples),
+    }
+
+
+# --------- Escenarios ---------
+
+def _sessions(kind: str, args, names: dict[str, int]) -> list[list[str]]:
+    rng = random.Random(args.seed)
+    ids = sorted(set(names.values()))
+    if kind == "list":
+        return [[f"/getListPokemon?limit={args.page_size}&offset={offset}"]
+                for offset in range(0, len(ids), args.page_size)]
+    if kind == "pokemon":
+        return [[f"/getPokemon/{pid}"] for pid in rng.sample(ids, min(args.ids, len(ids)))]
+    typed = rng.sample(sorted(names), min(args.names, len(names)))
+    return [[f"/searchPokemon/{urllib.parse.quote(name[:n])}" for n in range(args.min_prefix, len(name) + 1)]
+            for name in typed]
+
+def run_scenario(env: Environment, name: str, args, names: dict[str, int]) -> dict:
+    kind, temperature = name.split("_")
+    sessions = _sessions(kind, args, names)
+    if temperature == "cold":
+        reset = env.reset()
+    else:
+        reset = False
+        # La pasada previa tiene que cachear todo aunque el servicio rechace requests
+        run_sessions(env.base_url, sessions, args.concurrency, seed=args.seed, retry_shed=True)
+    calls_before = env.upstream_calls()
+    result = run_sessions(env.base_url, sessions, args.concurrency,
+                          None if temperature == "cold" else args.duration, seed=args.seed)
+    calls_after = env.upstream_calls()
+    result["upstream_calls"] = None if calls_before is None else calls_after - calls_before
+    result["sessions"] = len(sessions)
+    if temperature == "cold":
+        result["reset"] = reset
+    return result
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Escenarios de carga end-to-end.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=16, help="Clientes simultáneos")
+    parser.add_argument("--duration", type=float, default=10, help="Segundos de cada escenario warm")
+    parser.add_argument("--page-size", type=int, default=20)
+    parser.add_argument("--ids", type=int, default=200, help="Ids distintos en los escenarios de /getPokemon")
+    parser.add_argument("--names", type=int, default=60, help="Nombres tipeados en los escenarios de búsqueda")
+    parser.add_argument("--min-prefix", type=int, default=2, help="Letras antes de la primera búsqueda")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Latencia del stub de PokeAPI")
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fracción de 503 del stub")
+    parser.add_argument("--server-mode", choices=("sync", "async"), default="sync")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--redis-url", default="", help="Redis real (se vacía su db 0) en lugar de fakeredis")
+    parser.add_argument("--target", default="", help="URL de un servicio ya levantado")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default="", help="Archivo JSON de resultados (por defecto bench/results/)")
+    parser.add_argument("--keep-logs", action="store_true")
+    args = parser.parse_args(argv)
+
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"escenarios desconocidos: {', '.join(unknown)}")
+    with open(os.path.join(APP_DIR, "search_pokemons.json"), encoding="utf-8") as f:
+        names: dict[str, int] = json.load(f)
+
+    env = Environment(args)
+    results = {}
+    try:
+        env.start()
+        for name in scenarios:
+            print(f"{name}...", flush=True)
+            results[name] = run_scenario(env, name, args, names)
+    finally:
+        env.stop()
+
+    rows = [{"scenario": name, **r, **{k: v for k, v in r["latency_ms"].items()}} for name, r in results.items()]
+    print(report.table(rows, [
+        ("scenario", "scenario", ""), ("requests", "requests", "d"), ("errors", "errors", "d"), ("shed", "shed", "d"),
+        ("rps", "rps", ",.1f"), ("p50", "p50 ms", ".2f"), ("p95", "p95 ms", ".2f"), ("p99", "p99 ms", ".2f"),
+        ("upstream_calls", "upstream", "d"),
+    ]))
+    config = {key: value for key, value in vars(args).items() if key not in ("output", "keep_logs")}
+    config["redis"] = "url" if args.redis_url else ("target" if args.target else "fakeredis")
+    config.pop("redis_url")
+    path = report.write(args.output, "load", config, {"scenarios": results})
+    print(f"\nresultados: {path}")
+    return 1 if any(r["errors"] for r in results.values()) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
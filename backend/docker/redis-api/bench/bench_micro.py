@@ -0,0 +1,123 @@
+"""
+Microbenchmarks of the hot pure-Python paths: name normalization,
+Levenshtein, the search ranking, search_pokemon_by_name end to end with its
+lights already cached, and encode/decode of every cache codec.
+
+search_pokemon_by_name runs against an in-process fakeredis (or a real Redis
+with --redis-url) holding the light records of the whole Pokédex, so it
+measures the service code and not the network. It is timed with and
+without the ranking memo.
+
+Results go to a JSON file (bench/results/ by default) that bench/compare.py
+can diff against another commit's.
+
+Usage:
+    python bench/bench_micro.py [--output FILE] [--rounds 5] [--redis-url redis://localhost:6379/15]
+"""
+
+import argparse
+import os
+import sys
+
+os.environ.setdefault("REDIS_HOST", "127.0.0.1")
+os.environ.setdefault("REDIS_PORT", "6379")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import codec  # noqa: E402
+import search  # noqa: E402
+from search import SearchIndex, _levenshtein, _load_search_index, _normalize  # noqa: E402
+import report  # noqa: E402
+from bench_codec import _synthetic_records  # noqa: E402
+
+QUERIES = [
+    "pikachu", "pika", "charmandr", "bulbsaur", "mr mime", "mime", "gmax", "char",
+    "zzzzzz", "eevee", "tapu koko", "galar", "saur", "dragonite mega", "porygon z", "xq",
+]
+
+
+def _redis(redis_url: str):
+    if redis_url:
+        import redis
+        return redis.Redis.from_url(redis_url, decode_responses=True)
+    try:
+        import fakeredis
+    except ImportError:
+        raise SystemExit("Falta fakeredis (pip install -r bench/requirements.txt) o usar --redis-url")
+    return fakeredis.FakeRedis(decode_responses=True)
+
+def _text_benchmarks(rounds: int) -> dict:
+    names = list(_load_search_index())
+    norms = [_normalize(name) for name in names]
+    queries = [_normalize(q) for q in QUERIES]
+    pairs = [(q, n) for q in queries for n in norms[::13]]
+    index = SearchIndex(_load_search_index())
+    return {
+        "normalize": report.measure(lambda: [_normalize(name) for name in names], len(names), rounds),
+        "levenshtein": report.measure(lambda: [_levenshtein(a, b) for a, b in pairs], len(pairs), rounds),
+        "search_index": report.measure(lambda: [index.search(q, 10) for q in QUERIES], len(QUERIES), rounds),
+    }
+
+def _service_benchmarks(redis_url: str, rounds: int) -> dict:
+    from pokemons import cache_light_pokemons, search_pokemon_by_name
+    r = _redis(redis_url)
+    cache_light_pokemons(r, _synthetic_records()["light"])
+
+    def _uncached():
+        for q in QUERIES:
+            search._results.clear()
+            search_pokemon_by_name(r, q)
+
+    return {
+        "search_pokemon_by_name": report.measure(_uncached, len(QUERIES), rounds),
+        "search_pokemon_by_name_memo": report.measure(
+            lambda: [search_pokemon_by_name(r, q) for q in QUERIES], len(QUERIES), rounds),
+    }
+
+def _codec_benchmarks(rounds: int) -> dict:
+    results = {}
+    codecs = [
+        ("json", codec.JSONCodec()),
+        ("msgpack", codec.MsgpackCodec(compression="none")),
+        ("msgpack+zstd", codec.MsgpackCodec(compression="zstd")),
+        ("msgpack+lz4", codec.MsgpackCodec(compression="lz4")),
+    ]
+    for family, records in _synthetic_records().items():
+        for name, c in codecs:
+            payloads = [c.encode(record, 0.0) for record in records]
+            size = sum(len(p) for p in payloads)
+            results[f"codec.{name}.{family}.encode"] = {
+                **report.measure(lambda: [c.encode(record, 0.0) for record in records], len(records), rounds),
+                "bytes": size,
+            }
+            results[f"codec.{name}.{family}.decode"] = {
+                **report.measure(lambda: [codec.decode(p) for p in payloads], len(payloads), rounds),
+                "bytes": size,
+            }
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Microbenchmarks de búsqueda y codecs.")
+    parser.add_argument("--output", default="", help="Archivo JSON de resultados (por defecto bench/results/)")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--redis-url", default="", help="Redis real en lugar de fakeredis (usar una db propia)")
+    args = parser.parse_args(argv)
+
+    results = _text_benchmarks(args.rounds)
+    results.update(_service_benchmarks(args.redis_url, args.rounds))
+    results.update(_codec_benchmarks(args.rounds))
+
+    rows = [{"name": name, **values} for name, values in results.items()]
+    print(report.table(rows, [
+        ("name", "benchmark", ""), ("ops", "ops", "d"), ("mean_us", "mean µs", ".2f"),
+        ("best_us", "best µs", ".2f"), ("ops_per_s", "ops/s", ",.0f"), ("bytes", "bytes", ",d"),
+    ]))
+    config = {"rounds": args.rounds, "redis": "url" if args.redis_url else "fakeredis",
+              "vectorized": search.SEARCH_VECTORIZED and search.np is not None, "codec": codec.CACHE_CODEC}
+    path = report.write(args.output, "micro", config, results)
+    print(f"\nresultados: {path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
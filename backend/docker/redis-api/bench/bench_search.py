@@ -0,0 +1,107 @@
+"""
+Compares the scalar and the NumPy-bounded (fuzzy.CharBounds) search paths
+as the name catalogue grows, and checks that both return exactly the same
+ranking. On the real corpus (search_pokemons.json) the ranking is also
+checked against a brute-force _score over every name.
+
+Larger catalogues are synthesized from the real names the way forms, items
+and moves would look (suffixes, two-word names, regional prefixes).
+
+Usage:
+    python bench/bench_search.py [--sizes 1302,5000,20000,50000] [--rounds 3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "app"))
+
+import search  # noqa: E402
+from search import SearchIndex, _load_search_index, _normalize, _score  # noqa: E402
+
+QUERIES = [
+    "pikachu", "pika", "charmandr", "bulbsaur", "mr mime", "mime", "gmax", "char",
+    "zzzzzz", "eevee", "tapu koko", "galar", "saur", "dragonite mega", "porygon z", "xq",
+]
+SUFFIXES = ["mega", "gmax", "alola", "galar", "hisui", "berry", "ball", "punch", "beam", "orb", "plate", "scale"]
+
+
+def _catalogue(size: int) -> dict[str, int]:
+    base = _load_search_index()
+    names = dict(base)
+    words = sorted(base)
+    rng = random.Random(size)
+    next_id = max(base.values()) + 1
+    while len(names) < size:
+        shape = rng.random()
+        if shape < 0.5:
+            name = f"{rng.choice(words)}-{rng.choice(SUFFIXES)}"
+        elif shape < 0.8:
+            name = f"{rng.choice(SUFFIXES)}-{rng.choice(words)}"
+        else:
+            name = f"{rng.choice(words)[:5]}{rng.choice(words)[-4:]}"
+        if name not in names:
+            names[name] = next_id
+            next_id += 1
+    return names
+
+def _build(index: dict[str, int], vectorized: bool) -> SearchIndex:
+    search.SEARCH_VECTORIZED = vectorized
+    return SearchIndex(index)
+
+def _brute_force(index: dict[str, int], query: str, limit: int) -> list[tuple[float, str, int]]:
+    query_norm = _normalize(query)
+    scored = []
+    for name, pid in index.items():
+        score = _score(query_norm, _normalize(name), name)
+        if score > 0:
+            scored.append((score, name, pid))
+    scored.sort(key=lambda x: (-x[0], x[1]))
+    return scored[:limit]
+
+def _time(idx: SearchIndex, rounds: int, limit: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for q in QUERIES:
+            idx.search(q, limit=limit)
+    return (time.perf_counter() - started) / (rounds * len(QUERIES)) * 1000
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark del ranking escalar vs vectorizado.")
+    parser.add_argument("--sizes", default="1302,5000,20000,50000")
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=10)
+    args = parser.parse_args(argv)
+    if search.np is None:
+        print("numpy no está instalado: solo existe el camino escalar")
+        return 1
+
+    real = _load_search_index()
+    scalar = _build(real, vectorized=False)
+    vector = _build(real, vectorized=True)
+    mismatches = 0
+    for q in QUERIES:
+        expected = _brute_force(real, q, args.limit)
+        mismatches += scalar.search(q, args.limit) != expected
+        mismatches += vector.search(q, args.limit) != expected
+    print(f"corpus real ({len(real)} nombres): {mismatches} diferencias contra _score completo")
+
+    print(f"{'nombres':>8} {'escalar ms':>11} {'numpy ms':>9} {'speedup':>8} {'iguales':>8}")
+    for size in (int(s) for s in args.sizes.split(",")):
+        index = _catalogue(size)
+        scalar = _build(index, vectorized=False)
+        vector = _build(index, vectorized=True)
+        same = all(scalar.search(q, args.limit) == vector.search(q, args.limit) for q in QUERIES)
+        scalar_ms = _time(scalar, args.rounds, args.limit)
+        vector_ms = _time(vector, args.rounds, args.limit)
+        print(f"{len(index):>8} {scalar_ms:>11.2f} {vector_ms:>9.2f} {scalar_ms / vector_ms:>7.1f}x {str(same):>8}")
+        mismatches += not same
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
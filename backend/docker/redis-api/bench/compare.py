@@ -0,0 +1,81 @@
+"""
+Compares two results files written by bench_micro.py or bench_load.py
+(usually the same benchmark on two commits) and flags the metrics that got
+worse by more than --threshold.
+
+Compared metrics: p50/p95/p99 latency and RPS of each load scenario, and the
+best time per operation of each microbenchmark. Differences in the run
+settings are printed first, because they make the numbers incomparable.
+
+Usage:
+    python bench/compare.py BEFORE.json AFTER.json [--threshold 0.10]
+
+Exits with status 1 if any metric regressed.
+"""
+
+import argparse
+import json
+import sys
+
+import report
+
+# métrica -> True si más alto es mejor. De los microbenchmarks se compara la
+# mejor ronda, que es más estable que la media
+METRICS = {"p50": False, "p95": False, "p99": False, "rps": True, "best_us": False}
+
+
+def _flatten(results: dict, prefix: str = "") -> dict[str, float]:
+    flat = {}
+    for key, value in results.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, f"{name}."))
+        elif key in METRICS and isinstance(value, (int, float)):
+            flat[name] = value
+    return flat
+
+def _load(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Compara dos archivos de resultados de benchmarks.")
+    parser.add_argument("before")
+    parser.add_argument("after")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Empeoramiento tolerado (0.10 = 10%%)")
+    args = parser.parse_args(argv)
+
+    before, after = _load(args.before), _load(args.after)
+    if before.get("kind") != after.get("kind"):
+        print(f"Los archivos son de benchmarks distintos: {before.get('kind')} vs {after.get('kind')}", file=sys.stderr)
+        return 2
+    print(f"{before['meta'].get('commit') or '?'} -> {after['meta'].get('commit') or '?'} ({before['kind']})")
+    for key in sorted(set(before.get("config", {})) | set(after.get("config", {}))):
+        if before["config"].get(key) != after["config"].get(key):
+            print(f"  config distinta: {key} = {before['config'].get(key)!r} -> {after['config'].get(key)!r}")
+
+    old, new = _flatten(before["results"]), _flatten(after["results"])
+    rows = []
+    regressions = 0
+    for name in sorted(set(old) & set(new)):
+        higher_is_better = METRICS[name.rsplit(".", 1)[-1]]
+        change = (new[name] - old[name]) / old[name] if old[name] else 0.0
+        worse = -change if higher_is_better else change
+        flag = ""
+        if worse > args.threshold:
+            flag = "REGRESIÓN"
+            regressions += 1
+        elif worse < -args.threshold:
+            flag = "mejora"
+        rows.append({"metric": name, "before": old[name], "after": new[name], "change": change, "flag": flag})
+    print(report.table(rows, [
+        ("metric", "metric", ""), ("before", "antes", ",.2f"), ("after", "después", ",.2f"),
+        ("change", "cambio", "+.1%"), ("flag", "", ""),
+    ]))
+    print(f"\n{regressions} regresiones por encima del {args.threshold:.0%}")
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
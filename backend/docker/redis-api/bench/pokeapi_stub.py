@@ -0,0 +1,297 @@
+"""
+Local stand-in for PokeAPI used by the benchmarks. It serves the resources
+the service reads (pokemon, pokemon-species, evolution-chain and the
+pokemon list) with a configurable latency, jitter and error rate, so load
+tests never touch pokeapi.co and are repeatable.
+
+By default the fixtures are synthesized from app/search_pokemons.json:
+every id gets a detail document shaped like PokeAPI's (sprites, types,
+abilities and a moves list so the payload size is realistic), forms share
+the species of their base Pokémon and species are chained in threes. With
+--fixtures-dir the documents come from a local PokeAPI dump instead (same
+layout as POKEAPI_DUMP_DIR: <dir>/pokemon/25/index.json); the URLs inside
+are rewritten to point back to the stub.
+
+GET /_stub/stats returns the request counters (requests per resource and
+TCP connections accepted) and POST /_stub/reset clears them. In-process
+callers (the tests) can also script failures with StubServer.fail_next().
+
+Usage:
+    python bench/pokeapi_stub.py [--port 8001] [--latency-ms 50] [--jitter-ms 20] [--error-rate 0.01]
+"""
+
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app")
+POKEAPI_PUBLIC_URL = "https://pokeapi.co/api/v2"
+SPRITES_BASE_URL = "https://raw.githubusercontent.com/PokeAPI/sprites/master/sprites/pokemon"
+
+TYPES = ["normal", "fire", "water", "grass", "electric", "ice", "fighting", "poison", "ground",
+         "flying", "psychic", "bug", "rock", "ghost", "dragon", "dark", "steel", "fairy"]
+EGG_GROUPS = ["monster", "water1", "bug", "flying", "field", "fairy", "plant", "humanshape", "mineral", "dragon"]
+
+_DETAIL = re.compile(r"^/(pokemon|pokemon-species|evolution-chain)/(\d+)/?$")
+
+
+class Fixtures:
+    """
+    Documentos JSON (ya codificados) por path relativo a /api/v2.
+    """
+
+    def __init__(self, base_url: str, fixtures_dir: str = "", moves: int = 60):
+        self.base_url = base_url
+        self.fixtures_dir = fixtures_dir
+        self.moves = moves
+        with open(os.path.join(APP_DIR, "search_pokemons.json"), encoding="utf-8") as f:
+            index: dict[str, int] = json.load(f)
+        self.names = {pid: name for name, pid in index.items()}
+        self.ids = sorted(self.names)
+        self.species_of = {pid: self._species_id(name, pid, index) for pid, name in self.names.items()}
+        self._encoded: dict[str, Optional[bytes]] = {}
+
+    @staticmethod
+    def _species_id(name: str, pid: int, index: dict[str, int]) -> int:
+        # Formas (ids > 10000): la species es la del Pokémon base (charizard-mega-x -> charizard)
+        if pid < 10000:
+            return pid
+        parts = name.split("-")
+        while len(parts) > 1:
+            parts.pop()
+            base = index.get("-".join(parts))
+            if base is not None and base < 10000:
+                return base
+        return pid
+
+    def get(self, path: str) -> Optional[bytes]:
+        if path not in self._encoded:
+            document = self._load(path)
+            self._encoded[path] = None if document is None else json.dumps(document).encode()
+        return self._encoded[path]
+
+    def _load(self, path: str) -> Optional[object]:
+        if self.fixtures_dir:
+            return self._from_dump(path)
+        resource, _, query = path.partition("?")
+        if resource.rstrip("/") == "/pokemon":
+            params = dict(part.partition("=")[::2] for part in query.split("&") if part)
+            return self._list(int(params.get("limit") or 20), int(params.get("offset") or 0))
+        match = _DETAIL.match(resource)
+        if not match:
+            return None
+        kind, rid = match.group(1), int(match.group(2))
+        if kind == "pokemon":
+            return self._pokemon(rid) if rid in self.names else None
+        if kind == "pokemon-species":
+            return self._species(rid) if rid in self.names else None
+        return self._chain(rid) if 1 <= rid <= (max(self.species_of.values()) + 2) // 3 else None
+
+    def _from_dump(self, path: str) -> Optional[object]:
+        resource = path.split("?", 1)[0].strip("/")
+        for candidate in (os.path.join(self.fixtures_dir, resource, "index.json"),
+                          os.path.join(self.fixtures_dir, f"{resource}.json")):
+            if os.path.isfile(candidate):
+                with open(candidate, encoding="utf-8") as f:
+                    return json.loads(f.read().replace(POKEAPI_PUBLIC_URL, self.base_url))
+        return None
+
+    def _ref(self, kind: str, rid: int, name: str) -> dict:
+        return {"name": name, "url": f"{self.base_url}/{kind}/{rid}/"}
+
+    def _list(self, limit: int, offset: int) -> dict:
+        page = self.ids[offset:offset + limit]
+        return {
+            "count": len(self.ids),
+            "next": None,
+            "previous": None,
+            "results": [self._ref("pokemon", pid, self.names[pid]) for pid in page],
+        }
+
+    def _pokemon(self, pid: int) -> dict:
+        rng = random.Random(pid)
+        species = self.species_of[pid]
+        return {
+            "id": pid,
+            "name": self.names[pid],
+            "height": rng.randint(2, 200),
+            "weight": rng.randint(1, 9999),
+            "base_experience": rng.randint(30, 400),
+            "species": self._ref("pokemon-species", species, self.names[species]),
+            "sprites": {
+                "front_default": f"{SPRITES_BASE_URL}/{pid}.png",
+                "back_default": f"{SPRITES_BASE_URL}/back/{pid}.png",
+                "other": {"official-artwork": {"front_default": f"{SPRITES_BASE_URL}/other/official-artwork/{pid}.png"}},
+            },
+            "types": [
+                {"slot": slot + 1, "type": self._ref("type", t + 1, TYPES[t])}
+                for slot, t in enumerate(dict.fromkeys((pid % 18, (pid * 7) % 18)))
+            ],
+            "abilities": [
+                {"slot": slot + 1, "is_hidden": slot == 1, "ability": self._ref("ability", a, f"ability-{a}")}
+                for slot, a in enumerate((pid % 300 + 1, (pid * 13) % 300 + 1))
+            ],
+            # Los detalles reales pesan sobre todo por los movimientos
+            "moves": [
+                {"move": self._ref("move", m, f"move-{m}"),
+                 "version_group_details": [{"level_learned_at": rng.randint(0, 60),
+                                            "move_learn_method": self._ref("move-learn-method", 1, "level-up"),
+                                            "version_group": self._ref("version-group", 20, "scarlet-violet")}]}
+                for m in rng.sample(range(1, 900), self.moves)
+            ],
+        }
+
+    def _species(self, sid: int) -> dict:
+        return {
+            "id": sid,
+            "name": self.names[sid],
+            "egg_groups": [self._ref("egg-group", g + 1, EGG_GROUPS[g]) for g in dict.fromkeys((sid % 10, (sid * 3) % 10))],
+            "evolution_chain": {"url": f"{self.base_url}/evolution-chain/{(sid - 1) // 3 + 1}/"},
+        }
+
+    def _chain(self, cid: int) -> dict:
+        members = [sid for sid in range(3 * (cid - 1) + 1, 3 * cid + 1) if sid in self.names]
+        node: dict = {}
+        for sid in reversed(members):
+            node = {"species": self._ref("pokemon-species", sid, self.names[sid]), "evolves_to": [node] if node else []}
+        return {"id": cid, "chain": node}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 4096
+
+    def __init__(self, address, fixtures: Fixtures, latency: float, jitter: float, error_rate: float, seed: int = 0):
+        super().__init__(address, _Handler)
+        self.fixtures = fixtures
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.stats: dict[str, int] = {}
+        self.lock = threading.Lock()
+        self._failures: list[tuple[int, dict]] = []
+
+    def count(self, name: str):
+        with self.lock:
+            self.stats[name] = self.stats.get(name, 0) + 1
+
+    def handle_error(self, request, client_address):
+        # Un cliente que cortó la conexión (timeout, request cancelado) no es un error del stub
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def fail_next(self, count: int = 1, status: int = 503, headers: Optional[dict] = None):
+        """
+        Las próximas `count` respuestas a /api/v2 serán `status` (con `headers`).
+        """
+        with self.lock:
+            self._failures.extend([(status, headers or {})] * count)
+
+    def reset(self):
+        with self.lock:
+            self.stats.clear()
+            self._failures.clear()
+
+    def _next_failure(self) -> Optional[tuple[int, dict]]:
+        with self.lock:
+            return self._failures.pop(0) if self._failures else None
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: StubServer
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        # Una vez por conexión TCP: con keep-alive, muchos requests por conexión
+        super().setup()
+        self.server.count("connections")
+
+    def _send(self, status: int, body: bytes = b"", headers: Optional[dict] = None):
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path == "/_stub/reset":
+            self.server.reset()
+            return self._send(204)
+        self._send(404)
+
+    def do_GET(self):
+        if self.path == "/_stub/stats":
+            with self.server.lock:
+                return self._send(200, json.dumps(self.server.stats).encode())
+        if not self.path.startswith("/api/v2/"):
+            return self._send(404)
+        path = self.path[len("/api/v2"):]
+        resource = path.strip("/").split("/", 1)[0].split("?", 1)[0]
+        self.server.count("requests")
+        self.server.count(resource)
+        with self.server.lock:
+            delay = max(0.0, self.server.latency + self.server.rng.uniform(-self.server.jitter, self.server.jitter))
+            fail = self.server.rng.random() < self.server.error_rate
+        if delay:
+            time.sleep(delay)
+        forced = self.server._next_failure()
+        if forced is not None:
+            self.server.count("errors")
+            return self._send(forced[0], b"", forced[1])
+        if fail:
+            self.server.count("errors")
+            return self._send(503)
+        body = self.server.fixtures.get(path)
+        if body is None:
+            self.server.count("not_found")
+            return self._send(404)
+        self._send(200, body)
+
+
+def start(port: int = 0, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+          fixtures_dir: str = "", moves: int = 60, seed: int = 0) -> StubServer:
+    """
+    Arranca el stub en un thread de fondo. La URL base para POKEAPI_BASE_URL es
+    http://127.0.0.1:<server.server_address[1]>/api/v2.
+    """
+    server = StubServer(("127.0.0.1", port), None, latency_ms / 1000, jitter_ms / 1000, error_rate, seed)
+    server.fixtures = Fixtures(f"http://127.0.0.1:{server.server_address[1]}/api/v2", fixtures_dir, moves)
+    threading.Thread(target=server.serve_forever, name="pokeapi-stub", daemon=True).start()
+    return server
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="PokeAPI local para benchmarks.")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency-ms", type=float, default=0, help="Latencia media por request")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Variación uniforme ± sobre la latencia")
+    parser.add_argument("--error-rate", type=float, default=0, help="Fracción de requests que responden 503")
+    parser.add_argument("--fixtures-dir", default="", help="Dump local de PokeAPI en lugar de fixtures sintéticos")
+    parser.add_argument("--moves", type=int, default=60, help="Movimientos por detalle sintético (tamaño del payload)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    server = start(args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.fixtures_dir, args.moves, args.seed)
+    print(f"PokeAPI stub en http://127.0.0.1:{server.server_address[1]}/api/v2", flush=True)
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,40 @@
+"""
+Redis stand-in for benchmarks on machines without redis-server: a fakeredis
+server speaking the real protocol over TCP, so the service (and gunicorn's
+workers) connect to it through REDIS_HOST/REDIS_PORT unchanged.
+
+Its absolute latencies are higher than a real Redis. Use it to compare
+commits with each other, not to size a deployment; for that, point the load
+test at a real redis-server with --redis-url.
+
+Usage:
+    python bench/redis_standin.py [--port 6390]
+"""
+
+import argparse
+import sys
+
+try:
+    from fakeredis import TcpFakeServer
+except ImportError:  # pragma: no cover - dependencia solo de los benchmarks
+    TcpFakeServer = None
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Redis en memoria (fakeredis) sobre TCP.")
+    parser.add_argument("--port", type=int, default=6390)
+    args = parser.parse_args(argv)
+    if TcpFakeServer is None:
+        print("Falta fakeredis: pip install -r bench/requirements.txt", file=sys.stderr)
+        return 1
+    server = TcpFakeServer(("127.0.0.1", args.port), server_type="redis")
+    print(f"Redis (fakeredis) en 127.0.0.1:{args.port}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.shutdown()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
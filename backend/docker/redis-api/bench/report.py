@@ -0,0 +1,110 @@
+"""
+Shared helpers for the benchmark scripts: percentiles, per-operation timing
+and the JSON results file.
+
+Every results file carries the commit it was measured on and the settings
+of the run, so bench/compare.py can line up two files and report the
+changes metric by metric.
+"""
+
+import datetime
+import json
+import math
+import os
+import platform
+import subprocess
+import time
+from typing import Callable, Optional
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+
+def _git(*args: str) -> str:
+    try:
+        return subprocess.run(["git", *args], cwd=BENCH_DIR, capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ""
+
+def metadata() -> dict:
+    return {
+        "commit": _git("rev-parse", "--short", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--", "..")),
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+def default_path(kind: str) -> str:
+    meta = metadata()
+    stamp = datetime.datetime.now().strftime("%Y%m%dT%H%M%S")
+    return os.path.join(RESULTS_DIR, f"{kind}-{meta['commit'] or 'nogit'}-{stamp}.json")
+
+def write(path: Optional[str], kind: str, config: dict, results: dict) -> str:
+    """
+    Guarda {"kind", "meta", "config", "results"} en `path` (o en bench/results/) y devuelve la ruta.
+    """
+    path = path or default_path(kind)
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"kind": kind, "meta": metadata(), "config": config, "results": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+    return path
+
+
+def percentiles(samples: list[float]) -> dict:
+    """
+    p50/p95/p99 (nearest-rank), media y máximo de una lista de latencias.
+    """
+    if not samples:
+        return {"p50": None, "p95": None, "p99": None, "mean": None, "max": None}
+    ordered = sorted(samples)
+
+    def _rank(p: float) -> float:
+        return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+    return {
+        "p50": _rank(50),
+        "p95": _rank(95),
+        "p99": _rank(99),
+        "mean": sum(ordered) / len(ordered),
+        "max": ordered[-1],
+    }
+
+def measure(batch: Callable[[], object], ops: int, rounds: int = 5, min_seconds: float = 0.2) -> dict:
+    """
+    Tiempo por operación de `batch`, que ejecuta `ops` operaciones. Se repite
+    al menos `rounds` veces y al menos `min_seconds`; se reporta la media y la
+    mejor ronda (la menos afectada por ruido del sistema).
+    """
+    batch()  # calentamiento: imports perezosos, caches de CPU
+    times = []
+    started = time.perf_counter()
+    while len(times) < rounds or time.perf_counter() - started < min_seconds:
+        t0 = time.perf_counter()
+        batch()
+        times.append(time.perf_counter() - t0)
+    mean = sum(times) / len(times)
+    return {
+        "ops": ops,
+        "rounds": len(times),
+        "mean_us": mean / ops * 1e6,
+        "best_us": min(times) / ops * 1e6,
+        "ops_per_s": ops / mean,
+    }
+
+def table(rows: list[dict], columns: list[tuple[str, str, str]]) -> str:
+    """
+    Tabla de texto: columns = [(clave, título, formato)]; la primera columna
+    va alineada a la izquierda y el resto a la derecha.
+    """
+    widths = [max(len(title), 10) for _, title, _ in columns]
+    widths[0] = max([widths[0]] + [len(str(row.get(columns[0][0], ""))) for row in rows])
+    cells = [[title for _, title, _ in columns]]
+    for row in rows:
+        cells.append(["-" if row.get(key) is None else format(row[key], fmt) for key, _, fmt in columns])
+    return "\n".join(
+        " ".join(f"{text:<{w}}" if i == 0 else f"{text:>{w}}" for i, (text, w) in enumerate(zip(line, widths)))
+        for line in cells
+    )
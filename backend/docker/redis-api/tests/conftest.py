@@ -0,0 +1,83 @@
+"""
+Shared fixtures for the test suite. Both apps run in-process against the
+PokeAPI stub from bench/ and a fakeredis server speaking the Redis protocol
+over TCP, so the real redis/requests/httpx client code is exercised and
+nothing leaves the machine.
+
+The environment is set before any app module is imported, since most
+settings are read at import time.
+
+    pip install -r tests/requirements.txt
+    python -m pytest tests
+"""
+
+import asyncio
+import os
+import sys
+import threading
+
+import pytest
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [os.path.join(TESTS_DIR, "..", "app"), os.path.join(TESTS_DIR, "..", "bench")]
+
+from fakeredis import TcpFakeServer  # noqa: E402
+import pokeapi_stub  # noqa: E402
+
+_redis_server = TcpFakeServer(("127.0.0.1", 0), server_type="redis")
+# Los threads por conexión no deben impedir que termine el proceso
+_redis_server.daemon_threads = True
+threading.Thread(target=_redis_server.serve_forever, name="fakeredis", daemon=True).start()
+_stub = pokeapi_stub.start()
+
+os.environ.update({
+    "REDIS_HOST": "127.0.0.1",
+    "REDIS_PORT": str(_redis_server.server_address[1]),
+    "REDIS_READ_HOST": "",
+    "POKEAPI_BASE_URL": f"http://127.0.0.1:{_stub.server_address[1]}/api/v2",
+    "POKEAPI_DUMP_DIR": "",
+    # Reintentos rápidos: los tests miden cuántos hubo, no cuánto esperaron
+    "POKEAPI_BACKOFF": "0.01",
+    "WARMUP_ON_STARTUP": "false",
+    "RATE_LIMIT_RPS": "0",
+})
+
+import admission  # noqa: E402
+import cache  # noqa: E402
+import search  # noqa: E402
+import upstream  # noqa: E402
+from db import Database  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def stub() -> pokeapi_stub.StubServer:
+    return _stub
+
+@pytest.fixture(scope="session")
+def loop():
+    # Un solo loop para toda la sesión: los clientes async (redis.asyncio,
+    # httpx) quedan atados al loop en el que se crearon
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+@pytest.fixture
+def redis_connection():
+    return Database().get_connection()
+
+@pytest.fixture(autouse=True)
+def clean_state(stub, redis_connection):
+    """
+    Cada test empieza con Redis vacío, sin L1 ni memo de búsqueda, con el
+    breaker cerrado y el stub sin latencia, fallos ni contadores.
+    """
+    redis_connection.flushdb()
+    cache.l1.clear()
+    cache._invalidated.clear()
+    search._results.clear()
+    upstream.breaker.record_success()
+    stub.latency = stub.jitter = stub.error_rate = 0
+    stub.reset()
+    yield
+    assert admission.cache_budget._in_use == 0 and admission.upstream_budget._in_use == 0
+    assert admission.async_cache_budget._in_use == 0 and admission.async_upstream_budget._in_use == 0
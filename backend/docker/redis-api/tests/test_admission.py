@@ -0,0 +1,190 @@
+"""
+The admission layer (admission.py): bulkhead queueing and shedding in both
+serving modes, the 503 that replaces whatever the handler answered when the
+upstream budget rejected it, upstream slots held by streamed bodies until
+they are closed, and the Redis token bucket shared by every replica.
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+import admission
+import main
+from admission import AsyncBulkhead, Bulkhead, Rejected
+from db import Database
+
+
+def _shed_reason(fn) -> str:
+    with pytest.raises(Rejected) as exc_info:
+        fn()
+    assert exc_info.value.status == 503
+    return exc_info.value.reason
+
+
+# --------- Bulkhead ---------
+
+def test_bulkhead_sheds_when_the_queue_is_full():
+    bulkhead = Bulkhead("test", 1, 1, 1.0)
+    bulkhead.acquire()
+    waiter = threading.Thread(target=bulkhead.acquire)
+    waiter.start()
+    while bulkhead._waiting == 0:
+        time.sleep(0.01)
+    started = time.monotonic()
+    assert _shed_reason(bulkhead.acquire) == "queue_full"
+    # Con la cola llena se rechaza sin esperar
+    assert time.monotonic() - started < 0.1
+    bulkhead.release()
+    waiter.join()
+    assert bulkhead._in_use == 1
+    bulkhead.release()
+    assert bulkhead._in_use == 0
+
+def test_bulkhead_sheds_after_max_wait():
+    bulkhead = Bulkhead("test", 1, 4, 0.1)
+    bulkhead.acquire()
+    started = time.monotonic()
+    assert _shed_reason(bulkhead.acquire) == "timeout"
+    assert time.monotonic() - started >= 0.1
+    assert bulkhead._waiting == 0
+    bulkhead.release()
+    assert bulkhead._in_use == 0
+
+
+# --------- AsyncBulkhead ---------
+
+def test_async_bulkhead_hands_slots_over_in_arrival_order(loop):
+    bulkhead = AsyncBulkhead("test", 1, 8, 1.0)
+    order = []
+
+    async def _enter(name):
+        await bulkhead.acquire()
+        order.append(name)
+
+    async def _scenario():
+        await bulkhead.acquire()
+        waiters = [asyncio.create_task(_enter(name)) for name in "abc"]
+        await asyncio.sleep(0.01)
+        for _ in waiters:
+            bulkhead.release()
+            await asyncio.sleep(0)
+            # El lugar pasa directo al siguiente: _in_use no baja
+            assert bulkhead._in_use == 1
+        await asyncio.gather(*waiters)
+        bulkhead.release()
+
+    loop.run_until_complete(_scenario())
+    assert order == ["a", "b", "c"]
+    assert bulkhead._in_use == 0 and not bulkhead._waiters
+
+def test_async_bulkhead_skips_cancelled_waiters(loop):
+    bulkhead = AsyncBulkhead("test", 1, 8, 1.0)
+
+    async def _scenario():
+        await bulkhead.acquire()
+        first = asyncio.create_task(bulkhead.acquire())
+        second = asyncio.create_task(bulkhead.acquire())
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.sleep(0)
+        bulkhead.release()
+        await second
+        bulkhead.release()
+        return first.cancelled()
+
+    assert loop.run_until_complete(_scenario())
+    assert bulkhead._in_use == 0 and not bulkhead._waiters
+
+def test_async_bulkhead_sheds_on_full_queue_and_timeout(loop):
+    bulkhead = AsyncBulkhead("test", 1, 1, 0.1)
+
+    async def _scenario():
+        await bulkhead.acquire()
+        queued = asyncio.create_task(bulkhead.acquire())
+        await asyncio.sleep(0.01)
+        reasons = []
+        for attempt in (bulkhead.acquire(), queued):
+            try:
+                await attempt
+            except Rejected as rejected:
+                reasons.append(rejected.reason)
+        bulkhead.release()
+        return reasons
+
+    assert loop.run_until_complete(_scenario()) == ["queue_full", "timeout"]
+    assert bulkhead._in_use == 0 and not bulkhead._waiters
+
+
+# --------- Presupuesto de PokeAPI en los requests ---------
+
+@pytest.fixture
+def saturated_upstream(monkeypatch) -> Bulkhead:
+    # Sin lugares ni cola: cualquier request que necesite PokeAPI se rechaza
+    budget = Bulkhead("upstream", 0, 0, 0.0)
+    monkeypatch.setattr(admission, "upstream_budget", budget)
+    return budget
+
+def test_upstream_rejection_overrides_the_handler_response(saturated_upstream):
+    resp = main.app.test_client().get("/getPokemon/7")
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == str(admission.ADMISSION_RETRY_AFTER)
+    assert admission.cache_budget._in_use == 0
+
+def test_cache_hits_are_served_while_upstream_is_saturated(monkeypatch):
+    client = main.app.test_client()
+    assert client.get("/getPokemon/7").status_code == 200
+    monkeypatch.setattr(admission, "upstream_budget", Bulkhead("upstream", 0, 0, 0.0))
+    resp = client.get("/getPokemon/7")
+    assert resp.status_code == 200
+    assert resp.get_json()["source"] == "hit"
+
+def test_streamed_body_holds_its_upstream_slot_until_closed(monkeypatch):
+    budget = Bulkhead("upstream", 1, 0, 0.0)
+    monkeypatch.setattr(admission, "upstream_budget", budget)
+    client = main.app.test_client()
+    stream = client.get("/getPokemons?ids=1,2&stream=true")
+    assert stream.status_code == 200
+    # El request terminó pero el cuerpo aún no se leyó: el lugar sigue tomado
+    assert budget._in_use == 1
+    assert client.get("/exportPokemons?limit=2").status_code == 503
+    assert len(stream.get_data().splitlines()) == 2
+    stream.close()
+    assert budget._in_use == 0
+    assert client.get("/exportPokemons?limit=2").status_code == 200
+
+def test_unread_stream_releases_its_slot_on_close(monkeypatch):
+    budget = Bulkhead("upstream", 1, 0, 0.0)
+    monkeypatch.setattr(admission, "upstream_budget", budget)
+    main.app.test_client().get("/exportPokemons?limit=2").close()
+    assert budget._in_use == 0
+
+
+# --------- Límite por cliente ---------
+
+@pytest.fixture
+def rate_limited(monkeypatch):
+    monkeypatch.setattr(admission, "RATE_LIMIT_RPS", 1.0)
+    monkeypatch.setattr(admission, "RATE_LIMIT_BURST", 2)
+
+def test_token_bucket_is_shared_by_sync_and_async_clients(rate_limited, redis_connection, loop):
+    admission.check_rate(redis_connection, "a")
+    admission.check_rate(redis_connection, "a")
+    with pytest.raises(Rejected) as exc_info:
+        # Otra réplica (aquí el cliente async) ve el mismo bucket vacío
+        loop.run_until_complete(admission.check_rate_async(Database().get_async_connection(), "a"))
+    assert (exc_info.value.status, exc_info.value.reason) == (429, "rate_limit")
+    assert exc_info.value.retry_after >= 1
+    admission.check_rate(redis_connection, "b")
+
+def test_rate_limited_client_gets_429_with_retry_after(rate_limited):
+    client = main.app.test_client()
+    # Los probes están exentos
+    assert [client.get("/healthz").status_code for _ in range(3)] == [200, 200, 200]
+    statuses = [client.get("/pokemons", environ_base={"REMOTE_ADDR": "10.0.0.1"}) for _ in range(3)]
+    assert [resp.status_code for resp in statuses[:2]] == [200, 200]
+    assert statuses[2].status_code == 429
+    assert int(statuses[2].headers["Retry-After"]) >= 1
+    assert client.get("/pokemons", environ_base={"REMOTE_ADDR": "10.0.0.2"}).status_code == 200
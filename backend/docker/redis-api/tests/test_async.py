@@ -0,0 +1,138 @@
+"""
+The async app (asgi.py) must behave exactly like the sync one (main.py):
+same statuses, bodies and ETags for the same sequence of requests, each run
+starting from an empty cache. Also covers the async-only failure modes:
+cancelled single-flight leaders and cancelled circuit-breaker probes.
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+
+import asgi
+import cache
+import main
+import search
+import singleflight
+import upstream
+import upstream_async
+from db import Database
+
+SCENARIOS = {
+    "records": ["/getPokemon/5", "/getPokemon/5", "/getPokemon/6", "/getPokemon/0", "/getPokemon/99999"],
+    "lists": ["/pokemons", "/getListPokemon?limit=10&offset=5", "/getListPokemon?limit=10&offset=5",
+              "/getListPokemon?limit=0"],
+    "search": ["/searchPokemon/pika", "/searchPokemon/charmandr", "/searchPokemon/zzzzzzzzzzzz",
+               "/suggest?q=char", "/suggest?q=bulb&detail=light", "/suggest?q="],
+    "batch": ["/getPokemons?ids=1,2,3", "/getPokemons?ids=1,2,3&detail=full", "/getPokemons?ids=4,999999,4",
+              "/getPokemons?ids=1,x", "/getPokemons?ids=1,2&detail=nope"],
+    "filter": ["/getPokemon/1", "/getPokemon/4", "/getPokemon/7", "/filterPokemon?type=fire",
+               "/filterPokemon?type=fire,water&limit=1&offset=1", "/filterPokemon"],
+    "stream": ["/getPokemons?ids=1,2,3&stream=true", "/exportPokemons?limit=12", "/exportPokemons?after=5&limit=3"],
+}
+
+
+def _snapshot(status: int, headers, data: bytes):
+    content_type = headers.get("Content-Type", "")
+    if content_type.startswith("application/json"):
+        body = json.loads(data)
+    elif content_type.startswith("application/x-ndjson"):
+        body = [json.loads(line) for line in data.splitlines()]
+    else:
+        body = data
+    return status, headers.get("ETag"), body
+
+def _reset(redis_connection):
+    redis_connection.flushdb()
+    cache.l1.clear()
+    search._results.clear()
+
+def _run_sync(paths: list[str]) -> list:
+    client = main.app.test_client()
+    snapshots = []
+    for path in paths:
+        resp = client.get(path)
+        snapshots.append(_snapshot(resp.status_code, resp.headers, resp.get_data()))
+        resp.close()
+    return snapshots
+
+async def _run_async(paths: list[str]) -> list:
+    client = asgi.app.test_client()
+    snapshots = []
+    for path in paths:
+        resp = await client.get(path)
+        snapshots.append(_snapshot(resp.status_code, resp.headers, await resp.get_data()))
+    return snapshots
+
+
+@pytest.mark.parametrize("scenario", sorted(SCENARIOS))
+def test_async_app_matches_sync_app(scenario, loop, redis_connection):
+    paths = SCENARIOS[scenario]
+    sync_out = _run_sync(paths)
+    sync_keys = sorted(redis_connection.keys())
+    _reset(redis_connection)
+    async_out = loop.run_until_complete(_run_async(paths))
+    for path, expected, got in zip(paths, sync_out, async_out):
+        assert got == expected, path
+    assert sorted(redis_connection.keys()) == sync_keys
+
+def test_async_fetches_hit_the_cache_after_a_miss(stub, loop):
+    client = asgi.app.test_client()
+
+    async def _get():
+        resp = await client.get("/getPokemon/9")
+        return (await resp.get_json())["source"]
+
+    assert loop.run_until_complete(_get()) == "miss"
+    calls = stub.stats["requests"]
+    assert loop.run_until_complete(_get()) == "hit"
+    assert stub.stats["requests"] == calls
+
+
+def test_coalesced_waiters_survive_a_cancelled_leader(loop):
+    connection = Database().get_async_connection()
+    builds = []
+
+    async def _build():
+        builds.append(1)
+        await asyncio.sleep(0.2)
+        return "value"
+
+    async def _load():
+        return None
+
+    async def _scenario():
+        leader = asyncio.create_task(singleflight.coalesce_async(connection, "test:key", _load, _build))
+        await asyncio.sleep(0.02)
+        waiters = [asyncio.create_task(singleflight.coalesce_async(connection, "test:key", _load, _build))
+                   for _ in range(3)]
+        await asyncio.sleep(0.02)
+        leader.cancel()
+        return await asyncio.gather(*waiters, return_exceptions=True), leader
+
+    results, leader = loop.run_until_complete(_scenario())
+    assert results == ["value"] * 3
+    assert leader.cancelled()
+    assert len(builds) == 1
+    assert singleflight._inflight == {}
+
+def test_cancelled_breaker_probe_is_released(stub, loop, monkeypatch):
+    breaker = upstream.CircuitBreaker(threshold=1, cooldown=0.05)
+    monkeypatch.setattr(upstream_async, "breaker", breaker)
+    breaker.record_failure()
+    time.sleep(0.06)
+    stub.latency = 1.0
+
+    async def _scenario():
+        probe = asyncio.create_task(upstream_async.get_json(f"{upstream.POKEAPI_BASE_URL}/pokemon/1"))
+        await asyncio.sleep(0.1)
+        assert breaker._probing
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+    loop.run_until_complete(_scenario())
+    assert not breaker._probing
+    assert breaker.allow()
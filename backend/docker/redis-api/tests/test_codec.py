@@ -0,0 +1,99 @@
+"""
+Cache entry codecs (codec.py): every codec and compression round-trips its
+value and soft expiry, entries written before the envelope still decode,
+decode() reads either format whatever codec is configured, and the key
+prefix moves when the zstd dictionary changes.
+"""
+
+import json
+
+import pytest
+
+import codec
+from codec import JSONCodec, MsgpackCodec
+
+SOFT_EXPIRES_AT = 1_700_000_000.25
+LIGHT = {
+    "id": 25, "name": "pikachu",
+    **{field: template.format(id=25) for field, template in codec.URL_TEMPLATES.items()},
+}
+FULL = {
+    **LIGHT, "height": 4, "weight": 60, "types": "electric",
+    "abilities": ["static", "lightning-rod"], "eggsGroups": ["field", "fairy"],
+    "species": {"name": "pikachu", "url": f"{codec.POKEAPI_BASE_URL}/pokemon-species/25/"},
+    "evolutions": [LIGHT, {**LIGHT, "id": 26, "name": "raichu"}],
+}
+VALUES = {"light": LIGHT, "full": FULL, "ids": [1, 2, 3], "empty": {}, "text": "ñandú"}
+
+CODECS = {
+    "json": JSONCodec(),
+    "msgpack": MsgpackCodec(compression="none"),
+    "msgpack-zstd": MsgpackCodec(compression="zstd", min_bytes=1),
+    "msgpack-lz4": MsgpackCodec(compression="lz4", min_bytes=1),
+}
+# Byte de compresión en la cabecera del frame binario
+COMPRESSION = {"msgpack": codec._NONE, "msgpack-zstd": codec._ZSTD, "msgpack-lz4": codec._LZ4}
+
+
+@pytest.mark.parametrize("value_name", sorted(VALUES))
+@pytest.mark.parametrize("codec_name", sorted(CODECS))
+def test_round_trip(codec_name, value_name):
+    entry_codec = CODECS[codec_name]
+    raw = entry_codec.encode(VALUES[value_name], SOFT_EXPIRES_AT)
+    assert entry_codec.decode(raw) == (VALUES[value_name], SOFT_EXPIRES_AT)
+    # decode() del módulo reconoce el formato por sí solo
+    assert codec.decode(raw) == (VALUES[value_name], SOFT_EXPIRES_AT)
+    assert codec.soft_expiry(raw) == SOFT_EXPIRES_AT
+
+@pytest.mark.parametrize("codec_name", sorted(COMPRESSION))
+def test_frame_header_records_the_compression(codec_name):
+    raw = CODECS[codec_name].encode(FULL, SOFT_EXPIRES_AT)
+    assert raw[0] == codec._MAGIC
+    assert raw[1] == COMPRESSION[codec_name]
+
+def test_small_bodies_are_not_compressed():
+    raw = MsgpackCodec(compression="zstd", min_bytes=1024).encode(LIGHT, SOFT_EXPIRES_AT)
+    assert raw[1] == codec._NONE
+    assert codec.decode(raw) == (LIGHT, SOFT_EXPIRES_AT)
+
+def test_zstd_dictionary_shrinks_records():
+    plain = CODECS["msgpack"].encode(FULL, SOFT_EXPIRES_AT)
+    compressed = CODECS["msgpack-zstd"].encode(FULL, SOFT_EXPIRES_AT)
+    assert len(compressed) < len(plain) / 2
+
+@pytest.mark.parametrize("legacy", [LIGHT, [LIGHT, LIGHT], {"data": 1}])
+def test_legacy_json_without_envelope(legacy):
+    # Escrito antes del sobre: el valor tal cual y sin expiración blanda
+    raw = json.dumps(legacy).encode()
+    assert codec.decode(raw) == (legacy, None)
+    assert codec.decode(raw.decode()) == (legacy, None)
+    assert codec.soft_expiry(raw) is None
+
+@pytest.mark.parametrize("codec_name", sorted(COMPRESSION))
+def test_binary_entries_decode_while_configured_for_json(monkeypatch, codec_name):
+    monkeypatch.setattr(codec, "codec", JSONCodec())
+    raw = CODECS[codec_name].encode(FULL, SOFT_EXPIRES_AT)
+    assert codec.decode(raw) == (FULL, SOFT_EXPIRES_AT)
+
+def test_body_ignores_the_soft_expiry():
+    for entry_codec in (CODECS["msgpack"], CODECS["msgpack-zstd"]):
+        first = entry_codec.encode(FULL, SOFT_EXPIRES_AT)
+        second = entry_codec.encode(FULL, SOFT_EXPIRES_AT + 60)
+        assert first != second
+        assert codec.body(first) == codec.body(second)
+
+
+def test_key_prefix_follows_the_dictionary(monkeypatch):
+    assert JSONCodec.key_prefix == ""
+    before = MsgpackCodec().key_prefix
+    assert before == f"v2-{codec._DICTIONARY_ID:08x}:"
+    monkeypatch.setattr(codec, "_DICTIONARY_ID", codec._DICTIONARY_ID ^ 1)
+    assert MsgpackCodec().key_prefix != before
+
+def test_dictionary_depends_on_the_url_templates(monkeypatch):
+    monkeypatch.setitem(codec.URL_TEMPLATES, "icon", "https://sprites.example/{id}.png")
+    assert codec._dictionary_content() != codec._DICTIONARY
+
+def test_unknown_codec_is_rejected():
+    with pytest.raises(Exception):
+        codec.get_codec("xml")
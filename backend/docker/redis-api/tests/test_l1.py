@@ -0,0 +1,122 @@
+"""
+The in-process L1 cache (local_cache.LocalCache) and its invalidation
+across replicas (cache._listen_invalidations): entry, byte and TTL bounds,
+keys rewritten by another node are dropped, the node's own writes are not.
+"""
+
+import json
+import time
+
+import cache
+from local_cache import LocalCache
+
+
+def _wait(predicate, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timeout"
+        time.sleep(0.01)
+
+
+# --------- LocalCache ---------
+
+def test_evicts_least_recently_used_past_max_entries():
+    l1 = LocalCache(max_entries=2, max_bytes=1024, ttl=60, name="test")
+    l1.set("a", b"1")
+    l1.set("b", b"2")
+    assert l1.get("a") == b"1"
+    l1.set("c", b"3")
+    assert (l1.get("a"), l1.get("b"), l1.get("c")) == (b"1", None, b"3")
+    assert len(l1) == 2
+
+def test_evicts_past_max_bytes():
+    l1 = LocalCache(max_entries=100, max_bytes=10, ttl=60, name="test")
+    l1.set("a", b"12345")
+    l1.set("b", b"12345")
+    l1.set("c", b"123")
+    assert l1.get("a") is None
+    assert l1.get("b") == b"12345" and l1.get("c") == b"123"
+    # Un valor más grande que todo el límite no se guarda ni expulsa a nadie
+    l1.set("huge", b"x" * 11)
+    assert l1.get("huge") is None and len(l1) == 2
+
+def test_replacing_a_key_keeps_the_byte_count():
+    l1 = LocalCache(max_entries=100, max_bytes=10, ttl=60, name="test")
+    for _ in range(5):
+        l1.set("a", b"12345")
+    l1.set("b", b"12345")
+    assert l1.get("a") == b"12345" and l1.get("b") == b"12345"
+
+def test_entries_expire_after_the_ttl():
+    l1 = LocalCache(max_entries=100, max_bytes=1024, ttl=0.05, name="test")
+    l1.set("a", b"1")
+    assert l1.get("a") == b"1"
+    time.sleep(0.06)
+    assert l1.get("a") is None
+    assert len(l1) == 0
+
+def test_delete_and_clear():
+    l1 = LocalCache(max_entries=100, max_bytes=1024, ttl=60, name="test")
+    l1.set("a", b"1")
+    l1.set("b", b"2")
+    l1.delete("a")
+    l1.delete("missing")
+    assert (l1.get("a"), l1.get("b")) == (None, b"2")
+    l1.clear()
+    assert len(l1) == 0
+
+
+# --------- Invalidación entre réplicas ---------
+
+def _publish(redis_connection, origin: str, keys: list[str]):
+    redis_connection.publish(cache.CACHE_INVALIDATION_CHANNEL, json.dumps({"origin": origin, "keys": keys}))
+
+def _listening(redis_connection):
+    cache._ensure_invalidation_listener(redis_connection)
+    # El listener se suscribe en su propio thread: esperar a que reciba
+    cache.l1.set("probe", b"1")
+    def _probed():
+        _publish(redis_connection, "other-node", ["probe"])
+        time.sleep(0.02)
+        return cache.l1.get("probe") is None
+    _wait(_probed)
+
+def test_foreign_writes_evict_the_key(redis_connection):
+    _listening(redis_connection)
+    cache.l1.set("k1", b"1")
+    cache.l1.set("k2", b"2")
+    _publish(redis_connection, "other-node", ["k1"])
+    _wait(lambda: cache.l1.get("k1") is None)
+    assert cache.l1.get("k2") == b"2"
+
+def test_own_writes_are_ignored(redis_connection):
+    _listening(redis_connection)
+    cache.l1.set("mine", b"1")
+    cache.l1.set("theirs", b"2")
+    _publish(redis_connection, cache._origin, ["mine"])
+    # Los mensajes llegan en orden: cuando se procesa el segundo, ya se ignoró el primero
+    _publish(redis_connection, "other-node", ["theirs"])
+    _wait(lambda: cache.l1.get("theirs") is None)
+    assert cache.l1.get("mine") == b"1"
+
+def test_malformed_messages_are_skipped(redis_connection):
+    _listening(redis_connection)
+    cache.l1.set("k", b"1")
+    redis_connection.publish(cache.CACHE_INVALIDATION_CHANNEL, "not json")
+    _publish(redis_connection, "other-node", ["k"])
+    _wait(lambda: cache.l1.get("k") is None)
+
+def test_set_many_publishes_the_written_keys(redis_connection):
+    pubsub = redis_connection.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(cache.CACHE_INVALIDATION_CHANNEL)
+    _wait(lambda: pubsub.get_message(timeout=0.01) is None and pubsub.subscribed)
+    keys = [cache.light_key(1), cache.light_key(2)]
+    cache.set_many(redis_connection, [(key, {"id": 1}, cache.LIGHT) for key in keys])
+    message = None
+    deadline = time.monotonic() + 2
+    while message is None and time.monotonic() < deadline:
+        message = pubsub.get_message(timeout=0.1)
+    pubsub.close()
+    assert json.loads(message["data"]) == {"origin": cache._origin, "keys": keys}
+    # Quien escribe actualiza su propia L1 en lugar de vaciarla
+    assert all(cache.l1.get(key) for key in keys)
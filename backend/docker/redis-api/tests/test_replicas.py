@@ -0,0 +1,125 @@
+"""
+Reads routed to a read replica (db.RoutedRedis) that lags behind the
+primary: keys another node just rewrote are read from the primary, a read
+that raced with the invalidation is not put back into L1, and single-flight
+lease state always comes from the primary.
+"""
+
+import json
+import time
+
+import fakeredis
+import fakeredis.aioredis
+import pytest
+import redis
+
+import cache
+import cache_async
+import singleflight
+from db import AsyncRoutedRedis, Database, RoutedRedis
+
+OLD = {"id": 1, "name": "old"}
+NEW = {"id": 1, "name": "new"}
+
+
+def _wait(predicate, timeout: float = 2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timeout"
+        time.sleep(0.01)
+
+def _invalidate_from_another_node(redis_connection, keys: list[str]):
+    cache._ensure_invalidation_listener(redis_connection)
+    # El listener se suscribe en su propio thread: repetir hasta que reciba
+    def _received():
+        redis_connection.publish(cache.CACHE_INVALIDATION_CHANNEL, json.dumps({"origin": "other-node", "keys": keys}))
+        time.sleep(0.02)
+        return all(key in cache._invalidated for key in keys)
+    _wait(_received)
+
+@pytest.fixture
+def lagging(redis_connection) -> RoutedRedis:
+    # Réplica que todavía tiene el valor anterior a la última escritura
+    replica = fakeredis.FakeRedis(decode_responses=True)
+    cache.set_many(replica, [(cache.light_key(1), OLD, cache.LIGHT)])
+    cache.set_many(redis_connection, [(cache.light_key(1), NEW, cache.LIGHT)])
+    cache.l1.clear()
+    return RoutedRedis(redis_connection, replica)
+
+
+def test_lagging_replica_serves_the_old_value(lagging):
+    assert cache.get_many(lagging, [cache.light_key(1)]) == [OLD]
+
+def test_invalidated_keys_are_read_from_the_primary(redis_connection, lagging):
+    key = cache.light_key(1)
+    _invalidate_from_another_node(redis_connection, [key])
+    assert cache.get_many(lagging, [cache.light_key(2), key]) == [None, NEW]
+    assert cache.l1.get(key) is not None
+
+def test_async_invalidated_keys_are_read_from_the_primary(redis_connection, lagging, loop):
+    key = cache.light_key(1)
+    _invalidate_from_another_node(redis_connection, [key])
+
+    async def _read():
+        replica = fakeredis.aioredis.FakeRedis(decode_responses=True)
+        await cache_async.set_many(replica, [(key, OLD, cache.LIGHT)])
+        cache.l1.clear()
+        routed = AsyncRoutedRedis(Database().get_async_connection(), replica)
+        return await cache_async.get_many(routed, [key])
+
+    assert loop.run_until_complete(_read()) == [NEW]
+
+def test_read_racing_an_invalidation_is_not_cached():
+    key = cache.light_key(1)
+    started = time.monotonic()
+    cache._mark_invalidated([key])
+    cache.l1_set_read(key, b"stale", started)
+    assert cache.l1.get(key) is None
+    cache.l1_set_read(key, b"fresh", time.monotonic())
+    assert cache.l1.get(key) == b"fresh"
+
+
+class _Counting:
+    """
+    Envuelve un cliente y cuenta sus SET; `fail_exists` simula un error de Redis.
+    """
+
+    def __init__(self, client, fail_exists: bool = False):
+        self._client = client
+        self._fail_exists = fail_exists
+        self.sets = 0
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def set(self, *args, **kwargs):
+        self.sets += 1
+        return self._client.set(*args, **kwargs)
+
+    def exists(self, *args):
+        if self._fail_exists:
+            raise redis.ConnectionError("exists falló")
+        return self._client.exists(*args)
+
+def _lease_held_elsewhere(redis_connection, key: str):
+    redis_connection.set(singleflight._lease_key(key), "other-node", px=singleflight.SINGLEFLIGHT_LEASE_MS)
+
+def test_lease_is_checked_on_the_primary(redis_connection, monkeypatch):
+    monkeypatch.setattr(singleflight, "SINGLEFLIGHT_POLL_INTERVAL", 0.01)
+    _lease_held_elsewhere(redis_connection, "k")
+    primary = _Counting(redis_connection)
+    routed = RoutedRedis(primary, fakeredis.FakeRedis(decode_responses=True))
+    polls = []
+
+    def _load():
+        polls.append(1)
+        return "built elsewhere" if len(polls) > 10 else None
+
+    assert singleflight._with_lease(routed, "k", _load, lambda: "built here") == "built elsewhere"
+    # Con el lease visto en el primario no hay más intentos de SET NX
+    assert primary.sets == 1
+
+def test_lease_check_error_falls_back_to_build(redis_connection):
+    _lease_held_elsewhere(redis_connection, "k")
+    routed = RoutedRedis(_Counting(redis_connection, fail_exists=True), fakeredis.FakeRedis(decode_responses=True))
+    assert singleflight._with_lease(routed, "k", lambda: None, lambda: "built here") == "built here"
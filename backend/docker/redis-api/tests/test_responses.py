@@ -0,0 +1,38 @@
+"""
+ETags and conditional requests (responses.py): a record keeps its ETag
+whether it was a cache miss or hit, and a 304 is answered without
+compressing the body.
+"""
+
+import gzip
+
+import main
+import responses
+
+
+def test_etag_does_not_depend_on_the_cache_source(stub, redis_connection):
+    client = main.app.test_client()
+    miss = client.get("/getPokemon/25")
+    hit = client.get("/getPokemon/25")
+    assert (miss.get_json()["source"], hit.get_json()["source"]) == ("miss", "hit")
+    assert miss.headers["ETag"] == hit.headers["ETag"]
+    revalidated = client.get("/getPokemon/25", headers={"If-None-Match": miss.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+def test_not_modified_skips_compression(monkeypatch):
+    body = responses.record_body("miss", {"name": "x" * 4 * responses.RESPONSE_COMPRESS_MIN_BYTES})
+    _, status, headers = responses.render(body, 60, {"Accept-Encoding": "gzip"})
+    assert status == 200 and headers["Content-Encoding"] == "gzip"
+
+    compressed = []
+    monkeypatch.setattr(responses, "_ENCODINGS", [("gzip", lambda data: compressed.append(data) or data)])
+    stale = responses.record_body("stale", {"name": "x" * 4 * responses.RESPONSE_COMPRESS_MIN_BYTES})
+    request = {"Accept-Encoding": "gzip", "If-None-Match": headers["ETag"]}
+    assert responses.render(stale, 60, request)[1] == 304
+    assert compressed == []
+
+def test_compressed_variants_keep_their_own_source():
+    item = {"name": "x" * 4 * responses.RESPONSE_COMPRESS_MIN_BYTES}
+    for source in ("miss", "hit"):
+        body, _, _ = responses.render(responses.record_body(source, item), 60, {"Accept-Encoding": "gzip"})
+        assert gzip.decompress(body).startswith(b'{"source":"' + source.encode())
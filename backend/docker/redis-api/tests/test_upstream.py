@@ -0,0 +1,149 @@
+"""
+The PokeAPI client (upstream.py) against the local stub: bounded retries,
+Retry-After, the retry budget shared by every call of a request,
+keep-alive reuse of the pooled session and the circuit breaker's
+closed -> open -> half-open -> closed cycle.
+"""
+
+import contextvars
+import time
+
+import pytest
+
+import upstream
+from upstream import CircuitBreaker, UpstreamError, UpstreamUnavailable
+
+
+def _url(pid: int = 1) -> str:
+    return f"{upstream.POKEAPI_BASE_URL}/pokemon/{pid}"
+
+@pytest.fixture
+def breaker(monkeypatch) -> CircuitBreaker:
+    breaker = CircuitBreaker(threshold=2, cooldown=0.2)
+    monkeypatch.setattr(upstream, "breaker", breaker)
+    return breaker
+
+@pytest.fixture
+def session(monkeypatch):
+    # Sesión nueva para contar sus conexiones desde cero
+    monkeypatch.setattr(upstream, "_session", None)
+    yield upstream.get_session()
+    upstream.get_session().close()
+
+
+def test_retries_transient_errors(stub, breaker):
+    stub.fail_next(2, 503)
+    assert upstream.get_json(_url(), retries=3)["id"] == 1
+    assert stub.stats["requests"] == 3
+    assert breaker._failures == 0
+
+def test_gives_up_after_the_last_retry(stub, breaker):
+    stub.fail_next(5, 500)
+    with pytest.raises(UpstreamError) as exc_info:
+        upstream.get_json(_url(), retries=3)
+    assert exc_info.value.status == 500
+    assert stub.stats["requests"] == 3
+    assert breaker._failures == 1
+
+def test_does_not_retry_not_found(stub, breaker):
+    with pytest.raises(UpstreamError) as exc_info:
+        upstream.get_json(_url(999999), retries=3)
+    assert exc_info.value.status == 404
+    assert stub.stats["requests"] == 1
+    # PokeAPI respondió: no es un fallo para el breaker
+    assert breaker._failures == 0
+
+def test_waits_for_retry_after(stub, breaker):
+    stub.fail_next(1, 429, {"Retry-After": "0.3"})
+    started = time.monotonic()
+    assert upstream.get_json(_url(), retries=3)["id"] == 1
+    assert time.monotonic() - started >= 0.3
+    assert stub.stats["requests"] == 2
+
+def test_fails_fast_when_retry_after_exceeds_the_budget(stub, breaker):
+    stub.fail_next(1, 503, {"Retry-After": "30"})
+    started = time.monotonic()
+    with pytest.raises(UpstreamError) as exc_info:
+        upstream.get_json(_url(), retries=3)
+    assert exc_info.value.status == 503
+    assert time.monotonic() - started < upstream.POKEAPI_RETRY_BUDGET
+    assert stub.stats["requests"] == 1
+
+def test_retry_budget_is_shared_by_the_calls_of_a_request(stub, breaker, monkeypatch):
+    monkeypatch.setattr(upstream, "POKEAPI_RETRY_BUDGET", 1.0)
+
+    def _request():
+        upstream.start_request()
+        stub.fail_next(1, 503, {"Retry-After": "0.6"})
+        assert upstream.get_json(_url(1))["id"] == 1
+        # Quedan 0.4 s del request: la segunda espera ya no cabe
+        stub.fail_next(1, 503, {"Retry-After": "0.6"})
+        with pytest.raises(UpstreamError):
+            upstream.get_json(_url(2))
+
+    contextvars.copy_context().run(_request)
+    assert stub.stats["requests"] == 3
+
+def test_fan_out_workers_share_the_request_budget(stub):
+    def _request():
+        upstream.start_request()
+        budgets = upstream.map_concurrent(lambda _: upstream._retry_budget.get(), range(4))
+        builds = upstream.map_builds(lambda _: upstream._retry_budget.get(), range(4))
+        return upstream._retry_budget.get(), {budget for budget, _ in budgets + builds}
+
+    budget, seen = contextvars.copy_context().run(_request)
+    assert seen == {budget}
+
+
+def test_sequential_calls_reuse_one_connection(stub, breaker, session):
+    for pid in range(1, 6):
+        upstream.get_json(_url(pid))
+    assert stub.stats["requests"] == 5
+    assert stub.stats["connections"] == 1
+
+def test_fan_out_stays_within_the_pool(stub, breaker, session):
+    urls = [_url(pid) for pid in range(1, 2 * upstream.POKEAPI_MAX_CONCURRENCY + 1)]
+    for _ in range(3):
+        results = upstream.map_concurrent(upstream.get_json, urls)
+        assert all(error is None for _, error in results)
+    assert stub.stats["requests"] == 3 * len(urls)
+    assert stub.stats["connections"] <= upstream.POKEAPI_POOL_SIZE
+
+
+def test_breaker_opens_after_consecutive_failures(stub, breaker):
+    stub.fail_next(2, 503)
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            upstream.get_json(_url(), retries=1)
+    assert breaker.is_open
+    with pytest.raises(UpstreamUnavailable):
+        upstream.get_json(_url())
+    # Abierto: ni siquiera se intenta la llamada
+    assert stub.stats["requests"] == 2
+
+def test_half_open_allows_a_single_probe(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    assert not breaker.allow()
+    time.sleep(0.25)
+    assert breaker.allow()
+    assert not breaker.allow()
+
+def test_failed_probe_reopens_the_breaker(stub, breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.25)
+    stub.fail_next(1, 503)
+    with pytest.raises(UpstreamError):
+        upstream.get_json(_url(), retries=1)
+    assert breaker.is_open
+    assert not breaker.allow()
+
+def test_successful_probe_closes_the_breaker(stub, breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    time.sleep(0.25)
+    assert upstream.get_json(_url())["id"] == 1
+    assert not breaker.is_open
+    assert breaker._failures == 0
+    assert breaker.allow() and breaker.allow()
@@ -0,0 +1,33 @@
+"""
+Bulk warm-up (warmup.py) against the local stub: each /pokemon detail is
+fetched once per run, resumed runs read the already cached members of a
+chain from Redis, and concurrency stays within the HTTP pool.
+"""
+
+import cache
+import upstream
+import warmup
+
+
+def _run(redis_connection, ids, **kwargs):
+    return warmup.Warmer(redis_connection).run(ids, chunk_size=4, log=lambda *_: None, **kwargs)
+
+def test_each_detail_is_fetched_once(stub, redis_connection):
+    ids = list(range(1, 10))
+    stats = _run(redis_connection, ids)
+    assert (stats["loaded"], stats["errors"]) == (9, 0)
+    assert stub.stats["pokemon"] == len(ids)
+    full = cache.get_many(redis_connection, [cache.full_key(1)])[0]
+    assert [member["id"] for member in full["evolutions"]] == [1, 2, 3]
+
+def test_resumed_run_reads_cached_members_from_redis(stub, redis_connection):
+    _run(redis_connection, [1, 2])
+    stub.reset()
+    stats = _run(redis_connection, [1, 2, 3, 4, 5, 6])
+    assert (stats["skipped"], stats["loaded"]) == (2, 4)
+    # 3 necesita los lights de 1 y 2: salen de Redis, no de PokeAPI
+    assert stub.stats["pokemon"] == 4
+
+def test_concurrency_is_capped_at_the_pool_size(redis_connection):
+    warmer = warmup.Warmer(redis_connection, concurrency=4 * upstream.POKEAPI_POOL_SIZE)
+    assert warmer._executor._max_workers == upstream.POKEAPI_POOL_SIZE